@@ -0,0 +1,13 @@
+"""
+Benchmarks für die rechenintensiven Teile der Stationssuche und -auswertung.
+
+Aufruf aus dem Projektverzeichnis, z.B.:
+    python -m benchmarks.bench_haversine
+
+Die Suite (benchmarks.suite) misst die Endpunkte samt ihrer Schritte und vergleicht
+mit einer gespeicherten Baseline:
+    python -m benchmarks.suite --save       # Baseline anlegen
+    python -m benchmarks.suite --compare    # Exit-Code 1 bei Verschlechterung
+
+Lasttest von gunicorn gegen einen lokalen Ersatz des Buckets: python -m benchmarks.loadtest
+"""
@@ -0,0 +1,102 @@
+"""
+Benchmark der Jahres-/Jahreszeitenauswertung auf einer synthetischen Station mit 150 Jahren.
+
+Verglichen werden die ursprünglichen Filterschleifen (je Jahr und Jahreszeit eine
+Maske über den ganzen DataFrame) mit der Aggregation in einem groupby-Durchgang
+(StationAggregates.from_dataframe) und der anschließenden vektorisierten
+Auswertung (summarize). Zusätzlich wird geprüft, dass die JSON-Antworten
+Byte für Byte übereinstimmen.
+
+    python -m benchmarks.bench_aggregation [--years 150] [--repeat 3]
+"""
+import argparse
+import os
+import time
+
+import django
+import pandas as pd
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+django.setup()
+
+from django.http import JsonResponse  # noqa: E402
+
+from benchmarks.synthetic import station_frame  # noqa: E402
+from weather_stations.aggregates import StationAggregates  # noqa: E402
+
+
+def prepare(frame):
+    """
+    DataFrame wie nach dem Einlesen in get_station_data (DATE als Datum, YEAR, MONTH).
+    """
+    data = frame[["ID", "DATE", "ELEMENT", "VALUE"]].copy()
+    data["VALUE"] = data["VALUE"].astype(float)
+    data["DATE"] = pd.to_datetime(data["DATE"], format="%Y%m%d", errors="coerce")
+    data["YEAR"] = data["DATE"].dt.year
+    data["MONTH"] = data["DATE"].dt.month
+    return data
+
+
+def loop_summary(data, start_year, end_year):
+    """
+    Die ursprünglichen Filterschleifen aus views.get_station_data (Werte in °C, Series.mean()).
+    """
+    data = data[(data['YEAR'] >= start_year - 1) & (data['YEAR'] <= end_year)]
+    data = data[data['ELEMENT'].isin(['TMAX', 'TMIN'])].copy()
+    data['VALUE'] = data['VALUE'] / 10.0
+
+    def mean(rows, element):
+        values = rows[rows['ELEMENT'] == element]['VALUE']
+        return None if values.empty else format(values.mean(), '.1f')
+
+    annual, seasonal = {}, {}
+    for year in range(start_year, end_year + 1):
+        year_data = data[data['YEAR'] == year]
+        annual[year] = {"TMAX": {"avg": mean(year_data, "TMAX")}, "TMIN": {"avg": mean(year_data, "TMIN")}}
+        seasonal[year] = {}
+        for season, months in (("spring", [3, 4, 5]), ("summer", [6, 7, 8]), ("autumn", [9, 10, 11])):
+            rows = data[(data['YEAR'] == year) & (data['MONTH'].isin(months))]
+            seasonal[year][season] = {"TMAX": mean(rows, "TMAX"), "TMIN": mean(rows, "TMIN")}
+        winter = pd.concat([
+            data[(data['YEAR'] == year - 1) & (data['MONTH'] == 12)],
+            data[(data['YEAR'] == year) & (data['MONTH'].isin([1, 2]))]
+        ])
+        seasonal[year]["winter"] = {"TMAX": mean(winter, "TMAX"), "TMIN": mean(winter, "TMIN")}
+    return {"annual": annual, "seasonal": seasonal}
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    end_year = 2024
+    start_year = end_year - args.years + 1
+    data = prepare(station_frame(first_year=start_year, last_year=end_year))
+    aggregates = StationAggregates.from_dataframe(data)
+
+    loop_time, loop_result = best_of(lambda: loop_summary(data, start_year, end_year), args.repeat)
+    grouped_time, grouped_result = best_of(
+        lambda: StationAggregates.from_dataframe(data).summarize(start_year, end_year), args.repeat)
+    summary_time, _ = best_of(lambda: aggregates.summarize(start_year, end_year), args.repeat)
+
+    identical = JsonResponse(loop_result).content == JsonResponse(grouped_result).content
+    print(f"{args.years} Jahre, {len(data)} Zeilen, bester von {args.repeat} Durchläufen")
+    print(f"  {'Filterschleifen':<36} {loop_time * 1000:10.1f} ms")
+    print(f"  {'groupby + summarize':<36} {grouped_time * 1000:10.1f} ms   x{loop_time / grouped_time:7.1f}")
+    print(f"  {'summarize (Aggregat vorhanden)':<36} {summary_time * 1000:10.1f} ms   x{loop_time / summary_time:7.1f}")
+    print(f"  JSON identisch: {'ja' if identical else 'NEIN'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark des Batch-Endpunkts: Skalierung der Auswertung vieler Stationen mit der
+Anzahl der Worker-Prozesse (GHCN_BATCH_PROCESSES).
+
+Die synthetischen Stationsdateien liegen bereits im lokalen Cache, gemessen wird also
+das Parsen und Aggregieren (ohne Netzwerk). Vor jeder Messung werden die
+gespeicherten Aggregate gelöscht; die Prozesse werden vorab gestartet, damit deren
+Startzeit nicht in die Messung eingeht.
+
+    python -m benchmarks.bench_batch [--stations 16] [--years 150] [--processes 1,2,4]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+os.environ["GHCN_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_batch_")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import override_settings  # noqa: E402
+
+from benchmarks.synthetic import station_frame, write_station_file  # noqa: E402
+from weather_stations import aggregates, batch, station_cache  # noqa: E402
+
+
+def prepare_stations(count, years):
+    station_ids = []
+    for i in range(count):
+        station_id = f"SYN{i:08d}"
+        path = station_cache.station_path(station_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_station_file(path, station_frame(station_id, 2025 - years, 2024, seed=i))
+        now = time.time()
+        station_cache._write_meta(path, {"validators": {"etag": f'"{station_id}"'}, "checked_at": now,
+                                         "downloaded_at": now})
+        station_ids.append(station_id)
+    return station_ids
+
+
+def start_workers(processes):
+    batch.reset_process_pool()
+    pool = batch.get_process_pool()
+    for future in [pool.submit(time.sleep, 0.2) for _ in range(processes)]:
+        future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, default=16)
+    parser.add_argument("--years", type=int, default=150)
+    parser.add_argument("--processes", default=None,
+                        help="kommagetrennte Prozessanzahlen (Standard: 1, 2, 4, ... bis zur Anzahl CPU-Kerne)")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    if args.processes:
+        counts = [int(value) for value in args.processes.split(",")]
+    else:
+        counts = [1]
+        while counts[-1] * 2 <= cores:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != cores:
+            counts.append(cores)
+
+    try:
+        station_ids = prepare_stations(args.stations, args.years)
+        print(f"{args.stations} Stationen x {args.years} Jahre, {cores} CPU-Kerne")
+
+        start = time.perf_counter()
+        for station_id in station_ids:
+            aggregates.build(station_cache.station_path(station_id))
+        sequential = time.perf_counter() - start
+        print(f"  {'nacheinander (ein Prozess)':<28} {sequential * 1000:8.0f} ms")
+
+        for processes in counts:
+            with override_settings(GHCN_BATCH_PROCESSES=processes):
+                start_workers(processes)
+                shutil.rmtree(aggregates.aggregate_directory(), ignore_errors=True)
+                start = time.perf_counter()
+                result = batch.load_many(station_ids)
+                elapsed = time.perf_counter() - start
+            failed = f", {len(result.errors)} Fehler" if result.errors else ""
+            print(f"  {f'{processes} Prozess(e)':<28} {elapsed * 1000:8.0f} ms   x{sequential / elapsed:5.2f} "
+                  f"(Effizienz {sequential / elapsed / processes:4.0%}){failed}")
+    finally:
+        batch.reset_process_pool()
+        shutil.rmtree(os.environ["GHCN_CACHE_DIR"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: Antwort von get_station_series für einen langen Zeitraum, vollständig gegen
+ausgedünnt (points, siehe downsample.py). Gemessen werden Rechenzeit ab der binären
+Zeitreihe und Größe der JSON-Antwort (unkomprimiert und mit gzip).
+
+    python -m benchmarks.bench_downsample [--years 100] [--points 2000] [--repeat 5]
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from io import BytesIO
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+django.setup()
+
+from benchmarks.synthetic import station_csv_bytes, station_frame  # noqa: E402
+from weather_stations import downsample, series  # noqa: E402
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=100)
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    first_year = 2025 - args.years
+    frame = station_frame(first_year=first_year, last_year=2024)
+    station = series.StationSeries(series.convert(BytesIO(station_csv_bytes(frame))))
+
+    variants = [("vollständig", lambda: station.daily(first_year, 2024))]
+    for method in downsample.METHODS:
+        variants.append((f"{method}, {args.points} Punkte",
+                         lambda method=method: station.sampled(first_year, 2024, args.points, method)))
+
+    print(f"{args.years} Jahre, {len(station.days)} Tage, bester von {args.repeat} Durchläufen")
+    for name, function in variants:
+        elapsed = best_of(lambda: json.dumps(function()), args.repeat)
+        body = json.dumps(function()).encode("utf-8")
+        print(f"  {name:<24} {elapsed * 1000:8.1f} ms {len(body) / 1024:10.0f} KiB "
+              f"{len(gzip.compress(body)) / 1024:8.0f} KiB gzip")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Micro-Benchmark: skalare haversine()-Schleife gegen haversine_many() und den
+räumlichen Index auf einem synthetischen Katalog mit 125.000 Stationen.
+
+    python -m benchmarks.bench_haversine [--stations 125000] [--repeat 5]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from weather_stations.geo import StationIndex, haversine, haversine_many
+
+# Frankfurt am Main als Suchpunkt
+QUERY = (50.1109, 8.6821)
+
+
+def best_of(function, repeat):
+    """
+    Kleinste Laufzeit (Sekunden) aus repeat Durchläufen.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, default=125_000)
+    parser.add_argument("--queries", type=int, default=16, help="Anzahl Suchpunkte für den Batch-Aufruf")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    lats = np.degrees(np.arcsin(rng.uniform(-1, 1, args.stations)))
+    lons = rng.uniform(-180, 180, args.stations)
+    lat_list, lon_list = lats.tolist(), lons.tolist()
+    lat, lon = QUERY
+
+    out = np.empty(args.stations)
+    work = np.empty(args.stations)
+    query_lats = rng.uniform(-60, 60, (args.queries, 1))
+    query_lons = rng.uniform(-180, 180, (args.queries, 1))
+    batch_out = np.empty((args.queries, args.stations))
+    batch_work = np.empty((args.queries, args.stations))
+    index = StationIndex(lats, lons)
+
+    results = [
+        ("haversine() Schleife", best_of(lambda: [haversine(lat, lon, a, b) for a, b in zip(lat_list, lon_list)], args.repeat)),
+        ("haversine_many()", best_of(lambda: haversine_many(lat, lon, lats, lons), args.repeat)),
+        ("haversine_many(out=, work=)", best_of(lambda: haversine_many(lat, lon, lats, lons, out=out, work=work), args.repeat)),
+        (f"haversine_many() {args.queries} Punkte / Punkt",
+         best_of(lambda: haversine_many(query_lats, query_lons, lats, lons, out=batch_out, work=batch_work),
+                 args.repeat) / args.queries),
+        ("StationIndex.within(10 km)", best_of(lambda: index.within(lat, lon, 10), args.repeat)),
+        ("StationIndex.within(100 km)", best_of(lambda: index.within(lat, lon, 100), args.repeat)),
+        ("StationIndex.nearest(k=10)", best_of(lambda: index.nearest(lat, lon, 10), args.repeat)),
+    ]
+
+    baseline = results[0][1]
+    print(f"{args.stations} Stationen, bester von {args.repeat} Durchläufen")
+    for name, seconds in results:
+        print(f"  {name:<40} {seconds * 1000:10.3f} ms   x{baseline / seconds:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
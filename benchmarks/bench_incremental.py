@@ -0,0 +1,62 @@
+"""
+Benchmark: Neuberechnung des Aggregats einer großen Station, nachdem die Datei sich
+geändert hat (neue Tage am Ende), vollständig gegen jahresweise (nur geänderte Jahre,
+siehe aggregates.aggregate_stream()).
+
+Gemessen wird ab den entpackten Daten; das Entpacken selbst ist in beiden Fällen nötig.
+Zum Vergleich steht auch das Aggregieren ohne Fingerabdrücke (wie vor der
+jahresweisen Aktualisierung) in der Ausgabe.
+
+    python -m benchmarks.bench_incremental [--years 150] [--new-days 1] [--repeat 5]
+"""
+import argparse
+import os
+import time
+from io import BytesIO
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+django.setup()
+
+from benchmarks.synthetic import station_csv_bytes, station_frame  # noqa: E402
+from weather_stations.aggregates import ELEMENTS, STREAM_CHUNK_ROWS, StationAggregates, aggregate_stream  # noqa: E402
+from weather_stations.parsing import iter_station_chunks  # noqa: E402
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=150)
+    parser.add_argument("--new-days", type=int, default=1, help="Anzahl neu hinzugekommener Tage")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    frame = station_frame(first_year=2025 - args.years, last_year=2024)
+    last_date = sorted(frame["DATE"].unique())[-args.new_days]
+    old = station_csv_bytes(frame[frame["DATE"] < last_date])
+    new = station_csv_bytes(frame)
+    previous = aggregate_stream(BytesIO(old))
+
+    plain = best_of(lambda: StationAggregates.from_chunks(
+        iter_station_chunks(BytesIO(new), ELEMENTS, chunksize=STREAM_CHUNK_ROWS)), args.repeat)
+    full = best_of(lambda: aggregate_stream(BytesIO(new)), args.repeat)
+    incremental = best_of(lambda: aggregate_stream(BytesIO(new), previous=previous), args.repeat)
+
+    print(f"{args.years} Jahre, {len(new) / 1024 ** 2:.1f} MiB entpackt, {args.new_days} neue(r) Tag(e), "
+          f"bester von {args.repeat} Durchläufen")
+    print(f"  {'ohne Fingerabdrücke':<28} {plain * 1000:8.0f} ms")
+    print(f"  {'vollständig':<28} {full * 1000:8.0f} ms")
+    print(f"  {'nur geänderte Jahre':<28} {incremental * 1000:8.0f} ms   ({incremental / full:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark der CSV-Parser für die Stationsdateien (Einstellung GHCN_CSV_PARSER).
+
+Alle Parser lesen dieselben synthetischen csv.gz-Dateien, jeweils in einem eigenen
+Python-Prozess, damit der maximale Speicherbedarf (Peak RSS) je Parser getrennt
+gemessen wird. Der Durchsatz bezieht sich auf die entpackten Daten und enthält
+das Entpacken; die Zeile "gzip" zeigt den Anteil des Entpackens allein.
+
+    python -m benchmarks.bench_parsers [--stations 4] [--years 150] [--repeat 3] [--all-elements]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import station_frame, write_station_file
+from weather_stations import parsing
+
+GZIP_BLOCK = 1024 * 1024
+
+
+def peak_rss_mib():
+    """
+    Maximaler Speicherbedarf dieses Prozesses in MiB. Unter Linux aus VmHWM, da ru_maxrss
+    den Wert des Elternprozesses über fork/exec hinweg behält (beide in KiB).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_worker(name, paths, repeat, all_elements):
+    """
+    Wird im Unterprozess ausgeführt: liest alle Dateien repeat-mal und gibt die beste
+    Laufzeit, die Anzahl Zeilen und den Speicherbedarf als JSON aus.
+    """
+    elements = None if all_elements else parsing.TEMPERATURE_ELEMENTS
+    baseline = peak_rss_mib()
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        rows = 0
+        start = time.perf_counter()
+        for path in paths:
+            with parsing.open_station_file(path) as f:
+                if name == "gzip":
+                    while f.read(GZIP_BLOCK):
+                        pass
+                    continue
+                for chunk in parsing.iter_station_chunks(f, elements, parser=name):
+                    rows += len(chunk)
+        timings.append(time.perf_counter() - start)
+    print(json.dumps({"seconds": min(timings), "rows": rows, "baseline_mib": baseline, "peak_mib": peak_rss_mib()}))
+
+
+def measure(name, paths, repeat, all_elements):
+    command = [sys.executable, "-m", "benchmarks.bench_parsers", "--worker", name, "--repeat", str(repeat)]
+    if all_elements:
+        command.append("--all-elements")
+    result = subprocess.run(command + [str(path) for path in paths], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    return json.loads(result.stdout), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, default=4)
+    parser.add_argument("--years", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--all-elements", action="store_true", help="alle Elemente statt nur TMAX/TMIN liefern")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.paths, args.repeat, args.all_elements)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        size = 0
+        for i in range(args.stations):
+            path = Path(directory) / f"SYN{i:08d}.csv.gz"
+            frame = station_frame(f"SYN{i:08d}", 2025 - args.years, 2024, seed=i)
+            size += write_station_file(path, frame)
+            paths.append(path)
+
+        mib = size / 1024 ** 2
+        print(f"{args.stations} Stationen x {args.years} Jahre, {mib:.1f} MiB entpackt, "
+              f"bester von {args.repeat} Durchläufen")
+        print(f"  {'Parser':<10} {'Zeit':>10} {'MB/s':>10} {'Zeilen':>10} {'RSS Basis':>11} {'Peak RSS':>10}")
+        for name in ["gzip"] + list(parsing.PARSERS):
+            result, error = measure(name, paths, args.repeat, args.all_elements)
+            if result is None:
+                print(f"  {name:<10} nicht verfügbar: {error}")
+                continue
+            print(f"  {name:<10} {result['seconds'] * 1000:8.0f} ms {size / 1e6 / result['seconds']:10.1f} "
+                  f"{result['rows']:10d} {result['baseline_mib']:7.0f} MiB {result['peak_mib']:6.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
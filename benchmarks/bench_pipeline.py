@@ -0,0 +1,95 @@
+"""
+Benchmark: Download, Entpacken und Aggregieren einer großen Station nacheinander
+gegen die Pipeline aus pipeline.py, bei der die Schritte überlappen.
+
+Der Download wird durch eine gedrosselte Quelle mit fester Bandbreite simuliert.
+Nacheinander dauert der Abruf etwa Download + Parsen, mit der Pipeline etwa
+max(Download, Parsen).
+
+    python -m benchmarks.bench_pipeline [--years 150] [--mbit 20] [--repeat 3]
+"""
+import argparse
+import gzip
+import os
+import shutil
+import time
+from io import BytesIO
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+django.setup()
+
+from benchmarks.synthetic import station_csv_bytes, station_frame  # noqa: E402
+from weather_stations.aggregates import aggregate_stream  # noqa: E402
+from weather_stations.pipeline import CHUNK_SIZE, Pipeline  # noqa: E402
+
+
+class ThrottledSource:
+    """
+    Liefert data höchstens mit bytes_per_second (wie response.raw bei begrenzter Bandbreite).
+    """
+
+    def __init__(self, data, bytes_per_second):
+        self.data = BytesIO(data)
+        self.bytes_per_second = bytes_per_second
+        self.start = None
+        self.sent = 0
+
+    def read(self, n):
+        if self.start is None:
+            self.start = time.perf_counter()
+        chunk = self.data.read(n)
+        self.sent += len(chunk)
+        delay = self.start + self.sent / self.bytes_per_second - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        return chunk
+
+
+def sequential(compressed, bytes_per_second):
+    sink = BytesIO()
+    shutil.copyfileobj(ThrottledSource(compressed, bytes_per_second), sink, CHUNK_SIZE)
+    sink.seek(0)
+    with gzip.GzipFile(fileobj=sink) as f:
+        return aggregate_stream(f)
+
+
+def pipelined(compressed, bytes_per_second):
+    with Pipeline(ThrottledSource(compressed, bytes_per_second), sink=BytesIO()) as reader:
+        return aggregate_stream(reader)
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=150)
+    parser.add_argument("--mbit", type=float, default=20.0, help="simulierte Bandbreite in Mbit/s")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    compressed = gzip.compress(station_csv_bytes(station_frame(first_year=2025 - args.years, last_year=2024)))
+    bytes_per_second = args.mbit * 1e6 / 8
+    download = len(compressed) / bytes_per_second
+    parse = best_of(lambda: sequential(compressed, float("inf")), args.repeat)
+    sequential_time = best_of(lambda: sequential(compressed, bytes_per_second), args.repeat)
+    pipelined_time = best_of(lambda: pipelined(compressed, bytes_per_second), args.repeat)
+
+    print(f"{args.years} Jahre, {len(compressed) / 1024 ** 2:.1f} MiB komprimiert, {args.mbit:g} Mbit/s, "
+          f"bester von {args.repeat} Durchläufen")
+    print(f"  {'Download allein':<28} {download * 1000:8.0f} ms")
+    print(f"  {'Entpacken + Parsen allein':<28} {parse * 1000:8.0f} ms")
+    print(f"  {'nacheinander':<28} {sequential_time * 1000:8.0f} ms")
+    print(f"  {'Pipeline':<28} {pipelined_time * 1000:8.0f} ms   (max = {max(download, parse) * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
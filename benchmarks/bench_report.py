@@ -0,0 +1,85 @@
+"""
+Benchmark: nächtlicher Bericht über viele Stationen (manage.py station_report, report.py)
+gegen das bisherige Vorgehen aus Testcode.py (get_temperature: je Station, Jahr und
+Messgröße die ganze Datei mit pd.read_csv lesen, Datumsspalte umwandeln, filtern).
+
+Das bisherige Vorgehen wird für eine Station und ein Paar (Jahr, Messgröße) gemessen
+und auf alle Stationen und Paare hochgerechnet, da seine Kosten je Paar gleich bleiben.
+
+    python -m benchmarks.bench_report [--stations 32] [--file-years 100] [--years 1995-2024]
+        [--processes 1,4]
+"""
+import argparse
+import gzip
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+django.setup()
+
+import pandas as pd  # noqa: E402
+
+from benchmarks.synthetic import station_frame, write_station_file  # noqa: E402
+from weather_stations import report  # noqa: E402
+
+
+def testcode_temperature(path, year, element):
+    """
+    Die Berechnung aus Testcode.py (ohne input()/print()).
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        df = pd.read_csv(f, header=None)
+    df.columns = ["Station", "Date", "Element", "Value", "M-Flag", "Q-Flag", "S-Flag", "Obs-Time"]
+    df["Date"] = pd.to_datetime(df["Date"], format="%Y%m%d")
+    df_year = df[df["Date"].dt.year == year]
+    return (df_year[df_year["Element"] == element]["Value"] / 10).mean()
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, default=32)
+    parser.add_argument("--file-years", type=int, default=100, help="Jahre je Stationsdatei")
+    parser.add_argument("--years", default="1995-2024", help="ausgewertete Jahre")
+    parser.add_argument("--elements", nargs="+", default=["TMAX", "TMIN"])
+    parser.add_argument("--processes", default=f"1,{os.cpu_count()}", help="Anzahl Prozesse, kommagetrennt")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    years = report.parse_years(args.years)
+    directory = Path(tempfile.mkdtemp(prefix="bench_report_"))
+    try:
+        for i in range(args.stations):
+            frame = station_frame(f"SYN{i:08d}", 2025 - args.file_years, 2024, seed=i)
+            write_station_file(directory / f"SYN{i:08d}.csv.gz", frame)
+        files, _ = report.select_files(directory)
+        pairs = len(years) * len(args.elements)
+        print(f"{args.stations} Stationen über {args.file_years} Jahre, {len(years)} Jahre x "
+              f"{len(args.elements)} Messgrößen = {pairs} Paare je Station")
+
+        per_pair = best_of(lambda: testcode_temperature(files[0][1], years[0], args.elements[0]), args.repeat)
+        print(f"  {'Testcode.py (hochgerechnet)':<28} {per_pair * pairs * args.stations:10.1f} s "
+              f"({per_pair * 1000:.0f} ms je Paar)")
+        for processes in sorted({int(value) for value in args.processes.split(",")}):
+            elapsed = best_of(lambda: report.report(files, years, args.elements, processes=processes), args.repeat)
+            print(f"  {f'station_report, {processes} Prozesse':<28} {elapsed:10.1f} s "
+                  f"({elapsed / args.stations * 1000:.0f} ms je Station)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
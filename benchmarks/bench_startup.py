@@ -0,0 +1,164 @@
+"""
+Benchmark: Zeit bis zur ersten Antwort beim Start und Neustart der Worker, je nach
+Profil (GHCN_API_ONLY, siehe settings.py) und preload (GHCN_PRELOAD, siehe gunicorn.conf.py).
+
+1. Import: in einem frischen Interpreter django.setup() und die URLconf samt Views,
+   also das, was ohne preload jeder Worker vor seinem ersten Request lädt. "bisher"
+   importiert pandas zusätzlich vorab, wie vor dem verzögerten Import (parsing.py).
+2. gunicorn mit einem Worker gegen den Ersatz-Bucket aus loadtest.py; der Katalog
+   liegt schon im GHCN_CACHE_DIR (wie bei jedem Neustart nach dem ersten):
+   - Start: vom Start von gunicorn bis zur ersten Antwort von search_stations
+   - Stationsdaten: Dauer der ersten Anfrage an get_station_data (Download und Aggregation)
+   - Neustart: vom Beenden des Workers (SIGKILL, gunicorn meldet dazu "Perhaps out of
+     memory?") bis zur ersten Antwort von search_stations durch den neu gestarteten Worker
+
+    python -m benchmarks.bench_startup [--repeat 3] [--stations 125000] [--worker-class sync]
+"""
+import argparse
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from benchmarks.loadtest import ROOT, WORKER_CLASSES, StandInServer, build_files, free_port, worker_pids
+from benchmarks.synthetic import CATALOG_CLUSTERS
+
+PROFILES = [
+    ("Standard", {"GHCN_API_ONLY": "0", "GHCN_PRELOAD": "0"}),
+    ("schlank", {"GHCN_API_ONLY": "1", "GHCN_PRELOAD": "0"}),
+    ("schlank + preload", {"GHCN_API_ONLY": "1", "GHCN_PRELOAD": "1"}),
+]
+
+IMPORT_SNIPPET = """
+import os, time
+start = time.perf_counter()
+if os.environ.get("BENCH_EAGER_PANDAS") == "1":
+    import pandas
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - start)
+"""
+
+SEARCH = {"latitude": CATALOG_CLUSTERS[0][0], "longitude": CATALOG_CLUSTERS[0][1], "radius": 100,
+          "station_count": 20, "start_year": 2000, "end_year": 2010}
+
+
+def import_time(env):
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, check=True, capture_output=True,
+                            text=True, env=dict(os.environ, DJANGO_SETTINGS_MODULE="weather_stations.settings",
+                                                **env)).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def wait_for(url, params=None, timeout=120):
+    """
+    Wiederholt die Anfrage, bis sie mit 200 beantwortet wird.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, params, timeout=timeout).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"keine Antwort von {url}")
+
+
+def launch(worker_class, env):
+    application, worker, extra_env = WORKER_CLASSES[worker_class]
+    port = free_port()
+    command = [sys.executable, "-m", "gunicorn", application, "--bind", f"127.0.0.1:{port}",
+               "--worker-class", worker, "--timeout", "120", "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=ROOT, env=dict(os.environ, GHCN_WORKERS="1", **extra_env, **env))
+    return process, f"http://127.0.0.1:{port}"
+
+
+def measure_app(worker_class, env, station_id):
+    """
+    Ein Durchlauf mit gunicorn: (Start, Stationsdaten, Neustart) in Sekunden.
+    """
+    start = time.perf_counter()
+    process, url = launch(worker_class, env)
+    try:
+        wait_for(url + "/api/search_stations/", SEARCH)
+        started = time.perf_counter() - start
+
+        params = {"station_id": station_id, "start_year": 2000, "end_year": 2010}
+        start = time.perf_counter()
+        response = requests.get(url + "/api/get_station_data/", params, timeout=120)
+        station_data = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f"get_station_data: Status {response.status_code}")
+
+        (worker,) = worker_pids(process.pid)
+        start = time.perf_counter()
+        os.kill(worker, signal.SIGKILL)
+        wait_for(url + "/api/search_stations/", SEARCH)
+        restarted = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait(30)
+    return started, station_data, restarted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stations", type=int, default=125_000, help="Stationen im Katalog")
+    parser.add_argument("--worker-class", choices=sorted(WORKER_CLASSES), default="sync")
+    args = parser.parse_args()
+
+    print(f"Import beim Worker-Start (bester von {args.repeat} Durchläufen)")
+    variants = [("bisher (pandas beim Import)", {"GHCN_API_ONLY": "0", "BENCH_EAGER_PANDAS": "1"})]
+    variants += [(name, env) for name, env in PROFILES if env["GHCN_PRELOAD"] == "0"]
+    for name, env in variants:
+        elapsed = min(import_time(env) for _ in range(args.repeat))
+        print(f"  {name:<28} {elapsed * 1000:8.0f} ms")
+
+    files, pool = build_files(args.stations, 1)
+    upstream = StandInServer(files)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    template = Path(tempfile.mkdtemp(prefix="bench_startup_"))
+    try:
+        # Katalog einmal laden; jeder Durchlauf beginnt mit einer Kopie dieses Verzeichnisses
+        env = {"GHCN_BASE_URL": upstream.url, "GHCN_CACHE_DIR": str(template / "cache")}
+        process, url = launch(args.worker_class, env)
+        try:
+            wait_for(url + "/api/search_stations/", SEARCH)
+        finally:
+            process.terminate()
+            process.wait(30)
+
+        print(f"\ngunicorn ({args.worker_class}, 1 Worker), {args.stations} Stationen, Median von {args.repeat} "
+              f"Durchläufen")
+        print(f"  {'Profil':<28} {'Start':>10} {'Stationsdaten':>14} {'Neustart':>10}")
+        for name, profile in PROFILES:
+            results = []
+            for i in range(args.repeat):
+                cache_dir = template / f"run{i}"
+                shutil.copytree(template / "cache", cache_dir)
+                try:
+                    results.append(measure_app(args.worker_class, dict(env, GHCN_CACHE_DIR=str(cache_dir),
+                                                                       **profile), pool[0][0]))
+                finally:
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+            started, station_data, restarted = (statistics.median(values) for values in zip(*results))
+            print(f"  {name:<28} {started * 1000:7.0f} ms {station_data * 1000:11.0f} ms {restarted * 1000:7.0f} ms")
+    finally:
+        upstream.shutdown()
+        shutil.rmtree(template, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Lasttest der gunicorn-Bereitstellung gegen einen lokalen Ersatz des NOAA-Buckets.
+
+1. Ein HTTP-Server im selben Prozess liefert einen synthetischen Katalog
+   (ghcnd-stations.txt, ghcnd-inventory.txt, siehe synthetic.catalog_texts()) und
+   Stationsdateien unter csv.gz/by_station/ aus, mit ETag (304 bei If-None-Match),
+   einstellbarer Latenz je Request (--latency) und Bandbreite je Verbindung (--bandwidth).
+2. gunicorn wird mit GHCN_BASE_URL auf diesen Server und einem leeren GHCN_CACHE_DIR
+   gestartet (--workers, --threads, --worker-class; weitere Settings mit --env).
+3. --clients Threads schicken für --duration Sekunden eine Mischung aus search_stations
+   und get_station_data (--search-share). Ein Teil der Anfragen (--popular) stammt aus
+   einer kleinen Menge immer gleicher Anfragen, die übrigen sind zufällig; so lässt
+   sich die Wirkung des Antwort-Caches abschätzen. Die ersten --warmup Sekunden werden
+   nicht gewertet (Katalog laden, Worker aufwärmen).
+
+Ausgabe: Latenzen (p50/p90/p99/max) je Endpunkt, Requests/s, Statuscodes, der größte
+Speicherbedarf (RSS, aus /proc, nur Linux) je Worker und die vom Upstream gelieferten
+Bytes und Requests.
+
+    python -m benchmarks.loadtest [--workers 3] [--clients 32] [--duration 30] [--latency 50]
+        [--bandwidth 50] [--worker-class uvicorn] [--env GHCN_RESPONSE_CACHE=file] [--json DATEI]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import requests
+
+from benchmarks.synthetic import CATALOG_CLUSTERS, catalog_texts, station_csv_bytes, station_frame
+
+ROOT = Path(__file__).resolve().parent.parent
+STATIONS_FILE = "ghcnd-stations.txt"
+INVENTORY_FILE = "ghcnd-inventory.txt"
+WRITE_CHUNK_SIZE = 64 * 1024
+
+WORKER_CLASSES = {
+    "sync": ("weather_stations.wsgi:application", "sync", {}),
+    "gthread": ("weather_stations.wsgi:application", "gthread", {}),
+    "uvicorn": ("weather_stations.asgi:application", "uvicorn.workers.UvicornWorker", {"GHCN_ASYNC_VIEWS": "1"}),
+}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    GET auf die Dateien des Ersatz-Buckets (siehe StandInServer).
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        entry = server.files.get(self.path.lstrip("/"))
+        if entry is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            server.count(404, 0)
+            return
+        data, etag = entry
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            server.count(304, 0)
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        start = time.perf_counter()
+        for offset in range(0, len(data), WRITE_CHUNK_SIZE):
+            self.wfile.write(data[offset:offset + WRITE_CHUNK_SIZE])
+            if server.bandwidth:
+                # Gedrosselt auf die Bandbreite einer Verbindung
+                delay = start + (offset + WRITE_CHUNK_SIZE) / server.bandwidth - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        server.count(200, len(data))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Ersatz für den NOAA-Bucket: files ist Pfad -> Bytes, latency in Sekunden je Request,
+    bandwidth in Bytes/s je Verbindung (0 = unbegrenzt).
+    """
+    daemon_threads = True
+
+    def __init__(self, files, latency=0.0, bandwidth=0):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.files = {path: (data, '"' + hashlib.sha256(data).hexdigest()[:16] + '"') for path, data in files.items()}
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.stats = {"requests": 0, "bytes": 0, "status": {}}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, status, size):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += size
+            self.stats["status"][status] = self.stats["status"].get(status, 0) + 1
+
+
+def build_files(stations, station_files, seed=0):
+    """
+    Dateien des Ersatz-Buckets und die Stationen mit Stationsdatei als [(station_id, first_year, last_year)].
+    Die Stationsdateien decken den Zeitraum aus dem Inventar ab (10 bis 150 Jahre).
+    """
+    stations_text, inventory_text = catalog_texts(stations, seed=seed)
+    files = {STATIONS_FILE: stations_text.encode("ascii"), INVENTORY_FILE: inventory_text.encode("ascii")}
+    ranges = {}
+    for line in inventory_text.splitlines():
+        station_id, first, last = line[:11], int(line.split()[4]), int(line.split()[5])
+        if len(ranges) >= station_files and station_id not in ranges:
+            break
+        ranges[station_id] = (first, last)
+    pool = []
+    for i, (station_id, (first, last)) in enumerate(ranges.items()):
+        print(f"\rStationsdateien {i + 1}/{len(ranges)}", end="", file=sys.stderr)
+        frame = station_frame(station_id, first, last, seed=i)
+        files[f"csv.gz/by_station/{station_id}.csv.gz"] = gzip.compress(station_csv_bytes(frame), 6)
+        pool.append((station_id, first, last))
+    print(file=sys.stderr)
+    return files, pool
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(args, upstream_url, cache_dir):
+    """
+    Startet gunicorn mit dem Ersatz-Bucket als Upstream und wartet, bis es antwortet.
+    """
+    application, worker_class, extra_env = WORKER_CLASSES[args.worker_class]
+    port = free_port()
+    # GHCN_WORKERS statt --workers: die Anwendung teilt damit die CPU-Kerne auf die Worker auf
+    env = dict(os.environ, GHCN_BASE_URL=upstream_url, GHCN_CACHE_DIR=str(cache_dir), GHCN_WORKERS=str(args.workers),
+               **extra_env)
+    env.update(item.split("=", 1) for item in args.env)
+    command = [sys.executable, "-m", "gunicorn", application, "--bind", f"127.0.0.1:{port}",
+               "--worker-class", worker_class, "--threads", str(args.threads),
+               "--timeout", "120", "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn wurde mit Code {process.returncode} beendet")
+        try:
+            requests.get(url + "/", timeout=1)
+            return process, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn antwortet nicht")
+
+
+def worker_pids(master_pid):
+    """
+    Prozesse, deren Elternprozess master_pid ist (die gunicorn-Worker), aus /proc.
+    """
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Feld 4 nach dem Prozessnamen in Klammern
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == master_pid:
+            pids.append(int(entry))
+    return pids
+
+
+def rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class RssSampler(threading.Thread):
+    """
+    Ermittelt alle interval Sekunden den RSS der Worker und merkt sich je Worker den größten Wert.
+    """
+
+    def __init__(self, master_pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peak = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        if not os.path.isdir("/proc"):
+            return
+        while not self.stopped.wait(self.interval):
+            for pid in worker_pids(self.master_pid):
+                self.peak[pid] = max(self.peak.get(pid, 0), rss_bytes(pid))
+
+
+class Workload:
+    """
+    Erzeugt die Anfragen der Clients (Pfad, Parameter, Name des Endpunkts).
+    """
+
+    def __init__(self, pool, search_share, popular_share, seed=0):
+        self.pool = pool
+        self.search_share = search_share
+        self.popular_share = popular_share
+        rng = random.Random(seed)
+        self.popular = [self.random_request(rng) for _ in range(20)]
+
+    def search(self, rng):
+        lat, lon, spread = rng.choice(CATALOG_CLUSTERS)
+        start_year = rng.randint(1950, 2010)
+        return "/api/search_stations/", {
+            "latitude": round(lat + rng.gauss(0, spread), 4),
+            "longitude": round(lon + rng.gauss(0, spread), 4),
+            "radius": rng.choice((10, 25, 50, 100)),
+            "station_count": rng.choice((10, 25, 50, 100)),
+            "start_year": start_year,
+            "end_year": rng.randint(start_year, 2024),
+        }, "search_stations"
+
+    def station_data(self, rng):
+        station_id, first, last = rng.choice(self.pool)
+        start_year = rng.randint(first, last)
+        return "/api/get_station_data/", {
+            "station_id": station_id, "start_year": start_year, "end_year": rng.randint(start_year, last),
+        }, "get_station_data"
+
+    def random_request(self, rng):
+        return self.search(rng) if rng.random() < self.search_share else self.station_data(rng)
+
+    def next(self, rng):
+        if rng.random() < self.popular_share:
+            return rng.choice(self.popular)
+        return self.random_request(rng)
+
+
+def run_clients(url, workload, clients, warmup, duration):
+    """
+    Lässt clients Threads Anfragen schicken; liefert [(Endpunkt, Sekunden, Status)] nach der Aufwärmphase
+    und die gemessene Dauer.
+    """
+    results = []
+    lock = threading.Lock()
+    start = time.monotonic()
+    measure_from, stop_at = start + warmup, start + warmup + duration
+
+    def client(index):
+        rng = random.Random(index)
+        session = requests.Session()
+        own = []
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            path, params, endpoint = workload.next(rng)
+            begin = time.perf_counter()
+            try:
+                status = session.get(url + path, params=params, timeout=120).status_code
+            except requests.RequestException:
+                status = "error"
+            if now >= measure_from:
+                own.append((endpoint, time.perf_counter() - begin, status))
+        with lock:
+            results.extend(own)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, duration
+
+
+def summarize(results, elapsed):
+    """
+    Kennzahlen je Endpunkt und gesamt: Anzahl, Requests/s, Latenz-Perzentile (Sekunden), Statuscodes.
+    """
+    summary = {}
+    groups = {"gesamt": results}
+    for row in results:
+        groups.setdefault(row[0], []).append(row)
+    for name, rows in groups.items():
+        latencies = np.array([seconds for _, seconds, _ in rows]) if rows else np.zeros(1)
+        statuses = {}
+        for _, _, status in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        summary[name] = {
+            "requests": len(rows),
+            "requests_per_second": len(rows) / elapsed,
+            "p50": float(np.percentile(latencies, 50)),
+            "p90": float(np.percentile(latencies, 90)),
+            "p99": float(np.percentile(latencies, 99)),
+            "max": float(latencies.max()),
+            "status": statuses,
+        }
+    return summary
+
+
+def report(summary, peak_rss, upstream_stats, args):
+    print(f"{args.workers} Worker ({args.worker_class}, {args.threads} Threads), {args.clients} Clients, "
+          f"{args.duration:.0f} s, Latenz {args.latency:.0f} ms, Bandbreite "
+          f"{f'{args.bandwidth:.0f} MBit/s' if args.bandwidth else 'unbegrenzt'}")
+    print(f"{'Endpunkt':<20} {'Requests':>9} {'req/s':>8} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}  Status")
+    for name, row in summary.items():
+        print(f"{name:<20} {row['requests']:>9} {row['requests_per_second']:>8.1f} "
+              + " ".join(f"{row[key] * 1000:>7.1f}ms" for key in ("p50", "p90", "p99", "max"))
+              + "  " + ", ".join(f"{status}: {count}" for status, count in sorted(row["status"].items())))
+    if peak_rss:
+        print("RSS (Spitze) je Worker: " + ", ".join(f"{rss / 1024 ** 2:.0f} MiB" for rss in peak_rss.values())
+              + f"; gesamt {sum(peak_rss.values()) / 1024 ** 2:.0f} MiB")
+    print(f"Upstream: {upstream_stats['requests']} Requests "
+          f"({', '.join(f'{status}: {count}' for status, count in sorted(upstream_stats['status'].items()))}), "
+          f"{upstream_stats['bytes'] / 1024 ** 2:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=1, help="Threads je Worker (gthread)")
+    parser.add_argument("--worker-class", choices=sorted(WORKER_CLASSES), default="sync")
+    parser.add_argument("--clients", type=int, default=32, help="gleichzeitige Clients")
+    parser.add_argument("--duration", type=float, default=30, help="gemessene Dauer in Sekunden")
+    parser.add_argument("--warmup", type=float, default=5, help="nicht gewertete Sekunden am Anfang")
+    parser.add_argument("--search-share", type=float, default=0.5, help="Anteil search_stations (Rest: get_station_data)")
+    parser.add_argument("--popular", type=float, default=0.5, help="Anteil wiederholter Anfragen")
+    parser.add_argument("--stations", type=int, default=125_000, help="Stationen im Katalog")
+    parser.add_argument("--station-files", type=int, default=30, help="Stationen mit Stationsdatei")
+    parser.add_argument("--latency", type=float, default=0, help="Latenz des Upstreams je Request in ms")
+    parser.add_argument("--bandwidth", type=float, default=0, help="Bandbreite je Upstream-Verbindung in MBit/s")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=WERT",
+                        help="zusätzliche Umgebungsvariable für gunicorn (z.B. GHCN_RESPONSE_CACHE=file)")
+    parser.add_argument("--json", type=Path, help="Ergebnis zusätzlich als JSON speichern")
+    args = parser.parse_args()
+
+    files, pool = build_files(args.stations, args.station_files)
+    upstream = StandInServer(files, args.latency / 1000, args.bandwidth * 1e6 / 8)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    cache_dir = Path(tempfile.mkdtemp(prefix="loadtest_"))
+    process = None
+    try:
+        process, url = start_app(args, upstream.url, cache_dir)
+        sampler = RssSampler(process.pid)
+        sampler.start()
+        workload = Workload(pool, args.search_share, args.popular)
+        results, elapsed = run_clients(url, workload, args.clients, args.warmup, args.duration)
+        sampler.stopped.set()
+        summary = summarize(results, elapsed)
+        report(summary, sampler.peak, upstream.stats, args)
+        if args.json:
+            args.json.write_text(json.dumps({
+                "parameters": {key: value for key, value in vars(args).items() if key != "json"},
+                "latency": summary,
+                "peak_rss": list(sampler.peak.values()),
+                "upstream": upstream.stats,
+            }, indent=2, default=str) + "\n", encoding="utf-8")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(30)
+        upstream.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Benchmark-Suite mit gespeicherten Baselines: misst die Such- und Auswertungspfade
+auf synthetischen Daten (ohne Netzwerk) und meldet Verschlechterungen.
+
+Erzeugt werden ein Katalog mit --stations Stationen (ghcnd-stations.txt und
+ghcnd-inventory.txt, siehe synthetic.catalog_texts()) und Stationsdateien über
+--years Jahre mit gemischten Messgrößen. Der Upstream wird durch diese Dateien im
+Speicher ersetzt; die Endpunkte laufen über den Django-Test-Client samt Middleware,
+sodass zu jeder Messung auch die Schritte aus dem Server-Timing-Header vorliegen.
+
+Fälle:
+  - haversine_many, index_within: Entfernungen zu allen Stationen bzw. Umkreissuche
+  - search_stations_cold: Suche ohne Katalog (Download, Parsen, catalog.bin schreiben)
+  - search_stations: Suche mit geladenem Katalog (ohne Antwort-Cache)
+  - get_station_data_cold_{N}y: Station über N Jahre ohne jeden Cache (Download und Aggregation)
+  - get_station_data_{N}y: mit gespeichertem Aggregat (ohne Antwort-Cache)
+
+Je Fall zählt die beste von --repeat Messungen. Mit --save wird das Ergebnis als
+Baseline (JSON) gespeichert, mit --compare damit verglichen: ist ein Fall um mehr als
+--threshold (relativ) und mehr als --min-delta Millisekunden langsamer, endet die Suite
+mit Exit-Code 1. Baselines gelten nur für den Rechner, auf dem sie entstanden sind.
+
+    python -m benchmarks.suite [--quick] [--save [DATEI]] [--compare [DATEI]] [--threshold 0.2]
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+os.environ["GHCN_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_suite_")
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import requests  # noqa: E402
+from unittest.mock import patch  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from benchmarks.synthetic import CATALOG_CLUSTERS, catalog_texts, station_csv_bytes, station_frame  # noqa: E402
+from weather_stations import aggregates, catalog, series, station_cache  # noqa: E402
+from weather_stations.geo import StationIndex, haversine_many  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "suite.json"
+
+# Suchpunkt (Mittelpunkt des ersten Ballungsraums) und Radius der Suche
+QUERY = CATALOG_CLUSTERS[0][:2]
+SEARCH_RADIUS = 100
+
+
+class SyntheticUpstream:
+    """
+    Ersatz für requests.Session.get: liefert die Dateien aus files (Pfad im Bucket -> Bytes), sonst 404.
+    """
+
+    def __init__(self, files):
+        self.files = files
+
+    def get(self, url, headers=None, stream=False, **kwargs):
+        path = url.split("/", 3)[-1]
+        response = requests.models.Response()
+        response.url = url
+        response.headers["ETag"] = f'"{path}"'
+        data = self.files.get(path)
+        if data is None:
+            response.status_code, response.reason, data = 404, "Not Found", b""
+        else:
+            response.status_code, response.reason = 200, "OK"
+        response.raw = BytesIO(data)
+        if not stream:
+            response._content = data
+        return response
+
+
+def timing_phases(header):
+    """
+    Schritte aus einem Server-Timing-Header als {Name: Sekunden} (ohne total).
+    """
+    phases = {}
+    for entry in header.split(", "):
+        name, _, duration = entry.partition(";dur=")
+        if name != "total":
+            phases[name] = float(duration) / 1000
+    return phases
+
+
+def measure(function, repeat, reset=None):
+    """
+    Führt function() repeat-mal aus (vorher jeweils reset()) und liefert das Ergebnis
+    {"best", "median", "phases"}; function() kann eine Antwort mit Server-Timing liefern,
+    deren Schritte (der besten Messung) übernommen werden.
+    """
+    timings, phases = [], {}
+    for _ in range(repeat):
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if getattr(result, "status_code", 200) != 200:
+            raise RuntimeError(f"Antwort mit Status {result.status_code}: {result.content[:200]!r}")
+        if not timings or elapsed < min(timings):
+            phases = timing_phases(result["Server-Timing"]) if hasattr(result, "has_header") else {}
+        timings.append(elapsed)
+    return {"best": min(timings), "median": statistics.median(timings), "phases": phases}
+
+
+def clear_caches(catalog_too=False):
+    """
+    Verwirft den Antwort-Cache und die Stationsdateien, Aggregate und Zeitreihen (optional auch den Katalog).
+    """
+    caches["responses"].clear()
+    for directory in (station_cache.cache_directory(), aggregates.aggregate_directory(), series.series_directory()):
+        shutil.rmtree(directory, ignore_errors=True)
+    if catalog_too:
+        shutil.rmtree(catalog.get_cache().directory, ignore_errors=True)
+        catalog.reset()
+
+
+def run(args):
+    print(f"Erzeuge Katalog mit {args.stations} Stationen und Stationsdateien über {args.years} Jahre ...",
+          file=sys.stderr)
+    stations_text, inventory_text = catalog_texts(args.stations)
+    files = {
+        catalog.STATIONS_FILE: stations_text.encode("ascii"),
+        catalog.INVENTORY_FILE: inventory_text.encode("ascii"),
+    }
+    for years in args.years:
+        frame = station_frame(f"SYN{years:08d}", 2025 - years, 2024, seed=years)
+        files[f"csv.gz/by_station/SYN{years:08d}.csv.gz"] = gzip.compress(station_csv_bytes(frame), 6)
+
+    client = Client(SERVER_NAME="localhost")
+    cases = {}
+
+    def case(name, function, reset=None, repeat=None):
+        if args.cases and not any(pattern in name for pattern in args.cases):
+            return
+        cases[name] = measure(function, repeat or args.repeat, reset)
+        print(f"  {name:<32} {cases[name]['best'] * 1000:10.2f} ms", file=sys.stderr)
+
+    with patch("requests.Session.get", SyntheticUpstream(files).get):
+        parsed = catalog.parse_stations(stations_text.splitlines())
+        lats, lons = np.array(parsed["latitudes"]), np.array(parsed["longitudes"])
+        index = StationIndex(lats, lons)
+        case("haversine_many", lambda: haversine_many(*QUERY, lats, lons))
+        case("index_within", lambda: index.within(*QUERY, SEARCH_RADIUS))
+
+        search = {"latitude": QUERY[0], "longitude": QUERY[1], "radius": SEARCH_RADIUS, "station_count": 100,
+                  "start_year": 1990, "end_year": 2020}
+        search_url = "/api/search_stations/"
+        case("search_stations_cold", lambda: client.get(search_url, search),
+             reset=lambda: clear_caches(catalog_too=True), repeat=max(args.repeat // 2, 1))
+        case("search_stations", lambda: client.get(search_url, search), reset=caches["responses"].clear)
+
+        for years in args.years:
+            params = {"station_id": f"SYN{years:08d}", "start_year": 2024 - years + 1, "end_year": 2024}
+            data_url = "/api/get_station_data/"
+            case(f"get_station_data_cold_{years}y", lambda: client.get(data_url, params), reset=clear_caches)
+            client.get(data_url, params)
+            case(f"get_station_data_{years}y", lambda: client.get(data_url, params),
+                 reset=caches["responses"].clear)
+    return cases
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "django": django.get_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(cases, baseline, threshold, min_delta):
+    """
+    Vergleicht die besten Zeiten mit der Baseline; liefert die Namen der verschlechterten Fälle.
+    """
+    regressions = []
+    print(f"{'Fall':<32} {'Baseline':>12} {'jetzt':>12} {'Änderung':>10}")
+    for name, result in cases.items():
+        before = baseline.get("cases", {}).get(name)
+        if before is None:
+            print(f"{name:<32} {'-':>12} {result['best'] * 1000:10.2f} ms {'neu':>10}")
+            continue
+        change = result["best"] / before["best"] - 1
+        regressed = change > threshold and (result["best"] - before["best"]) * 1000 > min_delta
+        marker = "  LANGSAMER" if regressed else ""
+        print(f"{name:<32} {before['best'] * 1000:10.2f} ms {result['best'] * 1000:10.2f} ms {change:+10.1%}{marker}")
+        if regressed:
+            regressions.append(name)
+            # Die Schritte zeigen, wo die Zeit verloren ging
+            for phase, seconds in sorted(result["phases"].items()):
+                previous = before.get("phases", {}).get(phase)
+                if previous:
+                    print(f"    {phase:<28} {previous * 1000:10.2f} ms {seconds * 1000:10.2f} ms "
+                          f"{seconds / previous - 1:+10.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, default=125_000)
+    parser.add_argument("--years", default="10,50,150", help="Jahre je Stationsdatei, kommagetrennt")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="kleiner Katalog, kürzere Dateien, weniger Durchläufe")
+    parser.add_argument("--cases", nargs="*", help="nur Fälle, deren Name einen dieser Texte enthält")
+    parser.add_argument("--save", nargs="?", const=BASELINE_PATH, type=Path, help="Ergebnis als Baseline speichern")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, type=Path, help="mit Baseline vergleichen")
+    parser.add_argument("--threshold", type=float, default=0.2, help="erlaubte Verschlechterung (Standard: 0.2)")
+    parser.add_argument("--min-delta", type=float, default=1.0,
+                        help="kleinere Verschlechterungen in Millisekunden gelten als Rauschen (Standard: 1)")
+    args = parser.parse_args()
+    if args.quick:
+        args.stations, args.years, args.repeat = min(args.stations, 20_000), "10,50", min(args.repeat, 3)
+    args.years = [int(years) for years in args.years.split(",")]
+
+    try:
+        cases = run(args)
+    finally:
+        shutil.rmtree(os.environ["GHCN_CACHE_DIR"], ignore_errors=True)
+    result = {"environment": environment(), "parameters": {"stations": args.stations, "years": args.years,
+                                                           "repeat": args.repeat}, "cases": cases}
+
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("parameters") != result["parameters"]:
+            print(f"Hinweis: Parameter weichen von der Baseline ab ({baseline.get('parameters')})")
+        regressions = compare(cases, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"{len(regressions)} Fall/Fälle langsamer als {args.threshold:.0%} über der Baseline: "
+                  + ", ".join(regressions))
+            status = 1
+    else:
+        print(json.dumps(result, indent=2))
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline gespeichert: {args.save}", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Generatoren für synthetische GHCN-Daten (reproduzierbar über den Seed).
+"""
+import gzip
+
+import numpy as np
+import pandas as pd
+
+# Elemente einer typischen Station mit Wertebereich (Zehntel) und Anteil fehlender Tage
+STATION_ELEMENTS = (
+    ("TMAX", -100, 380, 0.05),
+    ("TMIN", -250, 220, 0.05),
+    ("PRCP", 0, 800, 0.02),
+    ("SNWD", 0, 500, 0.6),
+    ("TAVG", -150, 300, 0.5),
+)
+
+
+def station_frame(station_id="SYN00000001", first_year=1875, last_year=2024, seed=0, elements=STATION_ELEMENTS):
+    """
+    Tageswerte einer Station als DataFrame mit den Spalten der GHCN-CSV-Dateien
+    (DATE als YYYYMMDD-String), sortiert nach Datum und Element.
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(f"{first_year}-01-01", f"{last_year}-12-31")
+    dates = days.strftime("%Y%m%d").to_numpy()
+    frames = []
+    for element, low, high, missing in elements:
+        keep = rng.random(len(days)) >= missing
+        n = int(keep.sum())
+        frames.append(pd.DataFrame({
+            "ID": station_id,
+            "DATE": dates[keep],
+            "ELEMENT": element,
+            "VALUE": rng.integers(low, high, n),
+            "M-FLAG": "",
+            "Q-FLAG": np.where(rng.random(n) < 0.001, "I", ""),
+            "S-FLAG": "E",
+            "OBS-TIME": "",
+        }))
+    return pd.concat(frames).sort_values(["DATE", "ELEMENT"], kind="stable").reset_index(drop=True)
+
+
+def station_csv_bytes(frame):
+    """
+    DataFrame im Format von station_frame() als CSV-Bytes (ohne Kopfzeile, wie im Bucket).
+    """
+    return frame.to_csv(header=False, index=False).encode("ascii")
+
+
+def write_station_file(path, frame):
+    """
+    Schreibt die Station als csv.gz-Datei und liefert die Größe der unkomprimierten Daten.
+    """
+    data = station_csv_bytes(frame)
+    with gzip.open(path, "wb", compresslevel=6) as f:
+        f.write(data)
+    return len(data)
+
+
+# Ballungsräume mit vielen Stationen (wie Mitteleuropa oder die USA im echten Katalog):
+# (Breite, Länge, Streuung in Grad); der erste ist der Suchpunkt der Benchmarks (Frankfurt)
+CATALOG_CLUSTERS = ((50.11, 8.68, 1.5), (40.0, -95.0, 8.0), (35.0, 135.0, 3.0), (-33.0, 150.0, 2.0))
+CLUSTER_SHARE = 0.4
+
+
+def catalog_texts(count=125_000, seed=0, last_year=2024):
+    """
+    Synthetischer Stationskatalog im Format von ghcnd-stations.txt und ghcnd-inventory.txt
+    (feste Spalten wie im Bucket). Die Stationen liegen teils gleichverteilt auf der Kugel,
+    teils in CATALOG_CLUSTERS; je Station gibt es TMAX, TMIN und PRCP (manche auch SNWD)
+    über 10 bis 150 Jahre, ein Teil der Stationen endet vor last_year.
+    Ergebnis: (stations_text, inventory_text).
+    """
+    rng = np.random.default_rng(seed)
+    clustered = rng.random(count) < CLUSTER_SHARE
+    cluster = rng.integers(0, len(CATALOG_CLUSTERS), count)
+    centers = np.array(CATALOG_CLUSTERS)[cluster]
+    lats = np.where(clustered, centers[:, 0] + rng.normal(0, 1, count) * centers[:, 2],
+                    np.degrees(np.arcsin(rng.uniform(-1, 1, count))))
+    lons = np.where(clustered, centers[:, 1] + rng.normal(0, 1, count) * centers[:, 2], rng.uniform(-180, 180, count))
+    lats = np.clip(lats, -90, 90).round(4)
+    lons = ((lons + 180) % 360 - 180).round(4)
+    elevations = rng.uniform(-10, 3000, count).round(1)
+    ends = np.where(rng.random(count) < 0.7, last_year, rng.integers(1950, last_year, count))
+    starts = ends - rng.integers(10, 151, count) + 1
+    has_snow = rng.random(count) < 0.3
+
+    stations, inventory = [], []
+    for i, (lat, lon, elevation, first, last, snow) in enumerate(zip(
+            lats.tolist(), lons.tolist(), elevations.tolist(), starts.tolist(), ends.tolist(), has_snow.tolist())):
+        station_id = f"SYN{i:08d}"
+        stations.append(f"{station_id:<11} {lat:8.4f} {lon:9.4f} {elevation:6.1f}    SYNTHETIC STATION {i:<12d}")
+        for element in ("TMAX", "TMIN", "PRCP") + (("SNWD",) if snow else ()):
+            inventory.append(f"{station_id:<11} {lat:8.4f} {lon:9.4f} {element} {first} {last}")
+    return "\n".join(stations) + "\n", "\n".join(inventory) + "\n"
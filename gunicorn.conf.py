@@ -0,0 +1,46 @@
+"""
+gunicorn-Konfiguration (gunicorn liest gunicorn.conf.py aus dem Arbeitsverzeichnis).
+
+Mit preload_app lädt der Master die Anwendung einmal und startet die Worker per
+fork(): Django, die Views, NumPy und pandas sowie der Stationskatalog samt räumlichem
+Index liegen dann bereits im Speicher und werden von allen Workern gemeinsam
+(copy-on-write) genutzt. Ein neuer Worker (auch nach max_requests oder einem
+Absturz) beantwortet sofort Requests, statt erst Module zu importieren und den
+Katalog zu laden.
+
+Abschaltbar mit GHCN_PRELOAD=0; dann lädt jeder Worker die Anwendung selbst (nötig
+z.B. für einen Code-Reload per HUP, da der Master den Code sonst nicht neu lädt).
+
+Die Anzahl der Worker (GHCN_WORKERS, Standard 3) liest auch settings.py, um die CPU-Kerne
+auf die Prozess-Pools der Worker aufzuteilen (siehe batch.process_count()).
+
+Das Worker-Timeout (GHCN_WORKER_TIMEOUT, Standard 90 s statt gunicorns 30 s) liest auch
+settings.py; die Frist des Batch-Endpunkts (GHCN_BATCH_TIMEOUT) liegt standardmäßig
+darunter, damit ein sync-Worker nicht mitten in einer Batch-Anfrage beendet wird.
+"""
+import os
+
+preload_app = os.environ.get("GHCN_PRELOAD", "1") == "1"
+workers = int(os.environ.get("GHCN_WORKERS", 3))
+timeout = int(os.environ.get("GHCN_WORKER_TIMEOUT", 90))
+
+
+def when_ready(server):
+    """
+    Läuft im Master nach dem Laden der Anwendung und vor dem Start der Worker.
+    """
+    if not preload_app:
+        return
+    from django.urls import get_resolver
+
+    from weather_stations import catalog
+
+    # URLconf und Views (werden sonst erst beim ersten Request importiert) sowie pandas (siehe parsing.py)
+    get_resolver().url_patterns
+    import pandas  # noqa: F401
+
+    try:
+        catalog.preload()
+    except Exception:
+        # Ohne Katalog starten die Worker trotzdem und laden ihn bei der ersten Suche
+        server.log.warning("Stationskatalog konnte nicht vorab geladen werden", exc_info=True)
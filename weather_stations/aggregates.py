@@ -0,0 +1,620 @@
+"""
+Vorberechnete Monatsaggregate je Station.
+
+Für jede Station werden beim ersten Abruf aus der csv.gz-Datei die Summen und
+Anzahlen der Tageswerte je Jahr, Monat und Messgröße (TMAX, TMIN) berechnet und
+als kleine .npz-Datei unter GHCN_CACHE_DIR/aggregates abgelegt. Jahres- und
+Jahreszeitenmittel für beliebige Zeiträume ergeben sich daraus in O(Jahre),
+ohne die Rohdatei erneut zu öffnen. Die Summen sind Summen der Rohwerte in
+Zehntel Grad und damit exakt.
+
+Die API liefert dieselben Strings wie die ursprüngliche Berechnung, die je Zeitraum
+(VALUE / 10.0).mean() mit pandas bildete. Fast immer ergibt das exakte Mittel denselben
+String; nur wenn es genau auf einer Rundungsgrenze liegt (x.x5 °C, oder 0, wo das
+Vorzeichen von "-0.0" vom Rundungsfehler abhängt), entscheidet der Rundungsfehler der
+float-Summe. Für diese seltenen Zeiträume wird das Mittel beim Aggregieren aus den
+Rohzeilen wie bisher berechnet und im Aggregat mitgespeichert (ties).
+
+Eine JSON-Datei neben dem Aggregat enthält die Kennung der Quelldatei
+(station_cache.source_version()) und den Zeitpunkt der letzten Prüfung. Erst
+nach GHCN_STATION_CACHE_TTL wird die Stationsdatei erneut geprüft; hat sie
+sich geändert, wird das Aggregat neu berechnet, allerdings nur für die Jahre,
+deren Zeilen sich geändert haben: Zu jedem Jahr der Datei wird ein Fingerabdruck
+(Anzahl Zeilen und CRC-32) mitgespeichert. Da täglich meist nur Zeilen am Ende
+hinzukommen, wird in der Regel nur das letzte Jahr neu geparst; die übrigen
+Monatssummen werden aus dem bisherigen Aggregat übernommen.
+"""
+import json
+import time
+from collections import namedtuple
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics, parsing, series as station_series, station_cache
+from .parsing import iter_station_chunks, iter_year_blocks, open_station_file
+from .storage import atomic_open, atomic_write
+
+ELEMENTS = ("TMAX", "TMIN")
+
+# Jahreszeiten mit ihren Monaten; der Winter eines Jahres umfasst den Dezember des Vorjahres
+SEASONS = {
+    "spring": (3, 4, 5),
+    "summer": (6, 7, 8),
+    "autumn": (9, 10, 11),
+    "winter": (12, 1, 2),
+}
+
+# Zeiträume der Mittelwerte (Index in den Schlüsseln von StationAggregates.ties)
+PERIODS = ("annual",) + tuple(SEASONS)
+
+# Rohzeilen der Messgrößen ELEMENTS in Dateireihenfolge: Jahr, Monat, Index der Messgröße
+# und Wert in Zehnteln (NaN für fehlende Werte), siehe _resolve_ties()
+Rows = namedtuple("Rows", ["years", "months", "elements", "values"])
+
+# Je Monat (Januar..Dezember): Index der Jahreszeit in SEASONS und Versatz des Jahreszeit-Jahres
+# (der Dezember zählt zum Winter des Folgejahres)
+MONTH_SEASON = np.array([3, 3, 0, 0, 0, 1, 1, 1, 2, 2, 2, 3])
+MONTH_YEAR_SHIFT = np.array([0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1])
+
+# Zeilen pro Block beim Aggregieren während des Downloads: kleinere Blöcke als beim
+# Lesen von der Platte, damit nach dem letzten Netzwerkblock nur wenig Arbeit übrig bleibt
+STREAM_CHUNK_ROWS = 50_000
+
+
+class StationAggregates:
+    """
+    Monatssummen und -anzahlen einer Station.
+
+    sums und counts haben die Form (Jahre, 12, len(ELEMENTS)); Jahr i entspricht
+    first_year + i, Monat m dem Index m - 1. fingerprints ordnet jedem Jahr der
+    Quelldatei (Anzahl Zeilen, CRC-32) seiner Zeilen zu, oder ist None, wenn das
+    Aggregat nicht jahresweise aktualisiert werden kann. ties enthält die Mittel in °C
+    der Zeiträume, deren exaktes Mittel auf einer Rundungsgrenze liegt, so wie sie die
+    ursprüngliche Berechnung liefert: (Jahr, Index in PERIODS, Index in ELEMENTS) -> Mittel.
+    """
+
+    def __init__(self, first_year, sums, counts, fingerprints=None, ties=None):
+        self.first_year = int(first_year)
+        self.sums = sums
+        self.counts = counts
+        self.fingerprints = fingerprints
+        self.ties = {} if ties is None else ties
+
+    @property
+    def last_year(self):
+        return self.first_year + len(self.sums) - 1
+
+    @classmethod
+    def from_dataframe(cls, data):
+        """
+        Aggregiert einen DataFrame mit den Spalten YEAR, MONTH, ELEMENT und VALUE
+        (Rohwerte in Zehntel Grad, alle Zeilen der Station in Dateireihenfolge).
+        """
+        data = data[data['ELEMENT'].isin(ELEMENTS)]
+        aggregates = cls._totals(data)
+        aggregates.ties = _resolve_ties(aggregates, _frame_rows(data))
+        return aggregates
+
+    @classmethod
+    def _totals(cls, data):
+        """
+        Summen und Anzahlen eines DataFrames (nur Zeilen der Messgrößen ELEMENTS), ohne ties.
+        """
+        if data.empty:
+            return cls.empty()
+        grouped = data.groupby(['YEAR', 'MONTH', 'ELEMENT'])['VALUE'].agg(['sum', 'count'])
+        years = grouped.index.get_level_values('YEAR').to_numpy()
+        months = grouped.index.get_level_values('MONTH').to_numpy()
+        elements = grouped.index.get_level_values('ELEMENT').map(ELEMENTS.index).to_numpy()
+
+        first_year = int(years.min())
+        shape = (int(years.max()) - first_year + 1, 12, len(ELEMENTS))
+        sums = np.zeros(shape)
+        counts = np.zeros(shape, dtype=np.int64)
+        sums[years - first_year, months - 1, elements] = grouped['sum'].to_numpy()
+        counts[years - first_year, months - 1, elements] = grouped['count'].to_numpy()
+        return cls(first_year, sums, counts)
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Aggregiert blockweise gelieferte DataFrames (siehe parsing.iter_station_chunks()),
+        ohne sie je gleichzeitig im Speicher zu halten.
+        """
+        parts, rows = [], []
+        for chunk in chunks:
+            with metrics.phase("aggregate"):
+                chunk = chunk[chunk['ELEMENT'].isin(ELEMENTS)]
+                parts.append(cls._totals(chunk))
+                rows.append(_frame_rows(chunk))
+        with metrics.phase("aggregate"):
+            aggregates = cls.combine(parts)
+            aggregates.ties = _resolve_ties(aggregates, _concat_rows(rows))
+            return aggregates
+
+    @classmethod
+    def from_series(cls, series):
+        """
+        Aggregat aus einer Tageszeitreihe (series.StationSeries) samt Fingerabdrücken, ohne CSV zu parsen.
+        Die Tageswerte müssen in der Reihenfolge der Quelldatei vorliegen (series.ordered).
+        """
+        sums, counts = series.monthly_totals()
+        aggregates = cls(series.first_year, sums, counts, series.fingerprints)
+        aggregates.ties = _resolve_ties(aggregates, series.present_rows())
+        return aggregates
+
+    @classmethod
+    def combine(cls, parts):
+        """
+        Summe beliebig vieler Aggregate in einem Schritt (statt wiederholtem merge()).
+        ties werden nicht übernommen, da sie nur für vollständige Zeiträume gelten.
+        """
+        parts = [part for part in parts if len(part.sums)]
+        if len(parts) <= 1:
+            return parts[0] if parts else cls.empty()
+        first_year = min(part.first_year for part in parts)
+        shape = (max(part.last_year for part in parts) - first_year + 1, 12, len(ELEMENTS))
+        sums = np.zeros(shape)
+        counts = np.zeros(shape, dtype=np.int64)
+        for part in parts:
+            offset = part.first_year - first_year
+            sums[offset:offset + len(part.sums)] += part.sums
+            counts[offset:offset + len(part.counts)] += part.counts
+        return cls(first_year, sums, counts)
+
+    def year(self, year):
+        """
+        Die Monatswerte eines einzelnen Jahres als eigenes Aggregat (leer außerhalb der Daten).
+        """
+        if not self.first_year <= year <= self.last_year:
+            return StationAggregates.empty()
+        i = year - self.first_year
+        return StationAggregates(year, self.sums[i:i + 1], self.counts[i:i + 1])
+
+    @classmethod
+    def empty(cls):
+        return cls(0, np.zeros((0, 12, len(ELEMENTS))), np.zeros((0, 12, len(ELEMENTS)), dtype=np.int64))
+
+    def merge(self, other):
+        """
+        Summe zweier Aggregate (z.B. zweier Blöcke derselben Datei) als neues Aggregat.
+        """
+        return StationAggregates.combine([self, other])
+
+    def save(self, path):
+        keys = sorted(self.ties)
+        arrays = {
+            "first_year": self.first_year, "sums": self.sums, "counts": self.counts,
+            "tie_keys": np.array(keys, dtype=np.int64).reshape(-1, 3),
+            "tie_means": np.array([self.ties[key] for key in keys], dtype=np.float64),
+        }
+        if self.fingerprints is not None:
+            years = sorted(self.fingerprints)
+            arrays["fingerprint_years"] = np.array(years, dtype=np.int64)
+            arrays["fingerprints"] = np.array([self.fingerprints[year] for year in years], dtype=np.int64)
+        with atomic_open(path) as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            fingerprints = None
+            # Ältere Aggregate haben keine Fingerabdrücke und werden beim nächsten Mal ganz neu berechnet
+            if "fingerprints" in data:
+                fingerprints = {
+                    year: (lines, checksum)
+                    for year, (lines, checksum) in zip(data["fingerprint_years"].tolist(),
+                                                       data["fingerprints"].tolist())
+                }
+            # Ohne ties (ältere Aggregate) KeyError: das Aggregat wird dann neu berechnet
+            ties = {tuple(key): mean for key, mean in zip(data["tie_keys"].tolist(), data["tie_means"].tolist())}
+            return cls(data['first_year'], data['sums'], data['counts'], fingerprints, ties)
+
+    def season_totals(self):
+        """
+        Summen und Anzahlen je Jahreszeit in einem Durchgang über alle Monate.
+
+        Jeder Monat wird einem (Jahreszeit-Jahr, Jahreszeit) zugeordnet; der Dezember
+        zählt zum Winter des Folgejahres. Ergebnis: (sums, counts) der Form
+        (Jahre + 1, len(SEASONS), len(ELEMENTS)), Zeile i entspricht Jahr first_year + i.
+        """
+        shape = (len(self.sums) + 1, len(SEASONS), len(ELEMENTS))
+        sums = np.zeros(shape)
+        counts = np.zeros(shape, dtype=np.int64)
+        years = np.arange(len(self.sums))[:, np.newaxis]
+        season_years = years + MONTH_YEAR_SHIFT
+        seasons = np.broadcast_to(MONTH_SEASON, season_years.shape)
+        np.add.at(sums, (season_years, seasons), self.sums)
+        np.add.at(counts, (season_years, seasons), self.counts)
+        return sums, counts
+
+    def totals(self, start_year, end_year):
+        """
+        Summen und Anzahlen für start_year bis end_year (Jahre ohne Daten mit Nullen):
+        (Jahressummen, Jahresanzahlen) der Form (Jahre, len(ELEMENTS)) und
+        (Jahreszeitsummen, Jahreszeitanzahlen) der Form (Jahre, len(SEASONS), len(ELEMENTS)).
+        """
+        season_sums, season_counts = self.season_totals()
+        return (
+            _window(self.sums.sum(axis=1), self.first_year, start_year, end_year),
+            _window(self.counts.sum(axis=1), self.first_year, start_year, end_year),
+            _window(season_sums, self.first_year, start_year, end_year),
+            _window(season_counts, self.first_year, start_year, end_year),
+        )
+
+    def summarize(self, start_year, end_year):
+        """
+        Jährliche und saisonale Durchschnittswerte von TMAX und TMIN für start_year bis end_year,
+        im Format der API (siehe views.get_station_data).
+
+        Die Strings stimmen mit denen der ursprünglichen Berechnung ((VALUE / 10.0).mean()
+        je Zeitraum) überein: Mittel auf einer Rundungsgrenze stammen aus ties.
+        """
+        annual_sums, annual_counts, season_sums, season_counts = self.totals(start_year, end_year)
+        annual_means = _format_means(annual_sums, annual_counts)
+        season_means = _format_means(season_sums, season_counts)
+        for (year, period, e), mean in self.ties.items():
+            if start_year <= year <= end_year:
+                means = annual_means[year - start_year] if period == 0 else \
+                    season_means[year - start_year][period - 1]
+                means[e] = format(mean, '.1f')
+
+        annual = {}
+        seasonal = {}
+        for i, year in enumerate(range(start_year, end_year + 1)):
+            annual[year] = {element: {"avg": annual_means[i][e]} for e, element in enumerate(ELEMENTS)}
+            seasonal[year] = {
+                season: dict(zip(ELEMENTS, season_means[i][s])) for s, season in enumerate(SEASONS)
+            }
+        return {"annual": annual, "seasonal": seasonal}
+
+
+# Gewichtungen für Gebietsmittel: alle Stationen gleich oder umgekehrt proportional zur
+# Entfernung vom Mittelpunkt (Stationen näher als MIN_WEIGHT_DISTANCE km zählen wie in diesem Abstand)
+WEIGHTINGS = ("equal", "distance")
+MIN_WEIGHT_DISTANCE = 1.0
+
+
+def region_weights(distances, weighting):
+    """
+    Gewichte der Stationen mit den Entfernungen distances (km) vom Mittelpunkt des Gebiets.
+    """
+    distances = np.asarray(distances, dtype=float)
+    if weighting == "equal":
+        return np.ones(len(distances))
+    if weighting == "distance":
+        return 1.0 / np.maximum(distances, MIN_WEIGHT_DISTANCE)
+    raise ValueError(f"Unbekannte Gewichtung: {weighting}")
+
+
+def summarize_region(members, weights, start_year, end_year):
+    """
+    Gewichtete Gebietsmittel mehrerer Stationen (members: StationAggregates, weights: je ein Gewicht)
+    im Format von StationAggregates.summarize(); zusätzlich steht bei den Jahreswerten unter
+    "stations" die Anzahl der Stationen, die zu dem Jahr Werte haben.
+
+    Gemittelt werden die Mittelwerte der einzelnen Stationen, damit Stationen mit
+    lückenlosen Aufzeichnungen nicht stärker zählen; Stationen ohne Werte in einem
+    Jahr (bzw. einer Jahreszeit) fallen dort heraus, die übrigen Gewichte werden neu normiert.
+    """
+    years = max(end_year - start_year + 1, 0)
+    annual_sums = np.zeros((len(members), years, len(ELEMENTS)))
+    annual_counts = np.zeros(annual_sums.shape, dtype=np.int64)
+    season_sums = np.zeros((len(members), years, len(SEASONS), len(ELEMENTS)))
+    season_counts = np.zeros(season_sums.shape, dtype=np.int64)
+    for i, member in enumerate(members):
+        annual_sums[i], annual_counts[i], season_sums[i], season_counts[i] = member.totals(start_year, end_year)
+
+    annual_means, annual_stations = _weighted_means(annual_sums, annual_counts, weights)
+    season_means, season_stations = _weighted_means(season_sums, season_counts, weights)
+    annual_means = _format_values(annual_means, annual_stations > 0)
+    season_means = _format_values(season_means, season_stations > 0)
+    annual_stations = annual_stations.tolist()
+
+    annual = {}
+    seasonal = {}
+    for i, year in enumerate(range(start_year, end_year + 1)):
+        annual[year] = {
+            element: {"avg": annual_means[i][e], "stations": annual_stations[i][e]}
+            for e, element in enumerate(ELEMENTS)
+        }
+        seasonal[year] = {
+            season: dict(zip(ELEMENTS, season_means[i][s])) for s, season in enumerate(SEASONS)
+        }
+    return {"annual": annual, "seasonal": seasonal}
+
+
+def _weighted_means(sums, counts, weights):
+    """
+    Gewichteter Mittelwert der Stationsmittel sums / counts über die erste Achse (Stationen):
+    (Mittelwerte in Zehntel Grad, Anzahl der Stationen mit Werten).
+    """
+    present = counts > 0
+    weights = np.asarray(weights, dtype=float).reshape((-1,) + (1,) * (sums.ndim - 1)) * present
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(present, sums / np.maximum(counts, 1), 0.0)
+        weighted = (weights * means).sum(axis=0) / weights.sum(axis=0)
+    stations = present.sum(axis=0)
+    return np.where(stations > 0, weighted, 0.0), stations
+
+
+def _window(values, first_year, start_year, end_year):
+    """
+    Schneidet die Zeilen start_year..end_year aus values (Zeile 0 = first_year) aus;
+    Jahre außerhalb der Daten werden mit Nullen aufgefüllt.
+    """
+    result = np.zeros((max(end_year - start_year + 1, 0),) + values.shape[1:], dtype=values.dtype)
+    lo = max(start_year, first_year)
+    hi = min(end_year, first_year + len(values) - 1)
+    if lo <= hi:
+        result[lo - start_year:hi - start_year + 1] = values[lo - first_year:hi - first_year + 1]
+    return result
+
+
+def _format_means(sums, counts):
+    """
+    Mittelwerte in °C als Strings mit einer Nachkommastelle (None ohne Werte), als verschachtelte Listen.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    return _format_values(means, counts != 0)
+
+
+def _format_values(tenths, present):
+    """
+    Werte in Zehntel Grad als °C-Strings mit einer Nachkommastelle (None, wo present falsch ist).
+    """
+    formatted = np.array([format(value, '.1f') for value in (tenths / 10.0).ravel().tolist()], dtype=object)
+    formatted[~present.ravel()] = None
+    return formatted.reshape(tenths.shape).tolist()
+
+
+def _frame_rows(data):
+    """
+    Rows eines DataFrames mit den Spalten YEAR, MONTH, ELEMENT und VALUE (nur Messgrößen ELEMENTS).
+    """
+    return Rows(
+        data['YEAR'].to_numpy(dtype=np.int64),
+        data['MONTH'].to_numpy(dtype=np.int64),
+        data['ELEMENT'].map({element: e for e, element in enumerate(ELEMENTS)}).to_numpy(dtype=np.int64),
+        data['VALUE'].to_numpy(dtype=np.float64),
+    )
+
+
+def _concat_rows(parts):
+    """
+    Fügt Rows in der gegebenen Reihenfolge zusammen.
+    """
+    if not parts:
+        return Rows(*(np.array([], dtype=dtype) for dtype in (np.int64, np.int64, np.int64, np.float64)))
+    return Rows(*(np.concatenate(column) for column in zip(*parts)))
+
+
+def _critical(sums, counts):
+    """
+    Zeiträume, deren exaktes Mittel sums / counts (Zehntel Grad) in °C genau auf einer
+    Rundungsgrenze von format(..., '.1f') liegt: x.x5 oder 0 (Vorzeichen von "-0.0").
+    Nur dort kann der Rundungsfehler einer float-Summe den String ändern.
+    """
+    totals = np.rint(sums).astype(np.int64) * 10
+    hundredths, rest = np.divmod(totals, np.maximum(counts, 1))
+    return (counts > 0) & ((totals == 0) | ((rest == 0) & (hundredths % 10 == 5)))
+
+
+def _baseline_mean(values):
+    """
+    Mittel in °C wie in der ursprünglichen Berechnung: erst durch 10.0 teilen, dann Series.mean().
+    """
+    import pandas as pd
+    return float(pd.Series(values / 10.0).mean())
+
+
+def _resolve_ties(aggregates, rows, reused=(), known=None):
+    """
+    Die Mittel der kritischen Zeiträume (siehe _critical()) von aggregates wie in der
+    ursprünglichen Berechnung, als ties. rows enthält die Rohzeilen aller Jahre außer
+    reused in Dateireihenfolge; Zeiträume, die nur Jahre aus reused betreffen, werden aus
+    known übernommen. Braucht ein Zeitraum Jahre aus beiden Quellen (oder fehlt er in
+    known), ist das Ergebnis None.
+    """
+    reused = set(reused)
+    known = {} if known is None else known
+    first_year = aggregates.first_year
+    season_sums, season_counts = aggregates.season_totals()
+    cells = [(i, 0, e) for i, e in np.argwhere(
+        _critical(aggregates.sums.sum(axis=1), aggregates.counts.sum(axis=1))).tolist()]
+    cells += [(i, s + 1, e) for i, s, e in np.argwhere(_critical(season_sums, season_counts)).tolist()]
+
+    ties = {}
+    for i, period, e in cells:
+        year = first_year + i
+        if PERIODS[period] == "annual":
+            parts = [(year, tuple(range(1, 13)))]
+        elif PERIODS[period] == "winter":
+            # Wie bisher: erst der Dezember des Vorjahres, dann Januar und Februar
+            parts = [(year - 1, (12,)), (year, (1, 2))]
+        else:
+            parts = [(year, SEASONS[PERIODS[period]])]
+        years = {part_year for part_year, _ in parts}
+        key = (year, period, e)
+        if years.isdisjoint(reused):
+            values = [
+                rows.values[(rows.years == part_year) & np.isin(rows.months, months) & (rows.elements == e)]
+                for part_year, months in parts
+            ]
+            ties[key] = _baseline_mean(np.concatenate(values))
+        elif years <= reused and key in known:
+            ties[key] = known[key]
+        else:
+            return None
+    return ties
+
+
+def aggregate_stream(fileobj, chunksize=STREAM_CHUNK_ROWS, parser=None, previous=None):
+    """
+    Berechnet das Aggregat aus den entpackten CSV-Daten fileobj (blockweise, nur TMAX und TMIN)
+    samt den Fingerabdrücken je Jahr. Passt als consume-Funktion für station_cache.fetch().
+
+    previous ist das bisherige Aggregat derselben Station (optional): Jahre, deren
+    Fingerabdruck unverändert ist, werden daraus übernommen statt geparst. Ist die
+    Datei nicht nach Datum sortiert und wurde ein übernommenes Jahr dadurch unvollständig,
+    ist das Ergebnis None; die Datei muss dann ohne previous ausgewertet werden. Dasselbe gilt,
+    wenn ein Mittel auf einer Rundungsgrenze (siehe _resolve_ties()) übernommene und neu
+    geparste Jahre umfasst, z.B. der Winter des ersten geänderten Jahres.
+    """
+    chunksize = chunksize or parsing.CHUNK_ROWS
+    reusable = previous.fingerprints if previous is not None and previous.fingerprints else {}
+    fingerprints = {}
+    sorted_years = True
+    reused = set()
+    parts, rows = [], []
+    pending, pending_lines = [], 0
+
+    def parse_pending():
+        for chunk in iter_station_chunks(BytesIO(b"".join(pending)), ELEMENTS, chunksize=pending_lines,
+                                         parser=parser):
+            with metrics.phase("aggregate"):
+                parts.append(StationAggregates._totals(chunk))
+                rows.append(_frame_rows(chunk))
+
+    for block in iter_year_blocks(fileobj):
+        if block.year in fingerprints:
+            # Jahr kommt mehrfach vor: Fingerabdrücke gelten nicht mehr
+            sorted_years = False
+            if block.year in reused:
+                return None
+        fingerprints[block.year] = (block.lines, block.checksum)
+        if sorted_years and reusable.get(block.year) == fingerprints[block.year]:
+            parts.append(previous.year(block.year))
+            reused.add(block.year)
+            continue
+        pending.append(block.data)
+        pending_lines += block.lines
+        if pending_lines >= chunksize:
+            parse_pending()
+            pending, pending_lines = [], 0
+    if pending:
+        parse_pending()
+
+    with metrics.phase("aggregate"):
+        result = StationAggregates.combine(parts)
+        ties = _resolve_ties(result, _concat_rows(rows), reused, previous.ties if reused else None)
+    if ties is None:
+        return None
+    result.ties = ties
+    result.fingerprints = fingerprints if sorted_years else None
+    return result
+
+
+def build(path, parser=None, previous=None):
+    """
+    Berechnet das Aggregat einer csv.gz-Stationsdatei (unveränderte Jahre aus previous, siehe
+    aggregate_stream()). Mit explizitem parser (siehe parsing.PARSERS) werden keine Settings
+    gelesen, z.B. in einem Worker-Prozess.
+    """
+    with open_station_file(path) as f:
+        return aggregate_stream(f, chunksize=None, parser=parser, previous=previous)
+
+
+def aggregate_directory():
+    return Path(settings.GHCN_CACHE_DIR) / "aggregates"
+
+
+def _paths(station_id):
+    # station_path() prüft die Station-ID, bevor sie als Dateiname benutzt wird
+    station_cache.station_path(station_id)
+    directory = aggregate_directory()
+    return directory / f"{station_id}.npz", directory / f"{station_id}.json"
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_fresh(station_id):
+    """
+    Liefert das gespeicherte Aggregat, wenn es innerhalb von GHCN_STATION_CACHE_TTL
+    geprüft wurde, sonst None.
+    """
+    meta = _read_meta(_paths(station_id)[1])
+    if not meta or time.time() - meta.get("checked_at", 0.0) >= settings.GHCN_STATION_CACHE_TTL:
+        return None
+    return load_stored(station_id)
+
+
+def load_matching(station_id, cached):
+    """
+    Das gespeicherte Aggregat, falls es aus derselben Version der lokalen Stationsdatei
+    cached (station_cache.CachedFile) stammt, sonst None.
+    """
+    if _read_meta(_paths(station_id)[1]).get("source_version") != station_cache.source_version(cached.path):
+        return None
+    return load_stored(station_id)
+
+
+def load_stored(station_id):
+    """
+    Das gespeicherte Aggregat unabhängig von Alter und Dateiversion (z.B. als previous für
+    aggregate_stream()), oder None.
+    """
+    try:
+        return StationAggregates.load(_paths(station_id)[0])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def update(station_id, cached):
+    """
+    Bringt das Aggregat auf den Stand der lokalen Stationsdatei cached (station_cache.CachedFile).
+    Stammt das gespeicherte Aggregat bereits aus derselben Dateiversion, wird es nur als
+    geprüft markiert; sonst wird das schon beim Download berechnete Aggregat
+    (cached.result) übernommen, aus der Tageszeitreihe (series.py) abgeleitet oder die
+    Datei eingelesen und (soweit geändert) neu aggregiert.
+    """
+    version = station_cache.source_version(cached.path)
+    aggregates = load_matching(station_id, cached)
+    if aggregates is None:
+        aggregates = cached.result if isinstance(cached.result, StationAggregates) else None
+        if aggregates is None:
+            # Liegt die Tageszeitreihe derselben Dateiversion vor, muss die CSV-Datei nicht geparst werden
+            series = station_series.load_matching(station_id, cached)
+            if series is not None and series.ordered:
+                aggregates = StationAggregates.from_series(series)
+        if aggregates is None:
+            aggregates = build(cached.path, previous=load_stored(station_id))
+        if aggregates is None:
+            aggregates = build(cached.path)
+        store(station_id, aggregates, version)
+    else:
+        mark_checked(station_id, version)
+    return aggregates
+
+
+def store(station_id, aggregates, version):
+    """
+    Speichert das Aggregat einer Station als geprüft, berechnet aus der Version version der
+    Stationsdatei (siehe station_cache.source_version()).
+    """
+    data_path = _paths(station_id)[0]
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    aggregates.save(data_path)
+    mark_checked(station_id, version)
+
+
+def mark_checked(station_id, version):
+    """
+    Markiert das gespeicherte Aggregat als jetzt geprüft und aktuell zur Version version der Stationsdatei.
+    """
+    meta_path = _paths(station_id)[1]
+    atomic_write(meta_path, json.dumps({"source_version": version, "checked_at": time.time()}).encode("utf-8"))
+
+
+def is_stored(station_id):
+    return _paths(station_id)[0].exists()
@@ -0,0 +1,197 @@
+"""
+Monatsaggregate vieler Stationen in einem Aufruf (für den Batch-Endpunkt).
+
+Je Station:
+
+1. Liegt ein geprüftes Aggregat vor (aggregates.load_fresh()), ist nichts zu tun.
+2. Sonst wird die Stationsdatei über station_cache.fetch() bereitgestellt; die
+   Downloads laufen gleichzeitig in einem Thread-Pool (GHCN_BATCH_DOWNLOAD_THREADS).
+3. Passt das gespeicherte Aggregat nicht zur Dateiversion, wird die Datei in einem
+   Prozess-Pool (GHCN_BATCH_PROCESSES, siehe process_count()) geparst und
+   aggregiert (nur geänderte Jahre, siehe aggregates.aggregate_stream()). Das ist
+   reine CPU-Arbeit, die in Threads am GIL hängen würde.
+
+Fehler betreffen nur die jeweilige Station und werden gesammelt. Ist der Upstream
+ausgelastet (upstream.UpstreamBusy), ist das kein Fehler der Station: solche
+Stationen stehen getrennt in busy (die Views antworten dann mit 503). Stationen, die
+nach GHCN_BATCH_TIMEOUT Sekunden nicht fertig sind, gelten als fehlgeschlagen.
+Das Ergebnis enthält alle bis dahin fertigen Stationen. Nach Ablauf der Frist
+werden keine Dateien mehr an den Prozess-Pool übergeben. Bereits laufende Builds
+lassen sich nicht abbrechen; der Pool wird dann abgelöst (sie laufen im alten
+Pool zu Ende), damit die nächste Anfrage nicht hinter ihnen wartet.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from . import aggregates as station_aggregates, station_cache, upstream
+
+# aggregates: station_id -> StationAggregates, statuses: station_id -> Cache-Status, errors: station_id -> Meldung,
+# busy: station_id -> upstream.UpstreamBusy (Abruf wegen Auslastung abgewiesen)
+BatchResult = namedtuple("BatchResult", ["aggregates", "statuses", "errors", "busy"])
+
+TIMEOUT_ERROR = "Zeitüberschreitung bei der Auswertung der Station."
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def process_count():
+    """
+    Größe des Prozess-Pools: GHCN_BATCH_PROCESSES oder (bei 0) die CPU-Kerne geteilt durch
+    die Anzahl der gunicorn-Worker (GHCN_WORKERS), da jeder Worker seinen eigenen Pool anlegt.
+    """
+    if settings.GHCN_BATCH_PROCESSES:
+        return settings.GHCN_BATCH_PROCESSES
+    return max(1, (os.cpu_count() or 1) // max(settings.GHCN_WORKERS, 1))
+
+
+def get_process_pool():
+    """
+    Prozess-Pool für das Parsen und Aggregieren (wird beim ersten Aufruf angelegt). Die
+    Worker werden mit "spawn" gestartet, da ein fork() aus einem Prozess mit laufenden
+    Threads (Server, Hintergrund-Abgleich) nicht sicher ist.
+    """
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(
+                    process_count(), mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+    return _process_pool
+
+
+def _init_worker():
+    # pandas/NumPy beim Start des Workers laden, nicht erst bei der ersten Station
+    from . import aggregates  # noqa: F401
+
+
+def reset_process_pool():
+    """
+    Beendet den Prozess-Pool (z.B. nachdem ein Worker abgestürzt ist); der nächste Aufruf legt ihn neu an.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _detach_process_pool(pool):
+    """
+    Löst pool als gemeinsamen Pool ab, ohne seine Aufträge abzubrechen (sie können zu
+    anderen, gleichzeitigen Anfragen gehören); seine Prozesse enden nach dem letzten Auftrag.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not pool:
+            return
+        _process_pool = None
+    pool.shutdown(wait=False)
+
+
+def _prepare(station_id):
+    """
+    Schritte 1 und 2 (im Thread-Pool): (Aggregat oder None, Cache-Status, CachedFile oder None,
+    bisheriges Aggregat oder None).
+    """
+    aggregates = station_aggregates.load_fresh(station_id)
+    if aggregates is not None:
+        return aggregates, "hit", None, None
+    try:
+        cached = station_cache.fetch(station_id)
+    except (station_cache.InvalidStationId, upstream.UpstreamBusy):
+        raise
+    except Exception as e:
+        raise RuntimeError(f"Fehler beim Abrufen der Stationsdatei: {e}")
+    aggregates = station_aggregates.load_matching(station_id, cached)
+    previous = station_aggregates.load_stored(station_id) if aggregates is None else None
+    return aggregates, cached.status, cached, previous
+
+
+def _error_message(error):
+    if isinstance(error, station_cache.InvalidStationId):
+        return "Ungültige Station ID."
+    return str(error)
+
+
+def load_many(station_ids, timeout=None):
+    """
+    Aktuelle Monatsaggregate der Stationen station_ids als BatchResult (siehe Moduldokumentation).
+    timeout in Sekunden (Standard: GHCN_BATCH_TIMEOUT).
+    """
+    timeout = settings.GHCN_BATCH_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    parser = settings.GHCN_CSV_PARSER
+    result = BatchResult({}, {}, {}, {})
+    if not station_ids:
+        return result
+
+    threads = ThreadPoolExecutor(min(settings.GHCN_BATCH_DOWNLOAD_THREADS, len(station_ids)),
+                                 thread_name_prefix="batch-download")
+    try:
+        downloads = {threads.submit(_prepare, station_id): station_id for station_id in station_ids}
+        builds = {}
+        pending = set(downloads)
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future in downloads:
+                    station_id = downloads[future]
+                    try:
+                        aggregates, status, cached, previous = future.result()
+                    except upstream.UpstreamBusy as e:
+                        result.busy[station_id] = e
+                        continue
+                    except Exception as e:
+                        result.errors[station_id] = _error_message(e)
+                        continue
+                    result.statuses[station_id] = status
+                    if aggregates is not None:
+                        result.aggregates[station_id] = aggregates
+                        continue
+                    if time.monotonic() >= deadline:
+                        # Das Ergebnis käme ohnehin zu spät und würde nur den Pool belegen
+                        result.errors[station_id] = TIMEOUT_ERROR
+                        continue
+                    try:
+                        pool = get_process_pool()
+                        build = pool.submit(station_aggregates.build, cached.path, parser, previous)
+                    except BrokenProcessPool:
+                        reset_process_pool()
+                        pool = get_process_pool()
+                        build = pool.submit(station_aggregates.build, cached.path, parser, previous)
+                    builds[build] = (station_id, cached, pool)
+                    pending.add(build)
+                else:
+                    station_id, cached, _ = builds[future]
+                    try:
+                        cached = cached._replace(result=future.result())
+                        result.aggregates[station_id] = station_aggregates.update(station_id, cached)
+                    except BrokenProcessPool as e:
+                        reset_process_pool()
+                        result.errors[station_id] = f"Fehler beim Lesen der Stationsdatei: {e}"
+                    except Exception as e:
+                        result.errors[station_id] = f"Fehler beim Lesen der Stationsdatei: {e}"
+
+        for future in pending:
+            if future in downloads:
+                future.cancel()
+                result.errors[downloads[future]] = TIMEOUT_ERROR
+                continue
+            station_id, _, pool = builds[future]
+            if not future.cancel():
+                # Läuft bereits: die nächste Anfrage soll nicht auf diesen Build warten
+                _detach_process_pool(pool)
+            result.errors[station_id] = TIMEOUT_ERROR
+    finally:
+        threads.shutdown(wait=False, cancel_futures=True)
+    return result
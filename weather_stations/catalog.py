@@ -0,0 +1,550 @@
+"""
+Cache für den GHCN-Stationskatalog.
+
+Der Katalog besteht aus zwei Dateien im NOAA-Bucket:
+  - ghcnd-stations.txt  (~10 MB, Koordinaten und Namen aller Stationen)
+  - ghcnd-inventory.txt (~35 MB, verfügbare Messgrößen je Station und Zeitraum)
+
+Beide Dateien werden nur einmal heruntergeladen und geparst. Das Ergebnis wird
+als kompakte, spaltenweise Binärdatei (catalog.bin) im GHCN_CACHE_DIR abgelegt
+und von jedem Worker per mmap eingebunden: die Seiten liegen nur einmal im
+Page-Cache und werden von allen gunicorn-Workern gemeinsam und ohne Kopie
+gelesen; ein Worker-Start parst keinen Text mehr.
+
+Ist der Katalog älter als GHCN_CATALOG_TTL, wird er in einem Hintergrund-Thread
+mit bedingten Requests (ETag/Last-Modified) neu validiert; Suchanfragen lesen
+währenddessen weiter den bisherigen Stand und greifen nie selbst auf das
+Netzwerk zu. Nur der allererste Aufruf (ohne Daten auf der Platte) lädt synchron.
+Die beiden Dateien werden dabei gleichzeitig abgerufen; eine Dateisperre sorgt
+dafür, dass immer nur ein Worker den Katalog lädt bzw. erneuert.
+"""
+import json
+import logging
+import mmap
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics, singleflight, upstream
+from .geo import StationIndex
+from .storage import atomic_write
+
+logger = logging.getLogger(__name__)
+
+STATIONS_FILE = "ghcnd-stations.txt"
+INVENTORY_FILE = "ghcnd-inventory.txt"
+
+# Aufbau von catalog.bin: Kopf (Magic, Version, Anzahl Stationen, Länge des Namens-Blobs, Zellgröße
+# des räumlichen Index), danach die Spalten in fester Reihenfolge, jeweils auf 8 Byte ausgerichtet
+CATALOG_MAGIC = b"GHCNCAT1"
+CATALOG_VERSION = 1
+CATALOG_HEADER = struct.Struct("<8sIIQd")
+ID_WIDTH = 11
+# ghcnd-stations.txt enthält Koordinaten mit vier Nachkommastellen (float32 reicht, um sie exakt wiederherzustellen)
+COORDINATE_DECIMALS = 4
+INDEX_CELL_SIZE = 1.0
+
+# Zeilen der Abdeckungsmatrix (Jahre, 0 = Messgröße nicht vorhanden)
+TMAX_FIRST, TMAX_LAST, TMIN_FIRST, TMIN_LAST = range(4)
+
+# Nach einem fehlgeschlagenen Hintergrund-Abgleich frühestens nach dieser Zeit (Sekunden) erneut versuchen
+FAILED_REFRESH_RETRY = 300
+
+
+class CatalogError(Exception):
+    """
+    Der Stationskatalog konnte nicht geladen werden. Die Nachricht ist für den Client bestimmt.
+    """
+
+
+def parse_stations(lines):
+    """
+    Parst die Zeilen von ghcnd-stations.txt in Spalten (Listen gleicher Länge).
+    Fixed-Width-Parsing: ID [0:11], Latitude [12:20], Longitude [21:30], Name [41:71]
+    """
+    ids, names, latitudes, longitudes = [], [], [], []
+    for line in lines:
+        if len(line) < 71:
+            continue
+        try:
+            station_lat = float(line[12:20].strip())
+            station_lon = float(line[21:30].strip())
+        except ValueError:
+            continue
+        ids.append(line[0:11].strip())
+        names.append(line[41:71].strip())
+        latitudes.append(station_lat)
+        longitudes.append(station_lon)
+    return {"ids": ids, "names": names, "latitudes": latitudes, "longitudes": longitudes}
+
+
+def parse_inventory(lines):
+    """
+    Parst die Zeilen von ghcnd-inventory.txt.
+    Ergebnis: station_id -> { "TMAX": (first_year, last_year), "TMIN": (first_year, last_year) }
+    """
+    inventory = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 6:
+            continue
+        station_id = parts[0]
+        element = parts[3]
+        # Nur TMAX und TMIN berücksichtigen
+        if element not in ["TMAX", "TMIN"]:
+            continue
+        try:
+            first_year = int(parts[4])  # Erstes Jahr, in dem diese Messgröße vorliegt
+            last_year = int(parts[5])   # Letztes Jahr, in dem diese Messgröße vorliegt
+        except ValueError:
+            continue
+        if station_id not in inventory:
+            inventory[station_id] = {}
+        if element in inventory[station_id]:
+            # Falls mehrere Einträge vorhanden sind, nehme den frühesten first_year und den spätesten last_year
+            prev_first, prev_last = inventory[station_id][element]
+            inventory[station_id][element] = (min(prev_first, first_year), max(prev_last, last_year))
+        else:
+            inventory[station_id][element] = (first_year, last_year)
+    return inventory
+
+
+def _layout(n, blob_len, cell_size):
+    """
+    Liefert die Spalten von catalog.bin als Liste (Name, dtype, shape, offset) und die Gesamtgröße.
+    """
+    n_cells = int(np.ceil(180 / cell_size)) * int(np.ceil(360 / cell_size))
+    sections = [
+        ("latitudes", "<f4", (n,)),
+        ("longitudes", "<f4", (n,)),
+        ("ids", f"S{ID_WIDTH}", (n,)),
+        ("name_offsets", "<u4", (n + 1,)),
+        ("name_blob", "u1", (blob_len,)),
+        ("coverage", "<i2", (4, n)),
+        ("index_order", "<i4", (n,)),
+        ("cell_starts", "<i4", (n_cells + 1,)),
+    ]
+    layout = []
+    offset = CATALOG_HEADER.size
+    for name, dtype, shape in sections:
+        dtype = np.dtype(dtype)
+        offset = (offset + 7) & ~7
+        layout.append((name, dtype, shape, offset))
+        offset += dtype.itemsize * int(np.prod(shape))
+    return layout, offset
+
+
+def _restore_coordinates(values):
+    """
+    float32-Koordinaten zurück in die float64-Werte, die float() aus dem Text liefern würde.
+    """
+    return np.round(np.asarray(values, dtype=np.float64), COORDINATE_DECIMALS)
+
+
+def build_catalog(stations, inventory):
+    """
+    Erzeugt den Inhalt von catalog.bin aus den geparsten Teilen (siehe parse_stations()
+    und parse_inventory()). Der räumliche Index wird dabei gleich mit vorberechnet.
+    """
+    n = len(stations["ids"])
+    latitudes = np.array(stations["latitudes"], dtype="<f4")
+    longitudes = np.array(stations["longitudes"], dtype="<f4")
+    ids = np.array([station_id.encode("ascii") for station_id in stations["ids"]], dtype=f"S{ID_WIDTH}")
+
+    encoded_names = [name.encode("utf-8") for name in stations["names"]]
+    name_offsets = np.zeros(n + 1, dtype="<u4")
+    name_offsets[1:] = np.cumsum([len(name) for name in encoded_names])
+    name_blob = np.frombuffer(b"".join(encoded_names), dtype="u1")
+
+    coverage = np.zeros((4, n), dtype="<i2")
+    for i, station_id in enumerate(stations["ids"]):
+        inv_data = inventory.get(station_id)
+        if not inv_data:
+            continue
+        if "TMAX" in inv_data:
+            coverage[TMAX_FIRST, i], coverage[TMAX_LAST, i] = inv_data["TMAX"]
+        if "TMIN" in inv_data:
+            coverage[TMIN_FIRST, i], coverage[TMIN_LAST, i] = inv_data["TMIN"]
+
+    index = StationIndex(_restore_coordinates(latitudes), _restore_coordinates(longitudes), INDEX_CELL_SIZE)
+    columns = {
+        "latitudes": latitudes,
+        "longitudes": longitudes,
+        "ids": ids,
+        "name_offsets": name_offsets,
+        "name_blob": name_blob,
+        "coverage": coverage,
+        "index_order": index.order,
+        "cell_starts": index.cell_starts,
+    }
+
+    layout, size = _layout(n, len(name_blob), INDEX_CELL_SIZE)
+    data = bytearray(size)
+    CATALOG_HEADER.pack_into(data, 0, CATALOG_MAGIC, CATALOG_VERSION, n, len(name_blob), INDEX_CELL_SIZE)
+    for name, dtype, shape, offset in layout:
+        column = np.ascontiguousarray(columns[name], dtype=dtype)
+        data[offset:offset + column.nbytes] = column.tobytes()
+    return bytes(data)
+
+
+class StationCatalog:
+    """
+    Spaltenweiser Stationskatalog auf einem Puffer im Format von catalog.bin
+    (in der Regel ein read-only mmap, siehe open()).
+
+    Alle Spalten sind NumPy-Sichten direkt auf den Puffer, es wird nichts kopiert:
+      - latitudes, longitudes: float32
+      - ids: Station-IDs als Bytes fester Breite (S11)
+      - name_offsets, name_blob: Namen als Abschnitte eines UTF-8-Blobs
+      - coverage: int16-Matrix (4, n) mit erstem/letztem Jahr von TMAX und TMIN
+      - index_order, cell_starts: vorberechneter räumlicher Index
+    """
+
+    def __init__(self, buffer):
+        magic, version, n, blob_len, cell_size = CATALOG_HEADER.unpack_from(buffer, 0)
+        if magic != CATALOG_MAGIC or version != CATALOG_VERSION:
+            raise ValueError("Unbekanntes Format der Katalogdatei")
+        layout, size = _layout(n, blob_len, cell_size)
+        if len(buffer) < size:
+            raise ValueError("Katalogdatei ist unvollständig")
+        for name, dtype, shape, offset in layout:
+            column = np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape)), offset=offset)
+            setattr(self, name, column.reshape(shape))
+        self.cell_size = cell_size
+        self._buffer = buffer
+        self._index = None
+
+    @classmethod
+    def open(cls, path):
+        """
+        Bindet eine Katalogdatei per mmap (nur lesend) ein.
+        """
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def station_id(self, index):
+        return self.ids[index].decode("ascii")
+
+    def name(self, index):
+        start, stop = self.name_offsets[index], self.name_offsets[index + 1]
+        return self.name_blob[start:stop].tobytes().decode("utf-8")
+
+    def station(self, index):
+        """
+        Stammdaten einer Station als Dictionary (id, name, latitude, longitude).
+        """
+        return {
+            "id": self.station_id(index),
+            "name": self.name(index),
+            "latitude": round(float(self.latitudes[index]), COORDINATE_DECIMALS),
+            "longitude": round(float(self.longitudes[index]), COORDINATE_DECIMALS),
+        }
+
+    @property
+    def index(self):
+        """
+        Räumlicher Index über alle Stationen (Sortierung liegt bereits in der Datei).
+        """
+        if self._index is None:
+            self._index = StationIndex(
+                _restore_coordinates(self.latitudes),
+                _restore_coordinates(self.longitudes),
+                self.cell_size,
+                order=self.index_order,
+                cell_starts=self.cell_starts,
+            )
+        return self._index
+
+    def coverage_mask(self, start_year, end_year):
+        """
+        Boolesches Array über alle Stationen: Station hat laut Inventar beide Messgrößen
+        TMAX und TMIN und der verfügbare Zeitraum deckt den gesamten Zeitraum von
+        start_year bis end_year ab.
+        """
+        coverage = self.coverage
+        present = (coverage[TMAX_FIRST] != 0) & (coverage[TMIN_FIRST] != 0)
+        effective_start = np.maximum(coverage[TMAX_FIRST], coverage[TMIN_FIRST])
+        effective_end = np.minimum(coverage[TMAX_LAST], coverage[TMIN_LAST])
+        return present & (effective_start <= start_year) & (effective_end >= end_year)
+
+    def covers(self, index, start_year, end_year):
+        """
+        Wie coverage_mask(), aber für eine einzelne Station.
+        """
+        tmax_first, tmax_last, tmin_first, tmin_last = self.coverage[:, index].tolist()
+        if not tmax_first or not tmin_first:
+            return False
+        return max(tmax_first, tmin_first) <= start_year and min(tmax_last, tmin_last) >= end_year
+
+
+# Teile des Katalogs: Name -> (Datei im Bucket, Bezeichnung für Fehlermeldungen, Parser)
+PARTS = {
+    "stations": (STATIONS_FILE, "Stationendaten", parse_stations),
+    "inventory": (INVENTORY_FILE, "Inventardaten", parse_inventory),
+}
+
+
+class CatalogCache:
+    """
+    Hält den StationCatalog (mmap auf catalog.bin) bereit und validiert ihn nach
+    Ablauf der TTL im Hintergrund neu.
+    """
+
+    def __init__(self, cache_dir=None, ttl=None):
+        self.directory = Path(cache_dir or settings.GHCN_CACHE_DIR) / "catalog"
+        self.ttl = settings.GHCN_CATALOG_TTL if ttl is None else ttl
+        # Nur für den Austausch von Katalog, Validatoren und Zeitstempel, nie während eines Downloads
+        self._lock = threading.Lock()
+        # Laden und Abgleichen (samt Download), jeweils nur ein Thread je Prozess
+        self._update_lock = threading.Lock()
+        self._refreshing_lock = threading.Lock()
+        self._catalog = None
+        self._validators = {}
+        self._checked_at = 0.0
+        self._refreshing = False
+
+    @property
+    def data_path(self):
+        return self.directory / "catalog.bin"
+
+    @property
+    def meta_path(self):
+        return self.directory / "catalog.json"
+
+    def get(self):
+        """
+        Liefert den aktuellen StationCatalog. Ist noch nichts geladen, wird der Katalog
+        von der Platte eingebunden bzw. (beim allerersten Start) synchron heruntergeladen.
+        Ein abgelaufener Katalog wird sofort zurückgegeben und im Hintergrund erneuert.
+        """
+        if self._catalog is None:
+            with self._update_lock:
+                if self._catalog is None and not self._load_from_disk():
+                    # Beim allerersten Start lädt nur ein Worker, die anderen übernehmen seinen Stand
+                    with self._file_lock():
+                        if not self._load_from_disk():
+                            self._fetch()
+        if self.is_stale():
+            self.refresh_in_background()
+        return self._catalog
+
+    def warm(self):
+        """
+        Wie get(), gleicht einen fehlenden oder abgelaufenen Katalog aber synchron ab
+        (bedingt, wenn eine Kopie auf der Platte liegt), statt im Hintergrund.
+        """
+        with self._update_lock:
+            if self._catalog is None:
+                self._load_from_disk()
+        if self._catalog is None or self.is_stale():
+            self.refresh()
+        return self._catalog
+
+    def is_stale(self):
+        return time.time() - self._checked_at >= self.ttl
+
+    def refresh(self):
+        """
+        Gleicht den Katalog mit dem Upstream ab. Hat ein anderer Worker die Datei auf
+        der Platte bereits erneuert, wird dieser Stand übernommen; sonst werden bedingte
+        Requests gesendet und der Katalog nur bei Änderungen neu gebaut. Suchen laufen
+        währenddessen mit dem bisherigen Katalog weiter (siehe _swap()).
+        """
+        with self._update_lock, self._file_lock():
+            if self._read_meta().get("checked_at", 0.0) > self._checked_at and self._load_from_disk():
+                if not self.is_stale():
+                    return
+            self._fetch()
+
+    def refresh_in_background(self):
+        """
+        Startet refresh() in einem Daemon-Thread, sofern nicht bereits einer läuft und der
+        Katalog noch abgelaufen ist (ein gerade beendeter Abgleich kann ihn erneuert haben).
+        """
+        with self._refreshing_lock:
+            if self._refreshing or not self.is_stale():
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_worker, name="catalog-refresh", daemon=True).start()
+
+    def _file_lock(self):
+        """
+        Sperre über alle Worker, damit der Katalog nur von einem gleichzeitig geladen wird.
+        """
+        return singleflight.file_lock(self.directory.parent / "locks" / "catalog.lock")
+
+    def _refresh_worker(self):
+        failed = False
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Hintergrund-Abgleich des Stationskatalogs fehlgeschlagen")
+            failed = True
+        finally:
+            # Zeitstempel und Ende gemeinsam unter der Sperre: refresh_in_background() sieht
+            # _refreshing erst dann als False, wenn auch der neue Zeitstempel gilt
+            with self._refreshing_lock:
+                if failed:
+                    # Bisherigen Stand weiter ausliefern und erst später erneut versuchen
+                    with self._lock:
+                        self._checked_at = time.time() - self.ttl + FAILED_REFRESH_RETRY
+                self._refreshing = False
+
+    def _download(self, name, known):
+        """
+        Lädt einen Teil des Katalogs. Gibt None zurück, wenn der Server mit 304 antwortet.
+        """
+        filename, label, parser = PARTS[name]
+        try:
+            response = upstream.conditional_get(upstream.ghcn_url(filename), **known)
+        except upstream.UpstreamBusy:
+            raise
+        except Exception as e:
+            raise CatalogError(f"Fehler beim Abrufen der {label}: {e}")
+        if response.status_code == 304:
+            return None
+        if response.status_code != 200:
+            raise CatalogError(f"Fehler beim Abrufen der {label}.")
+        return response
+
+    def _fetch(self):
+        """
+        Lädt die Teile des Katalogs (bedingt, falls bereits ein Katalog vorliegt) und baut
+        catalog.bin bei Änderungen neu. Hat sich nur ein Teil geändert, wird der andere
+        unbedingt nachgeladen, da der Katalog nur aus beiden zusammen gebaut werden kann.
+        Die Teile sind unabhängig und werden parallel abgerufen.
+        """
+        known = self._validators if self._catalog is not None else {}
+        with metrics.phase("catalog_download"), \
+                ThreadPoolExecutor(len(PARTS), thread_name_prefix="catalog-download") as pool:
+            futures = {name: pool.submit(self._download, name, known.get(name, {})) for name in PARTS}
+            responses = {name: future.result() for name, future in futures.items()}
+        checked_at = time.time()
+        if all(response is None for response in responses.values()):
+            self._save(validators=self._validators, checked_at=checked_at)
+            self._swap(self._catalog, self._validators, checked_at)
+            return
+
+        parts, validators = {}, {}
+        for name, response in responses.items():
+            if response is None:
+                with metrics.phase("catalog_download"):
+                    response = self._download(name, {})
+            with metrics.phase("catalog_parse"):
+                parts[name] = PARTS[name][2](response.text.splitlines())
+            validators[name] = upstream.validators(response)
+        with metrics.phase("catalog_parse"):
+            data = build_catalog(parts["stations"], parts["inventory"])
+        del parts
+        if self._save(data, validators, checked_at):
+            station_catalog = StationCatalog.open(self.data_path)
+        else:
+            station_catalog = StationCatalog(data)
+        self._swap(station_catalog, validators, checked_at)
+
+    def _swap(self, station_catalog, validators, checked_at):
+        """
+        Setzt einen neuen Stand ein. Hatte der bisherige Katalog bereits einen räumlichen
+        Index, wird der des neuen vorher gebaut, damit die nächste Suche nicht darauf wartet.
+        """
+        previous = self._catalog
+        if previous is not None and previous is not station_catalog and previous._index is not None:
+            station_catalog.index
+        with self._lock:
+            self._catalog = station_catalog
+            self._validators = validators
+            self._checked_at = checked_at
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load_from_disk(self):
+        """
+        Bindet den persistierten Katalog ein. Gibt False zurück, wenn (noch) keiner
+        existiert oder die Datei unbrauchbar ist.
+        """
+        meta = self._read_meta()
+        try:
+            station_catalog = StationCatalog.open(self.data_path)
+        except (OSError, ValueError, struct.error):
+            return False
+        self._swap(station_catalog, meta.get("validators", {}), meta.get("checked_at", 0.0))
+        return True
+
+    def _save(self, data=None, validators=None, checked_at=None):
+        """
+        Schreibt catalog.bin (falls data angegeben) und die Metadaten (Standard: der aktuelle
+        Stand). Gibt False zurück, wenn das Cache-Verzeichnis nicht beschreibbar ist.
+        """
+        if validators is None:
+            validators = self._validators
+        if checked_at is None:
+            checked_at = self._checked_at
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if data is not None:
+                atomic_write(self.data_path, data)
+            meta = {"validators": validators, "checked_at": checked_at}
+            atomic_write(self.meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError:
+            # Ohne beschreibbares Cache-Verzeichnis bleibt der Katalog nur im Speicher
+            logger.warning("Stationskatalog konnte nicht in %s gespeichert werden", self.directory, exc_info=True)
+            return False
+        return True
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Liefert den prozessweiten CatalogCache (wird beim ersten Aufruf angelegt).
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CatalogCache()
+    return _cache
+
+
+def get_catalog():
+    """
+    Kurzform für get_cache().get(): der aktuelle StationCatalog.
+    """
+    return get_cache().get()
+
+
+def preload():
+    """
+    Lädt den Katalog samt räumlichem Index vor dem fork() der Worker (gunicorn.conf.py),
+    die ihn dann ohne eigenen Ladevorgang gemeinsam (copy-on-write) nutzen. Eine fällige
+    Erneuerung läuft hier synchron: ein Hintergrund-Thread (und eine von ihm gehaltene
+    Sperre) würde nicht in die Worker übernommen.
+    """
+    station_catalog = get_cache().warm()
+    # Der Index entstünde sonst erst bei der ersten Suche, in jedem Worker einzeln
+    station_catalog.index
+    return station_catalog
+
+
+def reset():
+    """
+    Verwirft den prozessweiten Cache (z.B. nach geänderten Settings in Tests).
+    """
+    global _cache
+    with _cache_lock:
+        _cache = None
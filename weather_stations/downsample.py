@@ -0,0 +1,73 @@
+"""
+Ausdünnen langer Zeitreihen für Diagramme (siehe views.get_station_series).
+
+Beide Verfahren wählen Punkte der Reihe aus (keine Mittelwerte), sodass jeder
+gelieferte Wert ein tatsächlicher Tageswert ist:
+
+- "minmax": die Reihe wird in gleich große Abschnitte geteilt, aus jedem werden
+  der kleinste und der größte Wert übernommen. Extreme bleiben damit immer erhalten.
+- "lttb": Largest-Triangle-Three-Buckets (Steinarsson 2013); je Abschnitt der Punkt,
+  der mit dem zuvor gewählten Punkt und dem Mittel des nächsten Abschnitts das größte
+  Dreieck bildet. Gibt den Verlauf optisch am besten wieder.
+
+Die Funktionen liefern die Indizes der gewählten Punkte in aufsteigender Reihenfolge.
+"""
+import numpy as np
+
+METHODS = ("minmax", "lttb")
+
+
+def minmax(y, points):
+    """
+    Indizes von höchstens points Punkten: Minimum und Maximum je Abschnitt.
+    """
+    n = len(y)
+    if n <= points:
+        return np.arange(n)
+    buckets = max(points // 2, 1)
+    bucket = np.arange(n) * buckets // n
+    # Innerhalb jedes Abschnitts nach Wert sortiert: erster Eintrag = Minimum, letzter = Maximum
+    order = np.lexsort((y, bucket))
+    starts = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.concatenate((order[starts], order[ends])))
+
+
+def lttb(x, y, points):
+    """
+    Indizes von points Punkten nach Largest-Triangle-Three-Buckets; der erste und der
+    letzte Punkt bleiben immer erhalten.
+    """
+    n = len(y)
+    if n <= points or points < 3:
+        return np.arange(n) if n <= points else np.array([0, n - 1])
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Grenzen der points - 2 inneren Abschnitte (ohne ersten und letzten Punkt)
+    edges = np.arange(points - 1) * (n - 2) // (points - 2) + 1
+    # Mittel jedes Abschnitts vorab; auf den letzten Abschnitt folgt der letzte Punkt
+    sizes = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1]) / sizes, x[-1])[1:].tolist()
+    mean_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1]) / sizes, y[-1])[1:].tolist()
+    edges = edges.tolist()
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        px, py = x[previous], y[previous]
+        area = np.abs((px - mean_x[i]) * (y[lo:hi] - py) - (px - x[lo:hi]) * (mean_y[i] - py))
+        previous = lo + int(area.argmax())
+        selected[i + 1] = previous
+    return selected
+
+
+def select(method, x, y, points):
+    """
+    Indizes nach dem Verfahren method (siehe METHODS).
+    """
+    if method == "minmax":
+        return minmax(y, points)
+    if method == "lttb":
+        return lttb(x, y, points)
+    raise ValueError(f"Unbekanntes Verfahren: {method}")
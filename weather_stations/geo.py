@@ -0,0 +1,208 @@
+"""
+Geometrie auf der Erdkugel: Haversine-Distanz und ein räumlicher Index über
+alle Stationen für Umkreis- und k-nächste-Nachbarn-Suchen.
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS = 6371  # Erdradius in km
+
+# Sicherheitszuschlag (in Grad) auf die Suchgrenzen, damit Stationen genau auf dem Rand nicht verloren gehen
+BOUND_MARGIN = 1e-6
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Berechnet die Distanz (in Kilometern) zwischen zwei Punkten (lat: (Breite), lon: (Länger))
+    mittels der Haversine-Formel.
+    """
+    R = EARTH_RADIUS
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def haversine_many(lat, lon, lats, lons, out=None, work=None):
+    """
+    Vektorisierte Haversine-Distanz (in Kilometern) für NumPy-Arrays.
+
+    Es gilt normales NumPy-Broadcasting zwischen Abfragepunkten (lat, lon) und
+    Stationen (lats, lons): ein Skalar gegen (n,) ergibt n Distanzen, (m, 1)
+    gegen (n,) eine (m, n)-Matrix. Die Formel wird in derselben Reihenfolge wie
+    in haversine() ausgewertet, aber komplett in den Puffern out (Ergebnis) und
+    work (Zwischenwerte) gerechnet; beide können vorab angelegt und
+    wiederverwendet werden, dann entstehen keine temporären Arrays in
+    Ergebnisgröße.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    shape = np.broadcast_shapes(lat.shape, lon.shape, lats.shape, lons.shape)
+    if out is None:
+        out = np.empty(shape, dtype=np.float64)
+    if work is None:
+        work = np.empty(shape, dtype=np.float64)
+
+    # cos(phi1) * cos(phi2) * sin(delta_lambda / 2) ** 2; cos(phi1) hat nur die Größe der Abfragepunkte
+    np.radians(lats, out=work)
+    np.cos(work, out=work)
+    np.multiply(np.cos(np.radians(lat)), work, out=out)
+    np.subtract(lons, lon, out=work)
+    np.radians(work, out=work)
+    np.divide(work, 2, out=work)
+    np.sin(work, out=work)
+    np.square(work, out=work)
+    np.multiply(out, work, out=out)
+    # + sin(delta_phi / 2) ** 2
+    np.subtract(lats, lat, out=work)
+    np.radians(work, out=work)
+    np.divide(work, 2, out=work)
+    np.sin(work, out=work)
+    np.square(work, out=work)
+    np.add(work, out, out=out)
+    # c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    np.subtract(1, out, out=work)
+    np.sqrt(work, out=work)
+    np.sqrt(out, out=out)
+    np.arctan2(out, work, out=out)
+    np.multiply(out, 2, out=out)
+    np.multiply(out, EARTH_RADIUS, out=out)
+    return out
+
+
+class StationIndex:
+    """
+    Gitterindex (Zellen fester Größe in Grad) über die Stationskoordinaten.
+
+    Die Stationen werden einmalig nach Zellnummer sortiert; jede Gitterzeile eines
+    Suchfensters entspricht damit einem zusammenhängenden Abschnitt im sortierten
+    Array. Eine Umkreissuche sammelt nur die Stationen aus den Zellen, die den
+    Suchkreis überdecken können, und berechnet für diese die exakte Haversine-Distanz
+    (haversine_many(), identisch mit haversine() bis auf Rundung in der letzten Stelle).
+    """
+
+    def __init__(self, latitudes, longitudes, cell_size=1.0, order=None, cell_starts=None):
+        """
+        order und cell_starts können aus einem früher gebauten Index übernommen werden
+        (z.B. aus der Katalogdatei), dann entfällt das Sortieren.
+        """
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.cell_size = cell_size
+        self.n_rows = int(math.ceil(180 / cell_size))
+        self.n_cols = int(math.ceil(360 / cell_size))
+
+        if order is None or cell_starts is None:
+            cells = self._rows(self.latitudes) * self.n_cols + self._cols(self.longitudes)
+            order = np.argsort(cells, kind="stable")
+            # cell_starts[c] .. cell_starts[c + 1] ist der Abschnitt von Zelle c in order
+            cell_starts = np.searchsorted(cells[order], np.arange(self.n_rows * self.n_cols + 1))
+        self.order = order
+        self.cell_starts = cell_starts
+
+    def __len__(self):
+        return len(self.order)
+
+    def _rows(self, lat):
+        return np.clip(np.floor((lat + 90) / self.cell_size).astype(np.int64), 0, self.n_rows - 1)
+
+    def _cols(self, lon):
+        lon = np.mod(np.asarray(lon, dtype=np.float64) + 180, 360)
+        return np.clip(np.floor(lon / self.cell_size).astype(np.int64), 0, self.n_cols - 1)
+
+    def _col_ranges(self, lon, dlon):
+        """
+        Spaltenbereiche (inklusive) für das Längenintervall [lon - dlon, lon + dlon],
+        aufgeteilt an der Datumsgrenze.
+        """
+        if dlon >= 180:
+            return [(0, self.n_cols - 1)]
+        lon = (lon + 180) % 360 - 180
+        low, high = lon - dlon, lon + dlon
+        if low < -180:
+            intervals = [(low + 360, 180), (-180, high)]
+        elif high >= 180:
+            intervals = [(low, 180), (-180, high - 360)]
+        else:
+            intervals = [(low, high)]
+        ranges = []
+        for a, b in intervals:
+            first = int(self._cols(a))
+            last = self.n_cols - 1 if b >= 180 else int(self._cols(b))
+            ranges.append((first, last))
+        return ranges
+
+    def candidates(self, lat, lon, radius):
+        """
+        Alle Stationen (Indizes, aufsteigend sortiert), die aufgrund ihrer Zelle
+        im Umkreis radius (km) um (lat, lon) liegen können.
+        """
+        angle = radius / EARTH_RADIUS
+        if angle >= math.pi:
+            return np.sort(self.order)
+        dlat = math.degrees(angle) + BOUND_MARGIN
+        lat_min, lat_max = lat - dlat, lat + dlat
+        if lat_min <= -90 or lat_max >= 90:
+            # Der Suchkreis enthält einen Pol: alle Längengrade kommen in Frage
+            col_ranges = [(0, self.n_cols - 1)]
+        else:
+            # Maximale Längendifferenz eines Kugelkreises (ohne Pol) um die Breite lat
+            ratio = math.sin(angle) / math.cos(math.radians(lat))
+            dlon = math.degrees(math.asin(min(1.0, ratio))) + BOUND_MARGIN
+            col_ranges = self._col_ranges(lon, dlon)
+
+        first_row = int(self._rows(max(lat_min, -90)))
+        last_row = int(self._rows(min(lat_max, 90)))
+        chunks = []
+        for row in range(first_row, last_row + 1):
+            for first_col, last_col in col_ranges:
+                start = self.cell_starts[row * self.n_cols + first_col]
+                stop = self.cell_starts[row * self.n_cols + last_col + 1]
+                if stop > start:
+                    chunks.append(self.order[start:stop])
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(chunks))
+
+    def distances(self, lat, lon, indices):
+        """
+        Haversine-Distanzen von (lat, lon) zu den Stationen mit den gegebenen Indizes.
+        """
+        return haversine_many(lat, lon, self.latitudes[indices], self.longitudes[indices])
+
+    def within(self, lat, lon, radius, mask=None):
+        """
+        Alle Stationen mit Distanz <= radius (km).
+        Optional schränkt ein boolesches Array mask (ein Eintrag je Station) die Auswahl ein.
+        Rückgabe: (indices, distances), aufsteigend nach Index sortiert.
+        """
+        indices = self.candidates(lat, lon, radius)
+        if mask is not None:
+            indices = indices[mask[indices]]
+        distances = self.distances(lat, lon, indices)
+        inside = distances <= radius
+        return indices[inside], distances[inside]
+
+    def nearest(self, lat, lon, k, mask=None):
+        """
+        Die k nächsten Stationen (ohne Radiusbegrenzung).
+        Der Suchradius wird so lange vervierfacht, bis mindestens k Stationen im Kreis
+        liegen; da der Kreis vollständig durchsucht wird, sind das sicher die k nächsten.
+        Rückgabe: (indices, distances), aufsteigend nach Distanz (bei Gleichstand nach Index).
+        """
+        if k <= 0 or len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        radius = 4 * self.cell_size * 111.2  # etwa vier Gitterzellen
+        while True:
+            indices, distances = self.within(lat, lon, radius, mask)
+            if len(indices) >= k or radius >= math.pi * EARTH_RADIUS:
+                break
+            radius *= 4
+        order = np.lexsort((indices, distances))[:k]
+        return indices[order], distances[order]
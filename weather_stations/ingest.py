@@ -0,0 +1,202 @@
+"""
+Offline-Import eines lokalen Abzugs der Stationsdateien (by_station/*.csv.gz) in den
+Speicher der Monatsaggregate (siehe aggregates.py), z.B. um einen Server mit fertig
+berechnetem GHCN_CACHE_DIR zu starten (manage.py ingest_ghcn).
+
+Die Dateien werden in einem Prozess-Pool gehasht und aggregiert; der Hauptprozess
+speichert die Ergebnisse. Ein Manifest unter GHCN_CACHE_DIR/ingest/manifest.json hält
+je Station Größe, Änderungszeitpunkt und SHA-256 der zuletzt importierten Datei fest
+und wird regelmäßig gesichert (Checkpoint). Ein erneuter (oder nach einem Abbruch
+fortgesetzter) Import überspringt Dateien mit unveränderter Größe und unverändertem
+Änderungszeitpunkt; bei geändertem Zeitpunkt, aber gleichem Inhalt (Hash), werden nur
+Manifest und Version angepasst.
+
+Als Version der Quelldatei gilt ihr Änderungszeitpunkt im Format von Last-Modified.
+Wurde der Abzug mit Zeitstempeln erstellt (z.B. aws s3 sync), passt das zum Upstream:
+mit copy_files=True liegen dann auch die Stationsdateien im Cache, und die erste
+Prüfung nach Ablauf der TTL endet mit 304, ohne das Aggregat neu zu berechnen.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from email.utils import formatdate
+from pathlib import Path
+
+from django.conf import settings
+
+from . import aggregates as station_aggregates, station_cache
+from .storage import atomic_write
+
+# Dateien je Prozess, die gleichzeitig in Arbeit sind (begrenzt den Speicher für wartende Ergebnisse)
+QUEUE_PER_PROCESS = 4
+HASH_CHUNK_SIZE = 1024 * 1024
+
+SourceFile = namedtuple("SourceFile", ["station_id", "path", "size", "mtime_ns"])
+
+# Fortschritt nach jeder Datei: Anzahl verarbeitet, übersprungen, neu berechnet, Fehler und Bytes
+Progress = namedtuple("Progress", ["done", "total", "skipped", "built", "failed", "bytes", "elapsed"])
+
+
+def manifest_path():
+    return Path(settings.GHCN_CACHE_DIR) / "ingest" / "manifest.json"
+
+
+def load_manifest():
+    try:
+        with open(manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest):
+    path = manifest_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(path, json.dumps(manifest, separators=(",", ":")).encode("utf-8"))
+
+
+def scan(directory):
+    """
+    Die Stationsdateien {station_id}.csv.gz in directory, sortiert nach Station-ID.
+    """
+    files = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            station_id = entry.name[:-len(".csv.gz")]
+            if not entry.name.endswith(".csv.gz") or not station_cache.STATION_ID_PATTERN.match(station_id):
+                continue
+            stat = entry.stat()
+            files.append(SourceFile(station_id, Path(entry.path), stat.st_size, stat.st_mtime_ns))
+    return sorted(files)
+
+
+def source_version(source):
+    """
+    Version einer Quelldatei: ihr Änderungszeitpunkt im Format des Last-Modified-Headers.
+    """
+    return formatdate(source.mtime_ns / 1e9, usegmt=True)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _process(path, known_hash, parser, previous):
+    """
+    Im Worker-Prozess: (SHA-256, Aggregat); das Aggregat ist None, wenn der Inhalt known_hash
+    entspricht. Unveränderte Jahre werden aus previous übernommen.
+    """
+    digest = file_hash(path)
+    if digest == known_hash:
+        return digest, None
+    built = station_aggregates.build(path, parser, previous)
+    if built is None:
+        built = station_aggregates.build(path, parser)
+    return digest, built
+
+
+def _init_worker():
+    # pandas/NumPy beim Start des Workers laden, nicht erst bei der ersten Datei
+    from . import aggregates  # noqa: F401
+
+
+def _is_current(source, entry, copy_files):
+    """
+    Datei unverändert (Größe und Änderungszeitpunkt wie im Manifest) und Aggregat (sowie
+    mit copy_files die Kopie im Cache) vorhanden.
+    """
+    if entry is None or entry["size"] != source.size or entry["mtime_ns"] != source.mtime_ns:
+        return False
+    if copy_files and not station_cache.station_path(source.station_id).exists():
+        return False
+    return station_aggregates.is_stored(source.station_id)
+
+
+def ingest(directory, processes=None, parser=None, restart=False, copy_files=False, checkpoint_interval=30.0,
+           progress=None):
+    """
+    Importiert alle Stationsdateien aus directory (siehe Moduldokumentation) und liefert den
+    letzten Progress. processes: Anzahl Worker-Prozesse (Standard: Anzahl CPU-Kerne),
+    restart: Manifest ignorieren und alles neu berechnen, copy_files: Dateien auch in den
+    Cache der Stationsdateien übernehmen, progress: Funktion, die nach jeder Datei den
+    Progress und ggf. (station_id, Fehlermeldung) erhält.
+    """
+    processes = processes or os.cpu_count() or 1
+    parser = parser or settings.GHCN_CSV_PARSER
+    manifest = {} if restart else load_manifest()
+    sources = scan(directory)
+    start = time.monotonic()
+    counts = {"done": 0, "skipped": 0, "built": 0, "failed": 0, "bytes": 0}
+    last_checkpoint = start
+
+    def report(error=None):
+        if progress is not None:
+            progress(Progress(total=len(sources), elapsed=time.monotonic() - start, **counts), error)
+
+    def finish(source, digest, built):
+        version = source_version(source)
+        if built is not None:
+            station_aggregates.store(source.station_id, built, version)
+            counts["built"] += 1
+        else:
+            # Nur der Änderungszeitpunkt ist neu
+            station_aggregates.mark_checked(source.station_id, version)
+            counts["skipped"] += 1
+        if copy_files:
+            station_cache.add_file(source.station_id, source.path, {"etag": None, "last_modified": version})
+        manifest[source.station_id] = {"size": source.size, "mtime_ns": source.mtime_ns, "sha256": digest}
+
+    pending = iter(sources)
+    pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+    try:
+        running = {}
+        while True:
+            # Warteschlange auffüllen; unveränderte Dateien gar nicht erst an den Pool geben
+            for source in pending:
+                entry = manifest.get(source.station_id)
+                if _is_current(source, entry, copy_files):
+                    counts["done"] += 1
+                    counts["skipped"] += 1
+                    report()
+                    continue
+                # Den Hash nur vergleichen, wenn das Aggregat dazu noch vorhanden ist
+                previous = station_aggregates.load_stored(source.station_id) if entry else None
+                known_hash = entry["sha256"] if previous is not None else None
+                running[pool.submit(_process, source.path, known_hash, parser, previous)] = source
+                if len(running) >= processes * QUEUE_PER_PROCESS:
+                    break
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = running.pop(future)
+                counts["done"] += 1
+                counts["bytes"] += source.size
+                try:
+                    digest, built = future.result()
+                    finish(source, digest, built)
+                except Exception as e:
+                    counts["failed"] += 1
+                    report((source.station_id, str(e)))
+                    continue
+                report()
+
+            if time.monotonic() - last_checkpoint >= checkpoint_interval:
+                save_manifest(manifest)
+                last_checkpoint = time.monotonic()
+    finally:
+        # Auch bei einem Abbruch (Strg+C) den erreichten Stand sichern
+        pool.shutdown(cancel_futures=True)
+        save_manifest(manifest)
+        if copy_files:
+            station_cache.evict()
+    return Progress(total=len(sources), elapsed=time.monotonic() - start, **counts)
@@ -0,0 +1,75 @@
+"""
+manage.py ingest_ghcn VERZEICHNIS: berechnet die Monatsaggregate aller Stationsdateien
+eines lokalen Abzugs von by_station/ vorab (siehe weather_stations/ingest.py).
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from weather_stations import ingest
+from weather_stations.parsing import PARSERS
+
+
+class Command(BaseCommand):
+    help = ("Berechnet die Monatsaggregate aller Stationsdateien ({station_id}.csv.gz) eines lokalen "
+            "Verzeichnisses vorab. Ein abgebrochener Import wird beim nächsten Aufruf fortgesetzt; "
+            "unveränderte Dateien werden übersprungen.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Verzeichnis mit den Stationsdateien (Abzug von csv.gz/by_station/)")
+        parser.add_argument("--processes", type=int, default=None,
+                            help="Anzahl Worker-Prozesse (Standard: Anzahl CPU-Kerne)")
+        parser.add_argument("--parser", choices=sorted(PARSERS), default=None,
+                            help="CSV-Parser (Standard: GHCN_CSV_PARSER)")
+        parser.add_argument("--restart", action="store_true",
+                            help="Manifest ignorieren und alle Dateien neu berechnen")
+        parser.add_argument("--copy-files", action="store_true",
+                            help="Stationsdateien zusätzlich in den lokalen Cache übernehmen "
+                                 "(höchstens GHCN_STATION_CACHE_MAX_BYTES bleiben erhalten)")
+        parser.add_argument("--checkpoint-interval", type=float, default=30.0,
+                            help="Sekunden zwischen zwei Sicherungen des Manifests (Standard: 30)")
+        parser.add_argument("--progress-interval", type=float, default=5.0,
+                            help="Sekunden zwischen zwei Fortschrittsmeldungen (Standard: 5)")
+
+    def handle(self, *args, **options):
+        last_report = [0.0]
+
+        def progress(state, error):
+            if error is not None:
+                station_id, message = error
+                self.stderr.write(f"{station_id}: {message}")
+            if time.monotonic() - last_report[0] >= options["progress_interval"] or state.done == state.total:
+                last_report[0] = time.monotonic()
+                self.stdout.write(self.format_progress(state))
+
+        try:
+            result = ingest.ingest(
+                options["directory"],
+                processes=options["processes"],
+                parser=options["parser"],
+                restart=options["restart"],
+                copy_files=options["copy_files"],
+                checkpoint_interval=options["checkpoint_interval"],
+                progress=progress,
+            )
+        except OSError as e:
+            raise CommandError(f"Verzeichnis kann nicht gelesen werden: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Fertig: {result.built} berechnet, {result.skipped} übersprungen, {result.failed} Fehler "
+            f"in {result.elapsed:.1f} s"))
+        if result.failed:
+            raise CommandError(f"{result.failed} Dateien konnten nicht verarbeitet werden.")
+
+    @staticmethod
+    def format_progress(state):
+        """
+        Fortschritt mit Durchsatz (gelesene Dateien und Bytes je Sekunde) und geschätzter Restzeit.
+        """
+        elapsed = max(state.elapsed, 1e-9)
+        line = (f"{state.done}/{state.total} Dateien ({state.done / max(state.total, 1):.1%}), "
+                f"{state.built} berechnet, {state.skipped} übersprungen, {state.failed} Fehler, "
+                f"{state.done / elapsed:.1f} Dateien/s, {state.bytes / elapsed / 1024 ** 2:.1f} MiB/s")
+        if 0 < state.done < state.total:
+            line += f", noch ca. {(state.total - state.done) * elapsed / state.done:.0f} s"
+        return line
@@ -0,0 +1,83 @@
+"""
+manage.py station_report VERZEICHNIS --years 1990-2020: Anzahl, Mittel, Minimum und Maximum
+je Station, Jahr und Messgröße für viele lokale Stationsdateien (siehe weather_stations/report.py).
+"""
+import time
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from weather_stations import report
+from weather_stations.parsing import PARSERS, TEMPERATURE_ELEMENTS
+
+
+class Command(BaseCommand):
+    help = ("Wertet die Stationsdateien ({station_id}.csv.gz) eines lokalen Verzeichnisses für die "
+            "angegebenen Jahre und Messgrößen aus (jede Datei wird einmal gelesen, parallel auf allen "
+            "CPU-Kernen) und schreibt je Station, Jahr und Messgröße Anzahl, Mittel, Minimum und Maximum "
+            "als CSV oder Parquet.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Verzeichnis mit den Stationsdateien (z.B. stations/)")
+        parser.add_argument("--stations", nargs="+", default=[], metavar="STATION_ID",
+                            help="nur diese Stationen (Standard: alle Dateien, siehe --glob)")
+        parser.add_argument("--glob", default=None, metavar="MUSTER",
+                            help='Dateiauswahl relativ zum Verzeichnis, z.B. "USW*.csv.gz" (Standard: *.csv.gz)')
+        parser.add_argument("--years", required=True, help='Jahre und Bereiche, z.B. "1990-2000,2010"')
+        parser.add_argument("--elements", nargs="+", default=list(TEMPERATURE_ELEMENTS), metavar="ELEMENT",
+                            help="Messgrößen (Standard: TMAX TMIN)")
+        parser.add_argument("--output", default="-",
+                            help="Ausgabedatei (.csv oder .parquet); Standard: CSV auf die Standardausgabe")
+        parser.add_argument("--format", choices=report.FORMATS, default=None,
+                            help="Ausgabeformat (Standard: nach der Endung der Ausgabedatei)")
+        parser.add_argument("--processes", type=int, default=None,
+                            help="Anzahl Worker-Prozesse (Standard: Anzahl CPU-Kerne)")
+        parser.add_argument("--parser", choices=sorted(PARSERS), default=None,
+                            help="CSV-Parser (Standard: GHCN_CSV_PARSER)")
+        parser.add_argument("--progress-interval", type=float, default=5.0,
+                            help="Sekunden zwischen zwei Fortschrittsmeldungen (Standard: 5)")
+
+    def handle(self, *args, **options):
+        try:
+            years = report.parse_years(options["years"])
+            elements = report.parse_elements(options["elements"])
+            fmt = report.output_format(options["output"], options["format"])
+            files, missing = report.select_files(options["directory"], options["stations"], options["glob"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        except OSError as e:
+            raise CommandError(f"Verzeichnis kann nicht gelesen werden: {e}")
+        for station_id in missing:
+            self.stderr.write(f"Die Datei für Station {station_id} wurde nicht gefunden.")
+        if not files:
+            raise CommandError("Keine Stationsdateien gefunden.")
+
+        # Die Standardausgabe kann die Tabelle enthalten, Meldungen gehen daher nach stderr
+        last_report = [0.0]
+
+        def progress(state, error):
+            if error is not None:
+                station_id, message = error
+                self.stderr.write(f"{station_id}: {message}")
+            if time.monotonic() - last_report[0] >= options["progress_interval"] or state.done == state.total:
+                last_report[0] = time.monotonic()
+                elapsed = max(state.elapsed, 1e-9)
+                self.stderr.write(f"{state.done}/{state.total} Dateien, {state.failed} Fehler, "
+                                  f"{state.done / elapsed:.1f} Dateien/s, "
+                                  f"{state.bytes / elapsed / 1024 ** 2:.1f} MiB/s")
+
+        result = report.report(files, years, elements, processes=options["processes"], parser=options["parser"],
+                               progress=progress)
+        if options["output"] == "-":
+            buffer = StringIO()
+            report.write(result.data, buffer, fmt)
+            self.stdout.write(buffer.getvalue(), ending="")
+        else:
+            report.write(result.data, options["output"], fmt)
+            self.stderr.write(self.style.SUCCESS(
+                f"{len(result.data)} Zeilen nach {options['output']} geschrieben "
+                f"({result.progress.elapsed:.1f} s)"))
+
+        failed = len(result.errors) + len(missing)
+        if failed:
+            raise CommandError(f"{failed} Stationen konnten nicht ausgewertet werden.")
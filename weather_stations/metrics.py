@@ -0,0 +1,259 @@
+"""
+Zeitmessung je Verarbeitungsschritt und Kennzahlen im Prometheus-Textformat.
+
+Der Code markiert seine Schritte mit phase("name") (bzw. timed() für Iteratoren).
+Während eines Requests (MetricsMiddleware) werden die Dauern je Name aufsummiert,
+als Server-Timing-Header ausgeliefert (z.B. in den Entwicklerwerkzeugen des
+Browsers sichtbar) und je Endpunkt in Histogramme übernommen, die der Endpunkt
+/metrics zusammen mit den Zählern der Caches und der Auslastung des Upstreams
+(siehe upstream.py) ausgibt (siehe render()).
+
+Schritte können geschachtelt sein: "download" (station_cache.fetch()) enthält beim
+gleichzeitigen Auswerten (pipeline.py) die Schritte "inflate" (Warten auf entpackte
+Daten), "parse", "dates" und "aggregate". Außerhalb eines Requests (Hintergrund-Threads,
+Worker-Prozesse, manage.py) wird nichts gemessen; phase() kostet dann nur eine Abfrage
+der Kontextvariablen.
+
+Alle Werte gelten je Prozess; bei mehreren gunicorn-Workern zählt jeder für sich.
+Abschaltbar mit GHCN_METRICS=0 (dann weder Header noch /metrics).
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# Obergrenzen der Histogramm-Buckets in Sekunden (zusätzlich +Inf)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Dauern der Schritte im aktuellen Request (Name -> Sekunden), None außerhalb eines Requests
+_timings = ContextVar("timings", default=None)
+
+_END = object()
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+class Histogram:
+    """
+    Verteilung von Dauern (kumulative Buckets, Summe und Anzahl wie bei Prometheus).
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+@contextmanager
+def phase(name):
+    """
+    Misst die Dauer des Blocks als Schritt name des laufenden Requests.
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def timed(iterable, name):
+    """
+    Reicht die Elemente von iterable durch und misst die Zeit bis zum jeweils nächsten
+    Element als Schritt name (z.B. für die Blöcke eines Parsers).
+    """
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            item = next(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+def observe(name, labels, seconds):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def increment(name, labels, amount=1):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def server_timing(timings, total):
+    """
+    Wert des Server-Timing-Headers: die Schritte in der Reihenfolge ihres ersten Auftretens, dann total.
+    """
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def _endpoint(request):
+    match = getattr(request, "resolver_match", None)
+    return (match.url_name or "unnamed") if match is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Misst jeden Request (synchron und unter ASGI), setzt Server-Timing und führt die
+    Histogramme und Zähler je Endpunkt (Name der URL).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.GHCN_METRICS:
+            return self.get_response(request)
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self._finish(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not settings.GHCN_METRICS:
+            return await self.get_response(request)
+        # Die Threads von views.run_blocking() arbeiten in einer Kopie des Kontexts, also auf demselben dict
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self._finish(request, response, timings, time.perf_counter() - start)
+
+    @staticmethod
+    def _finish(request, response, timings, total):
+        endpoint = _endpoint(request)
+        response["Server-Timing"] = server_timing(timings, total)
+        observe("ghcn_request_duration_seconds", {"endpoint": endpoint}, total)
+        for name, seconds in timings.items():
+            observe("ghcn_phase_duration_seconds", {"endpoint": endpoint, "phase": name}, seconds)
+        increment("ghcn_requests_total", {"endpoint": endpoint, "status": str(response.status_code)})
+        if not response.streaming:
+            increment("ghcn_response_bytes_total", {"endpoint": endpoint}, len(response.content))
+        return response
+
+
+# Beschreibung und Typ der ausgegebenen Metriken
+HELP = {
+    "ghcn_request_duration_seconds": ("histogram", "Dauer der Requests je Endpunkt"),
+    "ghcn_phase_duration_seconds": ("histogram", "Dauer der Verarbeitungsschritte je Endpunkt und Schritt"),
+    "ghcn_requests_total": ("counter", "Requests je Endpunkt und Statuscode"),
+    "ghcn_response_bytes_total": ("counter", "Ausgelieferte Bytes (nach Kompression) je Endpunkt"),
+    "ghcn_station_cache_events_total": ("counter", "Abrufe und Verdrängungen im Cache der Stationsdateien"),
+    "ghcn_station_cache_downloaded_bytes_total": ("counter", "Vom Upstream geladene Bytes der Stationsdateien"),
+    "ghcn_singleflight_calls_total": ("counter", "Ausgeführte und zusammengefasste Abrufe (singleflight)"),
+    "ghcn_response_cache_requests_total": ("counter", "Treffer und Fehlschläge im Cache der API-Antworten"),
+    "ghcn_upstream_requests_total": ("counter", "Abrufe beim Upstream (einschließlich Wiederholungen)"),
+    "ghcn_upstream_retries_total": ("counter", "Wiederholte Abrufe nach vorübergehenden Fehlern"),
+    "ghcn_upstream_rejections_total": ("counter", "Mangels freiem Platz abgewiesene Abrufe (503) je Grund"),
+    "ghcn_upstream_active": ("gauge", "Laufende Abrufe beim Upstream"),
+    "ghcn_upstream_queue_depth": ("gauge", "Auf einen freien Platz wartende Abrufe"),
+}
+
+
+def _module_values():
+    """
+    Zähler der Caches (station_cache, singleflight, response_cache) und des Upstreams
+    (einschließlich der aktuellen Auslastung) als {(Name, Labels): Wert}.
+    """
+    # Erst hier importiert: parsing.py und aggregates.py (auch in Worker-Prozessen) importieren dieses Modul
+    from . import response_cache, singleflight, station_cache, upstream
+
+    counters = {}
+    for event, value in station_cache.stats().items():
+        if event == "bytes_downloaded":
+            counters[("ghcn_station_cache_downloaded_bytes_total", ())] = value
+        else:
+            counters[("ghcn_station_cache_events_total", (("event", event),))] = value
+    for result, value in singleflight.stats().items():
+        counters[("ghcn_singleflight_calls_total", (("result", result),))] = value
+    for result, value in response_cache.stats().items():
+        counters[("ghcn_response_cache_requests_total", (("result", result),))] = value
+    upstream_stats = upstream.stats()
+    counters[("ghcn_upstream_requests_total", ())] = upstream_stats.get("requests", 0)
+    counters[("ghcn_upstream_retries_total", ())] = upstream_stats.get("retries", 0)
+    for reason in ("queue_full", "timeout"):
+        value = upstream_stats.get(f"rejected_{reason}", 0)
+        counters[("ghcn_upstream_rejections_total", (("reason", reason),))] = value
+    load = upstream.load()
+    counters[("ghcn_upstream_active", ())] = load["active"]
+    counters[("ghcn_upstream_queue_depth", ())] = load["waiting"]
+    return counters
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def render():
+    """
+    Alle Metriken dieses Prozesses im Prometheus-Textformat (Version 0.0.4).
+    """
+    with _lock:
+        histograms = {key: (list(h.buckets), h.sum, h.count) for key, h in _histograms.items()}
+        counters = dict(_counters)
+    counters.update(_module_values())
+
+    lines = []
+    for name, (kind, text) in HELP.items():
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        if kind == "histogram":
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, value in zip(BUCKETS + ("+Inf",), buckets):
+                    cumulative += value
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {total!r}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        else:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
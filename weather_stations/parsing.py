@@ -0,0 +1,386 @@
+"""
+Einlesen der GHCN-Stationsdateien (by_station/{station_id}.csv.gz).
+
+Format je Zeile: ID, DATE (YYYYMMDD), ELEMENT, VALUE (Zehntel), M-FLAG, Q-FLAG, S-FLAG, OBS-TIME
+
+Die Dateien werden blockweise (CHUNK_ROWS Zeilen) gelesen. Pro Block werden nur
+die benötigten Spalten geparst, fremde Messgrößen und Jahre außerhalb des
+gewünschten Zeitraums sofort verworfen und DATE direkt als Ganzzahl in Jahr
+und Monat zerlegt. Der Speicherbedarf hängt damit von der Blockgröße ab,
+nicht von der Dateigröße.
+
+Der eigentliche Parser ist austauschbar (Einstellung GHCN_CSV_PARSER):
+
+- "pandas": pd.read_csv mit der C-Engine, blockweise (Standard)
+- "pyarrow": pd.read_csv(engine="pyarrow") mit Arrow-Datentypen; liest die
+  Datei mehrfädig, aber in einem Stück (benötigt das Paket pyarrow)
+- "numpy": eigener Parser für das feste GHCN-Zeilenlayout, der Byteblöcke
+  direkt mit NumPy zerlegt; Blöcke mit abweichendem Layout liest er mit pandas
+
+Alle Parser liefern dieselben Werte, auch für fehlerhafte Zeilen: ein Datum, das
+keine Ganzzahl oder kein gültiges Kalenderdatum ist, verwirft die Zeile; ein leerer
+oder nicht numerischer Messwert wird NaN (fehlender Wert, zählt in keinem Mittel).
+Welcher Parser am schnellsten ist, hängt von der Hardware ab (siehe
+benchmarks/bench_parsers.py).
+
+pandas wird erst in den Funktionen importiert, die es brauchen: der Import kostet
+mehrere hundert Millisekunden, die sonst jeder Worker beim Start bezahlt, auch wenn
+er nur Suchen (ohne Stationsdateien) beantwortet. Mit gunicorn.conf.py (preload_app)
+lädt der Master pandas vor dem fork() für alle Worker.
+"""
+import gzip
+import importlib.util
+import zlib
+from collections import namedtuple
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from . import metrics
+
+COLUMNS = ['ID', 'DATE', 'ELEMENT', 'VALUE', 'M-FLAG', 'Q-FLAG', 'S-FLAG', 'OBS-TIME']
+
+TEMPERATURE_ELEMENTS = ("TMAX", "TMIN")
+
+# Zeilen pro Block beim Einlesen
+CHUNK_ROWS = 200_000
+
+# Tage je Monat (Februar ohne Schaltjahr)
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# NumPy-Parser: angenommene mittlere Zeilenlänge (Blockgröße = Zeilen * LINE_BYTES)
+# und maximale Breite des VALUE-Feldes inklusive Vorzeichen
+LINE_BYTES = 32
+VALUE_WIDTH = 6
+
+# Blockgröße beim Zerlegen nach Jahren (iter_year_blocks())
+YEAR_BLOCK_BYTES = 1024 * 1024
+
+# Zusammenhängende Zeilen eines Jahres: Anzahl Zeilen, CRC-32 und Inhalt (vollständige Zeilen)
+YearBlock = namedtuple("YearBlock", ["year", "lines", "checksum", "data"])
+
+
+def split_dates(dates):
+    """
+    Zerlegt ganzzahlige Datumswerte YYYYMMDD in (year, month, day, valid).
+    valid ist False für unmögliche Kalenderdaten (z.B. 20010231).
+    """
+    dates = np.asarray(dates, dtype=np.int64)
+    year = dates // 10000
+    month = dates // 100 % 100
+    day = dates % 100
+    valid = (month >= 1) & (month <= 12) & (day >= 1)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    days_in_month = DAYS_IN_MONTH[np.clip(month, 1, 12) - 1] + ((month == 2) & leap)
+    valid &= day <= days_in_month
+    return year, month, day, valid
+
+
+def date_numbers(column):
+    """
+    DATE-Spalte (pandas Series) als int64 für split_dates(). Die Spalte wird ohne festen
+    dtype eingelesen: sind alle Werte Ganzzahlen, ist sie bereits ganzzahlig; sonst (z.B.
+    2000XX01 oder leer) werden die Werte einzeln umgewandelt und alles, was keine Ganzzahl
+    ist, wird 0 (ungültig, die Zeile wird verworfen).
+    """
+    if column.dtype.kind in "iu" and not column.hasnans:
+        return column.to_numpy(dtype=np.int64)
+    import pandas as pd
+    numbers = pd.to_numeric(column, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    # NaN ist ungleich sich selbst und wird damit ebenfalls 0
+    return np.where(numbers == np.floor(numbers), numbers, 0).astype(np.int64)
+
+
+def value_numbers(column):
+    """
+    VALUE-Spalte (pandas Series) als float64; leere und nicht numerische Werte werden NaN.
+    """
+    if column.dtype.kind not in "iuf":
+        import pandas as pd
+        column = pd.to_numeric(column, errors="coerce")
+    return column.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _pandas_records(fileobj, elements, chunksize):
+    """
+    Parser "pandas": C-Engine, blockweise mit chunksize Zeilen.
+    """
+    import pandas as pd
+    reader = pd.read_csv(
+        fileobj,
+        header=None,
+        names=COLUMNS,
+        usecols=['DATE', 'ELEMENT', 'VALUE'],
+        # DATE und VALUE ohne festen dtype, damit ein fehlerhafter Wert nicht die ganze Datei scheitern lässt
+        dtype={'ELEMENT': str},
+        chunksize=chunksize,
+    )
+    with reader:
+        for chunk in reader:
+            if elements is not None:
+                chunk = chunk[chunk['ELEMENT'].isin(elements)]
+            yield date_numbers(chunk['DATE']), chunk['ELEMENT'].to_numpy(), value_numbers(chunk['VALUE'])
+
+
+def _pyarrow_records(fileobj, elements, chunksize):
+    """
+    Parser "pyarrow": mehrfädiges Einlesen mit Arrow-Datentypen. Die pyarrow-Engine
+    kennt kein chunksize, die entpackte Datei wird daher in einem Stück in den Speicher gelesen.
+    """
+    import pandas as pd
+    raw = fileobj.read()
+    if not raw.strip():
+        # Leere Datei: pyarrow meldet einen ParserError, die anderen Parser liefern keine Zeilen
+        return
+    data = pd.read_csv(
+        BytesIO(raw),
+        engine='pyarrow',
+        header=None,
+        # Spaltenauswahl über Positionen: names + usecols mit Namen versteht die pyarrow-Engine nicht
+        usecols=[COLUMNS.index(column) for column in ('DATE', 'ELEMENT', 'VALUE')],
+        dtype_backend='pyarrow',
+    )
+    data.columns = ['DATE', 'ELEMENT', 'VALUE']
+    if elements is not None:
+        data = data[data['ELEMENT'].isin(elements)]
+    yield date_numbers(data['DATE']), data['ELEMENT'].to_numpy(dtype=object), value_numbers(data['VALUE'])
+
+
+def _element_code(element):
+    """
+    Die vier Zeichen eines Elementnamens als uint32 (wie sie im Puffer stehen).
+    """
+    return np.frombuffer(element.encode('ascii'), dtype=np.uint32)[0]
+
+
+def _parse_fixed_fields(data, codes):
+    """
+    Zerlegt vollständige Zeilen (bytes) im GHCN-Layout ID,DATE,ELEMENT,VALUE,... mit
+    festen Feldbreiten für DATE (8) und ELEMENT (4). Die Breite der ID wird aus der
+    ersten Zeile bestimmt (eine Datei enthält nur eine Station). codes sind die
+    gewünschten Elemente (siehe _element_code()), None = alle.
+    Liefert None, wenn eine Zeile nicht in dieses Layout passt (siehe _numpy_records()).
+    """
+    import pandas as pd
+    if not data.endswith(b"\n"):
+        data += b"\n"
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord("\n"))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    nonempty = ends > starts
+    starts, ends = starts[nonempty], ends[nonempty]
+    if not len(starts):
+        return np.array([], dtype=np.int64), np.array([], dtype=object), np.array([], dtype=np.float64)
+
+    id_width = data.find(b",", int(starts[0])) - int(starts[0])
+    date_at = starts + id_width + 1
+    element_at = date_at + 9
+    value_at = element_at + 5
+    if (id_width < 0 or (value_at >= ends).any() or (buf[date_at - 1] != ord(",")).any()
+            or (buf[element_at - 1] != ord(",")).any() or (buf[value_at - 1] != ord(",")).any()):
+        return None
+
+    element = buf[element_at[:, np.newaxis] + np.arange(4)].view(np.uint32).ravel()
+    if codes is not None:
+        keep = np.isin(element, codes)
+        element, date_at, value_at = element[keep], date_at[keep], value_at[keep]
+
+    digits = buf[date_at[:, np.newaxis] + np.arange(8)].astype(np.int64) - ord("0")
+    dates = digits @ 10 ** np.arange(7, -1, -1)
+    # Nicht-Ziffern ergeben ein ungültiges Datum (wird später verworfen)
+    dates[((digits < 0) | (digits > 9)).any(axis=1)] = 0
+
+    window = buf[np.minimum(value_at[:, np.newaxis] + np.arange(VALUE_WIDTH), len(buf) - 1)]
+    negative = window[:, 0] == ord("-")
+    digits = window.astype(np.int64) - ord("0")
+    is_digit = (digits >= 0) & (digits <= 9)
+    # Ziffern nach dem optionalen Vorzeichen bis zum ersten anderen Zeichen
+    run = np.cumprod(is_digit | ((np.arange(VALUE_WIDTH) == 0) & negative[:, np.newaxis]), axis=1)
+    run = run.astype(bool) & is_digit
+    length = run.sum(axis=1)
+    end = length + negative
+    # Leerer Messwert: fehlt (NaN wie bei pandas)
+    empty = window[:, 0] == ord(",")
+    if (~empty & ((length == 0) | (end >= VALUE_WIDTH))).any() or \
+            (window[np.arange(len(window)), np.minimum(end, VALUE_WIDTH - 1)] != ord(",")).any():
+        return None
+    values = np.zeros(len(window), dtype=np.int64)
+    for k in range(VALUE_WIDTH):
+        values = np.where(run[:, k], values * 10 + digits[:, k], values)
+    values = np.where(negative, -values, values).astype(np.float64)
+    values[empty] = np.nan
+
+    inverse, names = pd.factorize(element)
+    names = names.astype(np.uint32).view('S4').astype(str).astype(object)
+    return dates, names[inverse], values
+
+
+def _numpy_records(fileobj, elements, chunksize):
+    """
+    Parser "numpy": liest Byteblöcke von etwa chunksize Zeilen; die unvollständige
+    letzte Zeile eines Blocks wird dem nächsten Block vorangestellt. Blöcke, die nicht
+    in das feste Layout passen (z.B. ein Datum mit Bindestrichen oder ein nicht
+    numerischer Messwert), werden mit dem Parser "pandas" gelesen, damit fehlerhafte
+    Zeilen bei allen Parsern gleich behandelt werden.
+    """
+    codes = None if elements is None else np.array([_element_code(element) for element in elements])
+    block_size = chunksize * LINE_BYTES
+    rest = b""
+    while True:
+        block = fileobj.read(block_size)
+        data = rest + block
+        if block:
+            cut = data.rfind(b"\n") + 1
+            data, rest = data[:cut], data[cut:]
+        if data:
+            records = _parse_fixed_fields(data, codes)
+            if records is None:
+                yield from _pandas_records(BytesIO(data), elements, chunksize)
+            else:
+                yield records
+        if not block:
+            break
+
+
+def _line_year_keys(data, starts, ends):
+    """
+    Die vier Bytes der Jahreszahl (Beginn von DATE) jeder Zeile starts/ends in data als
+    uint32, zum Gruppieren ohne Umrechnung in Zahlen. Die Breite der ID wird aus der
+    ersten Zeile bestimmt.
+    """
+    id_width = data.find(b",", int(starts[0])) - int(starts[0])
+    if id_width < 0 or (starts + id_width + 5 > ends).any():
+        raise ValueError("Unerwartetes Zeilenformat in der Stationsdatei")
+    # Sicht auf den Puffer, deren Element i die Bytes i..i+3 sind
+    words = np.ndarray((len(data) - 3,), dtype="<u4", buffer=data, strides=(1,))
+    return words[starts + id_width + 1]
+
+
+def _year(key):
+    """
+    Jahr zu einem Schlüssel aus _line_year_keys(); -1, wenn dort keine vier Ziffern stehen.
+    """
+    text = int(key).to_bytes(4, "little")
+    return int(text) if text.isdigit() else -1
+
+
+def iter_year_blocks(fileobj, block_size=YEAR_BLOCK_BYTES):
+    """
+    Zerlegt eine (entpackte) Stationsdatei in Folgen aufeinanderfolgender Zeilen desselben
+    Jahres und liefert sie als YearBlock. Die Dateien im Bucket sind nach Datum sortiert,
+    dann gibt es je Jahr genau einen Block; sonst kann ein Jahr mehrfach vorkommen.
+    Leere Zeilen zählen nicht mit.
+    """
+    year, lines, checksum, pieces = None, 0, 0, []
+    rest = b""
+    while True:
+        with metrics.phase("inflate"):
+            block = fileobj.read(block_size)
+        data = rest + block
+        if block:
+            cut = data.rfind(b"\n") + 1
+            data, rest = data[:cut], data[cut:]
+        elif data and not data.endswith(b"\n"):
+            data += b"\n"
+        buf = np.frombuffer(data, dtype=np.uint8)
+        ends = np.flatnonzero(buf == ord("\n"))
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        nonempty = ends > starts
+        starts, ends = starts[nonempty], ends[nonempty]
+        if len(starts):
+            keys = _line_year_keys(data, starts, ends)
+            boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+            for first, last in zip(np.concatenate(([0], boundaries)).tolist(),
+                                   np.concatenate((boundaries, [len(keys)])).tolist()):
+                run_year = _year(keys[first])
+                piece = data[int(starts[first]):int(ends[last - 1]) + 1]
+                if run_year != year:
+                    if year is not None:
+                        yield YearBlock(year, lines, checksum, b"".join(pieces))
+                    year, lines, checksum, pieces = run_year, 0, 0, []
+                lines += last - first
+                checksum = zlib.crc32(piece, checksum)
+                pieces.append(piece)
+        if not block:
+            break
+    if year is not None:
+        yield YearBlock(year, lines, checksum, b"".join(pieces))
+
+
+PARSERS = {
+    'pandas': _pandas_records,
+    'pyarrow': _pyarrow_records,
+    'numpy': _numpy_records,
+}
+
+
+def get_parser(name=None):
+    """
+    Liefert den Parser name (Standard: Einstellung GHCN_CSV_PARSER). Ein Parser ist eine
+    Funktion (fileobj, elements, chunksize), die Blöcke (dates, elements, values) als
+    NumPy-Arrays liefert.
+    """
+    name = name or settings.GHCN_CSV_PARSER
+    if name not in PARSERS:
+        raise ImproperlyConfigured(
+            f"Unbekannter CSV-Parser {name!r} (GHCN_CSV_PARSER), möglich: {', '.join(PARSERS)}")
+    if name == 'pyarrow' and importlib.util.find_spec('pyarrow') is None:
+        raise ImproperlyConfigured("Der CSV-Parser 'pyarrow' benötigt das Paket pyarrow (pip install pyarrow)")
+    return PARSERS[name]
+
+
+def iter_station_chunks(fileobj, elements=TEMPERATURE_ELEMENTS, start_year=None, end_year=None, chunksize=None,
+                        parser=None):
+    """
+    Liest eine (entpackte) Stationsdatei blockweise und liefert je Block einen DataFrame
+    mit den Spalten YEAR, MONTH, ELEMENT und VALUE (Rohwerte in Zehntel).
+    Es bleiben nur Zeilen der angegebenen Messgrößen (None = alle), mit gültigem Datum
+    und im Zeitraum start_year..end_year (jeweils optional).
+    chunksize ist die Anzahl Zeilen pro Block (Standard: CHUNK_ROWS), parser der Name
+    des Parsers (Standard: GHCN_CSV_PARSER).
+    """
+    import pandas as pd
+    records = get_parser(parser)
+    chunks = metrics.timed(records(fileobj, elements, chunksize or CHUNK_ROWS), "parse")
+    for dates, element_values, values in chunks:
+        with metrics.phase("dates"):
+            year, month, _, keep = split_dates(dates)
+        if start_year is not None:
+            keep &= year >= start_year
+        if end_year is not None:
+            keep &= year <= end_year
+        if not keep.any():
+            continue
+        yield pd.DataFrame({
+            'YEAR': year[keep],
+            'MONTH': month[keep],
+            'ELEMENT': element_values[keep],
+            'VALUE': values[keep],
+        })
+
+
+def open_station_file(path):
+    """
+    Öffnet eine csv.gz-Stationsdatei zum Lesen (entpackt).
+    """
+    return gzip.open(path, 'rb')
+
+
+def read_station_file(path, **filters):
+    """
+    Liest eine csv.gz-Stationsdatei vollständig als einen DataFrame
+    (Spalten und Filter wie iter_station_chunks()).
+    """
+    import pandas as pd
+    with open_station_file(path) as f:
+        chunks = list(iter_station_chunks(f, **filters))
+    if not chunks:
+        return pd.DataFrame({
+            'YEAR': np.array([], dtype=np.int64),
+            'MONTH': np.array([], dtype=np.int64),
+            'ELEMENT': np.array([], dtype=object),
+            'VALUE': np.array([], dtype=np.float64),
+        })
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,193 @@
+"""
+Überlappendes Herunterladen, Entpacken und Parsen einer Stationsdatei.
+
+Statt die csv.gz-Datei erst vollständig herunterzuladen und danach zu entpacken
+und zu parsen, laufen die Schritte als Pipeline nebeneinander:
+
+1. Download (eigener Thread): liest Blöcke aus response.raw, schreibt sie
+   optional unverändert in eine Datei (lokaler Cache) und reicht sie weiter.
+2. Entpacken (eigener Thread): zlib.decompressobj im gzip-Modus, auch für
+   Dateien aus mehreren gzip-Abschnitten.
+3. Parsen (aufrufender Thread): liest die entpackten Daten über einen
+   dateiähnlichen QueueReader, z.B. mit parsing.iter_station_chunks().
+
+Die Stufen sind durch begrenzte Queues verbunden; ist eine Stufe langsamer,
+blockieren die vorderen Stufen (Gegendruck), der Speicherbedarf bleibt also
+begrenzt. Die Gesamtdauer nähert sich max(Download, Parsen) statt deren Summe.
+Fehler einer Stufe werden durch die Queues weitergereicht und beim Lesen im
+aufrufenden Thread ausgelöst.
+"""
+import io
+import queue
+import threading
+import zlib
+
+# Blockgröße beim Lesen aus dem Netz und beim Entpacken
+CHUNK_SIZE = 256 * 1024
+INFLATE_CHUNK_SIZE = 1024 * 1024
+
+# Anzahl Blöcke, die je Queue höchstens zwischengespeichert werden
+QUEUE_DEPTH = 8
+
+# Wie oft (Sekunden) blockierte Stufen prüfen, ob die Pipeline abgebrochen wurde
+POLL_INTERVAL = 0.1
+
+_END = object()
+
+
+class _Failure:
+    """
+    Transportiert eine Ausnahme einer Stufe durch die Queues.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+
+class QueueReader(io.RawIOBase):
+    """
+    Dateiähnliche Sicht (read/readinto) auf eine Queue von bytes-Blöcken.
+    """
+
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = chunks
+        self._buffer = memoryview(b"")
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    @property
+    def eof(self):
+        return self._eof
+
+    def readinto(self, b):
+        while not self._buffer:
+            if self._eof:
+                return 0
+            item = self._chunks.get()
+            if item is _END:
+                self._eof = True
+                return 0
+            if isinstance(item, _Failure):
+                raise item.error
+            self._buffer = memoryview(item)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def drain(self):
+        """
+        Liest den Rest bis zum Ende (damit z.B. die Cache-Datei vollständig geschrieben wird).
+        """
+        while self.read(INFLATE_CHUNK_SIZE):
+            pass
+
+
+class Pipeline:
+    """
+    Kontextmanager, der Download und Entpacken im Hintergrund startet und einen
+    QueueReader mit den entpackten Daten liefert:
+
+        with Pipeline(response.raw, sink=f) as reader:
+            result = parse(reader)
+
+    source ist ein dateiähnliches Objekt mit den gzip-Daten, sink (optional) erhält
+    eine unveränderte Kopie. Wird der Block vor dem Ende der Daten verlassen (z.B.
+    durch einen Fehler beim Parsen), werden die Hintergrund-Threads abgebrochen.
+    """
+
+    def __init__(self, source, sink=None, chunk_size=CHUNK_SIZE, depth=QUEUE_DEPTH):
+        self._cancelled = threading.Event()
+        compressed = queue.Queue(depth)
+        inflated = queue.Queue(depth)
+        self.reader = QueueReader(inflated)
+        self._threads = [
+            threading.Thread(target=self._download, args=(source, sink, compressed, chunk_size), daemon=True),
+            threading.Thread(target=self._inflate, args=(compressed, inflated), daemon=True),
+        ]
+
+    def __enter__(self):
+        for thread in self._threads:
+            thread.start()
+        return self.reader
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.reader.eof:
+            self._cancelled.set()
+        for thread in self._threads:
+            thread.join(None if self.reader.eof else POLL_INTERVAL * 10)
+        return False
+
+    def _put(self, chunks, item):
+        """
+        Legt item in die Queue; False, wenn die Pipeline inzwischen abgebrochen wurde.
+        """
+        while not self._cancelled.is_set():
+            try:
+                chunks.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, chunks):
+        while not self._cancelled.is_set():
+            try:
+                return chunks.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _download(self, source, sink, compressed, chunk_size):
+        try:
+            while not self._cancelled.is_set():
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                if sink is not None:
+                    sink.write(chunk)
+                if not self._put(compressed, chunk):
+                    return
+            self._put(compressed, _END)
+        except Exception as e:
+            self._put(compressed, _Failure(e))
+
+    def _inflate(self, compressed, inflated):
+        try:
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            started = False
+            while True:
+                item = self._get(compressed)
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    self._put(inflated, item)
+                    return
+                data = item
+                while True:
+                    started = started or bool(data)
+                    out = decompressor.decompress(data, INFLATE_CHUNK_SIZE)
+                    if out and not self._put(inflated, out):
+                        return
+                    if decompressor.eof:
+                        # Nächster gzip-Abschnitt (Dateien aus mehreren Abschnitten)
+                        data = decompressor.unused_data
+                        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                        started = False
+                        if not data:
+                            break
+                        continue
+                    data = decompressor.unconsumed_tail
+                    # Ein voller Ausgabeblock kann weitere gepufferte Ausgabe bedeuten
+                    if not data and len(out) < INFLATE_CHUNK_SIZE:
+                        break
+            if self._cancelled.is_set():
+                return
+            if started:
+                raise EOFError("Die gzip-Daten der Stationsdatei sind unvollständig")
+            self._put(inflated, _END)
+        except Exception as e:
+            self._put(inflated, _Failure(e))
@@ -0,0 +1,243 @@
+"""
+Auswertung vieler lokaler Stationsdateien (by_station/*.csv.gz) für Offline-Jobs,
+z.B. nächtliche Berichte über Tausende Stationen (manage.py station_report).
+
+Jede Datei wird genau einmal entpackt und blockweise geparst (parsing.iter_station_chunks(),
+nur die gewünschten Messgrößen und der Jahresbereich) und beantwortet dabei alle
+gewünschten Paare (Jahr, Messgröße) auf einmal: je Block werden Anzahl, Summe, Minimum
+und Maximum je Jahr und Messgröße mit NumPy gebildet und über die Blöcke zusammengeführt.
+Die Dateien verteilen sich wie beim Import (ingest.py) auf einen Prozess-Pool, standardmäßig
+mit einem Prozess je CPU-Kern; der Hauptprozess sammelt nur die kleinen Ergebnisse.
+
+Ergebnis ist eine Tabelle mit einer Zeile je Station, Jahr und Messgröße (station_id,
+year, element, count, mean, min, max); Paare ohne Werte erscheinen mit count 0 und leeren
+Werten. Messgrößen in Zehnteln (TENTHS_ELEMENTS, z.B. Temperaturen in Zehntel Grad)
+werden in ganze Einheiten umgerechnet, alle übrigen bleiben unverändert.
+"""
+import importlib.util
+import multiprocessing
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from . import station_cache
+from .parsing import TEMPERATURE_ELEMENTS, iter_station_chunks, open_station_file
+
+# Messgrößen, die GHCN in Zehnteln speichert (Grad Celsius, Millimeter)
+TENTHS_ELEMENTS = frozenset(("TMAX", "TMIN", "TAVG", "TOBS", "PRCP"))
+
+COLUMNS = ["station_id", "year", "element", "count", "mean", "min", "max"]
+FORMATS = ("csv", "parquet")
+
+# Dateien je Prozess, die gleichzeitig in Arbeit sind (wie in ingest.py)
+QUEUE_PER_PROCESS = 4
+
+ELEMENT_PATTERN = re.compile(r"^[A-Z0-9]{4}$")
+
+# Fortschritt nach jeder Datei: Anzahl verarbeitet, Fehler und gelesene Bytes (komprimiert)
+Progress = namedtuple("Progress", ["done", "total", "failed", "bytes", "elapsed"])
+
+# Ergebnis von report(): die Tabelle (pandas.DataFrame), [(station_id, Fehlermeldung)] und der letzte Progress
+Report = namedtuple("Report", ["data", "errors", "progress"])
+
+
+def parse_years(text):
+    """
+    Jahre aus einer Angabe wie "1990-2000,2010" als sortierte Liste.
+    """
+    years = set()
+    for part in text.split(","):
+        first, separator, last = part.strip().partition("-")
+        try:
+            first = int(first)
+            last = int(last) if separator else first
+        except ValueError:
+            raise ValueError(f"Ungültige Jahresangabe: {part.strip()!r}")
+        if last < first:
+            raise ValueError(f"Ungültiger Jahresbereich: {part.strip()!r}")
+        years.update(range(first, last + 1))
+    return sorted(years)
+
+
+def parse_elements(names):
+    """
+    Messgrößen (z.B. "TMAX", "tmin") in Großbuchstaben, ohne Duplikate.
+    """
+    elements = []
+    for name in names:
+        name = name.strip().upper()
+        if not ELEMENT_PATTERN.match(name):
+            raise ValueError(f"Ungültige Messgröße: {name!r}")
+        if name not in elements:
+            elements.append(name)
+    return elements
+
+
+def select_files(directory, station_ids=(), pattern=None):
+    """
+    Die Stationsdateien in directory als [(station_id, Pfad)] (sortiert) und die station_ids,
+    zu denen keine Datei vorliegt. Ohne station_ids werden alle Dateien {station_id}.csv.gz
+    genommen, die auf pattern (Glob relativ zu directory, z.B. "USW*.csv.gz") passen.
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        raise OSError(f"{directory} ist kein Verzeichnis")
+    files, missing = {}, []
+    for station_id in station_ids:
+        if not station_cache.STATION_ID_PATTERN.match(station_id):
+            raise ValueError(f"Ungültige Station ID: {station_id!r}")
+        path = directory / f"{station_id}.csv.gz"
+        if path.is_file():
+            files[station_id] = path
+        else:
+            missing.append(station_id)
+    if not station_ids:
+        for path in directory.glob(pattern or "*.csv.gz"):
+            station_id = path.name[:-len(".csv.gz")]
+            if path.name.endswith(".csv.gz") and station_cache.STATION_ID_PATTERN.match(station_id):
+                files[station_id] = path
+    return sorted(files.items()), missing
+
+
+def summarize_file(path, years, elements, parser=None):
+    """
+    Anzahl, Summe, Minimum und Maximum der Rohwerte je Jahr und Messgröße, jeweils als Array
+    der Form (years[-1] - years[0] + 1, len(elements)); Jahre ohne Werte haben count 0.
+    """
+    first_year, last_year = years[0], years[-1]
+    wanted = np.zeros(last_year - first_year + 1, dtype=bool)
+    wanted[np.asarray(years) - first_year] = True
+    shape = (len(wanted), len(elements))
+    counts = np.zeros(shape, dtype=np.int64)
+    sums = np.zeros(shape)
+    minima = np.full(shape, np.inf)
+    maxima = np.full(shape, -np.inf)
+    codes = {element: i for i, element in enumerate(elements)}
+
+    with open_station_file(path) as f:
+        for chunk in iter_station_chunks(f, elements=elements, start_year=first_year, end_year=last_year,
+                                         parser=parser):
+            year = chunk['YEAR'].to_numpy() - first_year
+            keep = wanted[year]
+            element = chunk['ELEMENT'].map(codes).to_numpy()[keep]
+            values = chunk['VALUE'].to_numpy()[keep]
+            cell = (year[keep], element)
+            np.add.at(counts, cell, 1)
+            np.add.at(sums, cell, values)
+            np.minimum.at(minima, cell, values)
+            np.maximum.at(maxima, cell, values)
+    return counts, sums, minima, maxima
+
+
+def _init_worker():
+    # pandas/NumPy beim Start des Workers laden, nicht erst bei der ersten Datei
+    import pandas  # noqa: F401
+
+    from . import parsing  # noqa: F401
+
+
+def _rows(station_id, years, elements, summary):
+    """
+    Die Zeilen einer Station (in der Reihenfolge von COLUMNS) aus dem Ergebnis von summarize_file().
+    """
+    counts, sums, minima, maxima = summary
+    rows = []
+    for year in years:
+        i = year - years[0]
+        for j, element in enumerate(elements):
+            count = int(counts[i, j])
+            if count == 0:
+                rows.append((station_id, year, element, 0, np.nan, np.nan, np.nan))
+                continue
+            scale = 10.0 if element in TENTHS_ELEMENTS else 1.0
+            rows.append((station_id, year, element, count, round(sums[i, j] / count / scale, 2),
+                         minima[i, j] / scale, maxima[i, j] / scale))
+    return rows
+
+
+def report(files, years, elements=TEMPERATURE_ELEMENTS, processes=None, parser=None, progress=None):
+    """
+    Wertet die Dateien files ([(station_id, Pfad)], siehe select_files()) für die Jahre years
+    und Messgrößen elements aus und liefert einen Report. processes: Anzahl Worker-Prozesse
+    (Standard: Anzahl CPU-Kerne), parser: Name des CSV-Parsers (Standard: GHCN_CSV_PARSER),
+    progress: Funktion, die nach jeder Datei den Progress und ggf. (station_id, Fehlermeldung) erhält.
+    """
+    import pandas as pd
+
+    years, elements = sorted(years), list(elements)
+    processes = max(1, min(processes or os.cpu_count() or 1, len(files) or 1))
+    parser = parser or settings.GHCN_CSV_PARSER
+    start = time.monotonic()
+    counts = {"done": 0, "failed": 0, "bytes": 0}
+    rows, errors = [], []
+
+    def current():
+        return Progress(total=len(files), elapsed=time.monotonic() - start, **counts)
+
+    pending = iter(files)
+    pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+    try:
+        running = {}
+        while True:
+            for station_id, path in pending:
+                running[pool.submit(summarize_file, path, years, elements, parser)] = (station_id, path)
+                if len(running) >= processes * QUEUE_PER_PROCESS:
+                    break
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                station_id, path = running.pop(future)
+                counts["done"] += 1
+                counts["bytes"] += path.stat().st_size
+                error = None
+                try:
+                    rows.extend(_rows(station_id, years, elements, future.result()))
+                except Exception as e:
+                    counts["failed"] += 1
+                    error = (station_id, str(e))
+                    errors.append(error)
+                if progress is not None:
+                    progress(current(), error)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+    data = pd.DataFrame.from_records(rows, columns=COLUMNS)
+    # Die Zeilen einer Station liegen bereits nach Jahr und Messgröße (in der gewünschten Reihenfolge) vor
+    data = data.sort_values("station_id", kind="stable", ignore_index=True)
+    return Report(data, errors, current())
+
+
+def output_format(path, fmt=None):
+    """
+    Ausgabeformat: fmt, sonst nach der Endung von path (.parquet, sonst CSV).
+    """
+    if fmt is None:
+        fmt = "parquet" if str(path).endswith(".parquet") else "csv"
+    if fmt not in FORMATS:
+        raise ValueError(f"Unbekanntes Ausgabeformat {fmt!r}, möglich: {', '.join(FORMATS)}")
+    if fmt == "parquet":
+        if not isinstance(path, (str, Path)) or str(path) == "-":
+            raise ValueError("Parquet kann nicht auf die Standardausgabe geschrieben werden")
+        if importlib.util.find_spec("pyarrow") is None and importlib.util.find_spec("fastparquet") is None:
+            raise ValueError("Parquet benötigt das Paket pyarrow (pip install pyarrow)")
+    return fmt
+
+
+def write(data, target, fmt=None):
+    """
+    Schreibt die Tabelle eines Reports als CSV oder Parquet; target ist ein Pfad oder
+    (nur für CSV) ein geöffnetes Textobjekt.
+    """
+    fmt = output_format(target, fmt)
+    if fmt == "parquet":
+        data.to_parquet(target, index=False)
+    else:
+        data.to_csv(target, index=False, na_rep="")
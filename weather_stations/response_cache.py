@@ -0,0 +1,170 @@
+"""
+Cache für fertige JSON-Antworten der API-Endpunkte.
+
+Gleiche Anfragen (nach dem Einlesen der Parameter, also z.B. "50.1150" und
+"50.115" gleich) liefern dieselbe Antwort. Sie wird deshalb einmal berechnet
+und im Django-Cache "responses" (locmem oder Dateien, siehe GHCN_RESPONSE_CACHE)
+abgelegt: der JSON-Text, eine gzip-komprimierte (und, falls das Paket brotli
+installiert ist, eine brotli-komprimierte) Fassung sowie ein starkes ETag je
+Kodierung ("…-gzip", "…-br"), da sich die Bytes der Fassungen unterscheiden.
+Wiederholte Anfragen kosten so weder Berechnung noch Serialisierung noch
+Kompression; kennt der Client eines der ETags bereits (If-None-Match), genügt 304.
+
+Gecacht werden nur erfolgreiche Antworten (200). Innerhalb der TTL des
+Endpunkts werden Änderungen der Quelldaten nicht bemerkt; Cache-Control gibt
+Clients nur die verbleibende Lebensdauer des Eintrags mit.
+"""
+import gzip
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Version des Eintragsformats (Teil des Schlüssels)
+CACHE_VERSION = 2
+
+# Kleinere Antworten werden nicht komprimiert
+MIN_COMPRESS_SIZE = 256
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Header, die aus der berechneten Antwort in den Cache übernommen werden
+STORED_HEADERS = ("Content-Type", "X-Cache")
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def stats():
+    """
+    Zähler in diesem Prozess: hit (Antwort aus dem Cache), miss (neu berechnet).
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def cache_key(endpoint, params):
+    """
+    Schlüssel aus Endpunkt und eingelesenen (normalisierten) Parametern.
+    """
+    digest = hashlib.sha256(repr(tuple(params)).encode("utf-8")).hexdigest()
+    return f"response:{CACHE_VERSION}:{endpoint}:{digest}"
+
+
+def make_entry(response, ttl):
+    """
+    Cache-Eintrag einer berechneten Antwort: Inhalt in allen Kodierungen, ETag, Header
+    und Ablaufzeitpunkt (in ttl Sekunden).
+    """
+    body = response.content
+    entry = {
+        "etag": '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+        "headers": {name: response[name] for name in STORED_HEADERS if response.has_header(name)},
+        "identity": body,
+        "expires": time.time() + ttl,
+    }
+    if len(body) >= MIN_COMPRESS_SIZE:
+        entry["gzip"] = gzip.compress(body, GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            entry["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return entry
+
+
+def _accepted_encodings(header):
+    """
+    Kodierungen aus Accept-Encoding, die der Client annimmt (q > 0).
+    """
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name)
+    return accepted
+
+
+def _encoding_etag(etag, encoding):
+    """
+    ETag der Fassung in der Kodierung encoding (None = unkomprimiert), z.B. "…-gzip".
+    """
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+
+def _etag_matches(etag, header):
+    """
+    Vergleich mit If-None-Match (schwacher Vergleich, wie für If-None-Match vorgesehen).
+    Jede Kodierung des Inhalts gilt als Treffer, da sie denselben Inhalt darstellt.
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    candidates = {candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates}
+    return any(_encoding_etag(etag, encoding) in candidates for encoding in (None, "gzip", "br"))
+
+
+def build_response(request, entry, hit):
+    """
+    Antwort aus einem Cache-Eintrag: 304, falls der Client ein ETag des Inhalts kennt, sonst
+    der Inhalt in der besten vom Client akzeptierten Kodierung. max-age ist die verbleibende
+    Lebensdauer des Eintrags.
+    """
+    accepted = _accepted_encodings(request.headers.get("Accept-Encoding"))
+    encoding = next(
+        (name for name in ("br", "gzip") if name in entry and (name in accepted or "*" in accepted)), None)
+    if _etag_matches(entry["etag"], request.headers.get("If-None-Match")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry[encoding or "identity"])
+        for name, value in entry["headers"].items():
+            response[name] = value
+        if encoding:
+            response["Content-Encoding"] = encoding
+    response["ETag"] = _encoding_etag(entry["etag"], encoding)
+    response["Cache-Control"] = f"max-age={max(int(entry['expires'] - time.time()), 0)}"
+    response["Vary"] = "Accept-Encoding"
+    if hit:
+        response["X-Cache"] = "HIT"
+    return response
+
+
+def cached_response(request, endpoint, params, ttl, compute):
+    """
+    Antwort für (endpoint, params) aus dem Cache "responses"; fehlt sie, wird sie mit
+    compute() berechnet und (nur bei Status 200) für ttl Sekunden gespeichert.
+    """
+    cache = caches["responses"]
+    key = cache_key(endpoint, params)
+    entry = cache.get(key)
+    hit = entry is not None
+    with _stats_lock:
+        _stats["hit" if hit else "miss"] += 1
+    if entry is None:
+        response = compute()
+        if response.status_code != 200:
+            return response
+        entry = make_entry(response, ttl)
+        cache.set(key, entry, ttl)
+    return build_response(request, entry, hit)
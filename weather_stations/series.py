@@ -0,0 +1,371 @@
+"""
+Kompakte binäre Tageszeitreihen je Station (GHCN_CACHE_DIR/series/{station_id}.bin).
+
+Die CSV-Dateien speichern jeden Wert als Text samt vier meist leeren Flag-Spalten.
+Für Abfragen über Tageswerte wird eine Station einmal in ein spaltenweises
+Binärformat umgewandelt und danach per mmap (nur lesend) eingebunden:
+
+  - days: Tage seit 1970-01-01 (int32), aufsteigend, eine Zeile je Tag mit Werten
+  - values: Zehntel Grad je Messgröße (int16, Form (len(ELEMENTS), Tage)),
+    MISSING für fehlende Werte
+  - flags: je Wert ein Byte, Q-FLAG im unteren und M-FLAG im oberen Halbbyte
+    (Index in Q_FLAGS bzw. M_FLAGS, 0 = kein Flag)
+  - year_offsets: erste Zeile je Jahr first_year..last_year (plus Ende), ein
+    Zeitraum start_year..end_year ist damit ein Slice ohne Suche, Kopie oder Parsen
+  - die Fingerabdrücke je Jahr der Quelldatei (siehe aggregates.py), damit sich
+    daraus ein vollständiges Monatsaggregat ableiten lässt
+  - ordered im Kopf: die gültigen Zeilen der Datei sind nach Datum sortiert (je Tag
+    und Messgröße höchstens eine), die Zeitreihe hat also dieselbe Reihenfolge der
+    Werte wie die Datei (Voraussetzung für aggregates.StationAggregates.from_series())
+
+Eine JSON-Datei daneben enthält wie bei den Aggregaten die Version der Quelldatei
+und den Zeitpunkt der letzten Prüfung.
+
+Wer die Zeitreihe liest:
+
+  - get_station_series (views.py) beantwortet Abfragen über Tageswerte direkt aus ihr.
+  - get_station_data, der Batch-Endpunkt und get_regional_data lesen sie auf dem
+    Request-Pfad nicht: sie antworten aus den Monatsaggregaten (aggregates.py). Die
+    Zeitreihe dient dort nur als Eingabe, wenn ein Aggregat neu berechnet werden muss
+    (aggregates.update() leitet es aus ihr ab, statt die CSV-Datei zu parsen, sofern
+    sie zur selben Dateiversion gehört und ordered gesetzt ist). Eine Station, deren
+    Aggregat fehlt und für die nie Tageswerte abgefragt wurden, hat keine Zeitreihe;
+    das Aggregat wird dann aus der CSV-Datei berechnet.
+"""
+import json
+import mmap
+import struct
+import time
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from . import downsample, parsing, station_cache
+from .parsing import COLUMNS, date_numbers, iter_year_blocks, open_station_file, split_dates, value_numbers
+from .storage import atomic_write
+
+# Messgrößen der Zeitreihe (wie aggregates.ELEMENTS)
+ELEMENTS = ("TMAX", "TMIN")
+MISSING = -32768
+
+# Flags laut GHCN-Daily-Dokumentation; unbekannte Flags werden als 15 gespeichert
+Q_FLAGS = ("", "D", "G", "I", "K", "L", "M", "N", "O", "R", "S", "T", "W", "X", "Z")
+M_FLAGS = ("", "B", "D", "H", "K", "L", "O", "P", "T", "U", "W")
+UNKNOWN_FLAG = 15
+
+# Aufbau der Datei: Kopf (Magic, Version, Anzahl Messgrößen, Tage, erstes Jahr, Jahre,
+# Fingerabdrücke, ordered), danach die Spalten in fester Reihenfolge, jeweils auf 8 Byte ausgerichtet
+SERIES_MAGIC = b"GHCNSER1"
+SERIES_VERSION = 2
+SERIES_HEADER = struct.Struct("<8sIIIiIII")
+
+
+def _layout(elements, rows, years, fingerprints):
+    """
+    Liefert die Spalten als Liste (Name, dtype, shape, offset) und die Gesamtgröße.
+    """
+    sections = [
+        ("days", "<i4", (rows,)),
+        ("values", "<i2", (elements, rows)),
+        ("flags", "u1", (elements, rows)),
+        ("year_offsets", "<i8", (years + 1,)),
+        ("fingerprint_years", "<i4", (fingerprints,)),
+        ("fingerprint_lines", "<i8", (fingerprints,)),
+        ("fingerprint_checksums", "<u4", (fingerprints,)),
+    ]
+    layout = []
+    offset = SERIES_HEADER.size
+    for name, dtype, shape in sections:
+        dtype = np.dtype(dtype)
+        offset = (offset + 7) & ~7
+        layout.append((name, dtype, shape, offset))
+        offset += dtype.itemsize * int(np.prod(shape))
+    return layout, offset
+
+
+def _flag_codes(flags, known):
+    """
+    Index der Flags in known (0 = leer), UNKNOWN_FLAG für unbekannte.
+    """
+    # Erst hier importiert (Startzeit der Worker, siehe parsing.py)
+    import pandas as pd
+    codes = pd.Index(known).get_indexer(flags)
+    return np.where(codes < 0, UNKNOWN_FLAG, codes).astype(np.uint8)
+
+
+def _parse(data):
+    """
+    Zeilen der Messgrößen ELEMENTS aus CSV-Bytes: (Tag, Index der Messgröße, Wert, Flag-Byte).
+    """
+    import pandas as pd
+    frame = pd.read_csv(
+        BytesIO(data),
+        header=None,
+        names=COLUMNS,
+        usecols=['DATE', 'ELEMENT', 'VALUE', 'M-FLAG', 'Q-FLAG'],
+        dtype={'ELEMENT': str, 'M-FLAG': str, 'Q-FLAG': str},
+        keep_default_na=False,
+    )
+    frame = frame[frame['ELEMENT'].isin(ELEMENTS)]
+    year, month, day, valid = split_dates(date_numbers(frame['DATE']))
+    # Leere oder nicht numerische Messwerte fehlen (wie bei parsing.py)
+    values = value_numbers(frame['VALUE'])
+    valid &= ~np.isnan(values)
+    frame, values = frame[valid], values[valid]
+    year, month, day = year[valid], month[valid], day[valid]
+    days = ((year - 1970).astype('M8[Y]').astype('M8[M]') + (month - 1).astype('m8[M]')).astype('M8[D]')
+    days = (days + (day - 1).astype('m8[D]')).astype(np.int64)
+    flags = _flag_codes(frame['Q-FLAG'], Q_FLAGS) | (_flag_codes(frame['M-FLAG'], M_FLAGS) << 4)
+    elements = pd.Index(ELEMENTS).get_indexer(frame['ELEMENT'])
+    return days, elements, np.rint(values).astype(np.int64), flags
+
+
+def convert(fileobj):
+    """
+    Wandelt die entpackten CSV-Daten einer Station in den Inhalt einer Zeitreihendatei um.
+    """
+    fingerprints = {}
+    parts = []
+    sorted_years = True
+    pending, pending_lines = [], 0
+    for block in iter_year_blocks(fileobj):
+        if block.year in fingerprints:
+            sorted_years = False
+        fingerprints[block.year] = (block.lines, block.checksum)
+        # Mehrere Jahre auf einmal parsen (wie in aggregates.aggregate_stream())
+        pending.append(block.data)
+        pending_lines += block.lines
+        if pending_lines >= parsing.CHUNK_ROWS:
+            parts.append(_parse(b"".join(pending)))
+            pending, pending_lines = [], 0
+    if pending:
+        parts.append(_parse(b"".join(pending)))
+    if not sorted_years:
+        fingerprints = {}
+    if parts:
+        days, elements, values, flags = (np.concatenate(column) for column in zip(*parts))
+    else:
+        days = elements = values = np.array([], dtype=np.int64)
+        flags = np.array([], dtype=np.uint8)
+    ordered = bool((np.diff(days) >= 0).all()) and \
+        len(np.unique(days * len(ELEMENTS) + elements)) == len(days)
+
+    unique_days, rows = np.unique(days, return_inverse=True)
+    columns = {
+        "days": unique_days,
+        "values": np.full((len(ELEMENTS), len(unique_days)), MISSING, dtype="<i2"),
+        "flags": np.zeros((len(ELEMENTS), len(unique_days)), dtype="u1"),
+    }
+    columns["values"][elements, rows] = np.clip(values, MISSING + 1, 32767)
+    columns["flags"][elements, rows] = flags
+
+    years = unique_days.astype('M8[D]').astype('M8[Y]').astype(np.int64) + 1970
+    first_year = int(years[0]) if len(years) else 0
+    year_count = int(years[-1]) - first_year + 1 if len(years) else 0
+    columns["year_offsets"] = np.searchsorted(years, np.arange(first_year, first_year + year_count + 1))
+    fingerprint_years = sorted(fingerprints)
+    columns["fingerprint_years"] = np.array(fingerprint_years)
+    columns["fingerprint_lines"] = np.array([fingerprints[year][0] for year in fingerprint_years])
+    columns["fingerprint_checksums"] = np.array([fingerprints[year][1] for year in fingerprint_years])
+
+    layout, size = _layout(len(ELEMENTS), len(unique_days), year_count, len(fingerprint_years))
+    data = bytearray(size)
+    SERIES_HEADER.pack_into(data, 0, SERIES_MAGIC, SERIES_VERSION, len(ELEMENTS), len(unique_days), first_year,
+                            year_count, len(fingerprint_years), ordered)
+    for name, dtype, shape, offset in layout:
+        column = np.ascontiguousarray(columns[name], dtype=dtype)
+        data[offset:offset + column.nbytes] = column.tobytes()
+    return bytes(data)
+
+
+class StationSeries:
+    """
+    Tageszeitreihe einer Station auf einem Puffer im obigen Format (in der Regel ein
+    read-only mmap, siehe open()). Alle Spalten sind NumPy-Sichten auf den Puffer.
+    """
+
+    def __init__(self, buffer):
+        magic, version, elements, rows, first_year, years, fingerprints, ordered = \
+            SERIES_HEADER.unpack_from(buffer, 0)
+        if magic != SERIES_MAGIC or version != SERIES_VERSION or elements != len(ELEMENTS):
+            raise ValueError("Unbekanntes Format der Zeitreihendatei")
+        layout, size = _layout(elements, rows, years, fingerprints)
+        if len(buffer) < size:
+            raise ValueError("Zeitreihendatei ist unvollständig")
+        for name, dtype, shape, offset in layout:
+            column = np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape)), offset=offset)
+            setattr(self, name, column.reshape(shape))
+        self.first_year = first_year
+        self.ordered = bool(ordered)
+        self._buffer = buffer
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @property
+    def last_year(self):
+        return self.first_year + len(self.year_offsets) - 2
+
+    def rows(self, start_year, end_year):
+        """
+        Zeilen der Jahre start_year..end_year als slice (leer außerhalb der Daten).
+        """
+        lo = min(max(start_year - self.first_year, 0), len(self.year_offsets) - 1)
+        hi = min(max(end_year - self.first_year + 1, lo), len(self.year_offsets) - 1)
+        return slice(int(self.year_offsets[lo]), int(self.year_offsets[hi]))
+
+    def window(self, start_year, end_year):
+        """
+        (days, values, flags) der Jahre start_year..end_year als Sichten ohne Kopie.
+        """
+        rows = self.rows(start_year, end_year)
+        return self.days[rows], self.values[:, rows], self.flags[:, rows]
+
+    def daily(self, start_year, end_year):
+        """
+        Tageswerte der Jahre start_year..end_year im Format der API (siehe views.get_station_series):
+        Datumsangaben, Werte in °C je Messgröße (None für fehlende) und die Q-FLAGs der markierten Werte.
+        """
+        days, values, flags = self.window(start_year, end_year)
+        result = {"dates": np.datetime_as_string(days.astype("M8[D]")).tolist()}
+        quality = {}
+        for e, element in enumerate(ELEMENTS):
+            column = np.round(values[e] / 10.0, 1).astype(object)
+            column[values[e] == MISSING] = None
+            result[element] = column.tolist()
+            flagged = np.flatnonzero(flags[e] & 0x0F)
+            quality[element] = {
+                result["dates"][i]: Q_FLAGS[code] if code < len(Q_FLAGS) else "?"
+                for i, code in zip(flagged.tolist(), (flags[e][flagged] & 0x0F).tolist())
+            }
+        result["quality_flags"] = quality
+        return result
+
+    def sampled(self, start_year, end_year, points, method="minmax"):
+        """
+        Ausgedünnte Tageswerte der Jahre start_year..end_year für Diagramme: je Messgröße
+        höchstens points tatsächlich gemessene Werte (siehe downsample.py) als parallele
+        Zahlenlisten {"days": Tage seit 1970-01-01, "values": °C}; fehlende Tage entfallen.
+        """
+        days, values, _ = self.window(start_year, end_year)
+        result = {"method": method, "points": points}
+        for e, element in enumerate(ELEMENTS):
+            present = np.flatnonzero(values[e] != MISSING)
+            x, y = days[present], values[e][present]
+            keep = downsample.select(method, x, y, points)
+            result[element] = {"days": x[keep].tolist(), "values": np.round(y[keep] / 10.0, 1).tolist()}
+        return result
+
+    @property
+    def fingerprints(self):
+        """
+        Fingerabdrücke je Jahr der Quelldatei wie StationAggregates.fingerprints (None, wenn unbekannt).
+        """
+        if not len(self.fingerprint_years):
+            return None
+        return {
+            year: (lines, checksum) for year, lines, checksum in zip(
+                self.fingerprint_years.tolist(), self.fingerprint_lines.tolist(),
+                self.fingerprint_checksums.tolist())
+        }
+
+    def present_rows(self):
+        """
+        Alle vorhandenen Werte als aggregates.Rows (je Messgröße nach Datum sortiert).
+        """
+        from .aggregates import Rows
+        dates = self.days.astype('M8[D]')
+        years = dates.astype('M8[Y]').astype(np.int64) + 1970
+        months = dates.astype('M8[M]').astype(np.int64) % 12 + 1
+        present = [np.flatnonzero(self.values[e] != MISSING) for e in range(len(ELEMENTS))]
+        return Rows(
+            np.concatenate([years[rows] for rows in present]),
+            np.concatenate([months[rows] for rows in present]),
+            np.concatenate([np.full(len(rows), e, dtype=np.int64) for e, rows in enumerate(present)]),
+            np.concatenate([self.values[e][rows].astype(np.float64) for e, rows in enumerate(present)]),
+        )
+
+    def monthly_totals(self):
+        """
+        Summen und Anzahlen je Jahr, Monat und Messgröße (Form (Jahre, 12, len(ELEMENTS)))
+        wie in StationAggregates.
+        """
+        months = self.days.astype('M8[D]').astype('M8[M]').astype(np.int64)
+        cells = (months - (self.first_year - 1970) * 12)[np.newaxis, :] * len(ELEMENTS) + \
+            np.arange(len(ELEMENTS))[:, np.newaxis]
+        present = self.values != MISSING
+        size = (len(self.year_offsets) - 1) * 12 * len(ELEMENTS)
+        sums = np.bincount(cells[present], weights=self.values[present], minlength=size)
+        counts = np.bincount(cells[present], minlength=size)
+        shape = (len(self.year_offsets) - 1, 12, len(ELEMENTS))
+        return sums.reshape(shape), counts.reshape(shape).astype(np.int64)
+
+
+def series_directory():
+    return Path(settings.GHCN_CACHE_DIR) / "series"
+
+
+def _paths(station_id):
+    # station_path() prüft die Station-ID, bevor sie als Dateiname benutzt wird
+    station_cache.station_path(station_id)
+    directory = series_directory()
+    return directory / f"{station_id}.bin", directory / f"{station_id}.json"
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _open(data_path):
+    try:
+        return StationSeries.open(data_path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def load_fresh(station_id):
+    """
+    Die gespeicherte Zeitreihe, wenn sie innerhalb von GHCN_STATION_CACHE_TTL geprüft wurde, sonst None.
+    """
+    data_path, meta_path = _paths(station_id)
+    meta = _read_meta(meta_path)
+    if not meta or time.time() - meta.get("checked_at", 0.0) >= settings.GHCN_STATION_CACHE_TTL:
+        return None
+    return _open(data_path)
+
+
+def load_matching(station_id, cached):
+    """
+    Die gespeicherte Zeitreihe, falls sie aus derselben Version der lokalen Stationsdatei
+    cached (station_cache.CachedFile) stammt, sonst None.
+    """
+    data_path, meta_path = _paths(station_id)
+    if _read_meta(meta_path).get("source_version") != station_cache.source_version(cached.path):
+        return None
+    return _open(data_path)
+
+
+def update(station_id, cached):
+    """
+    Bringt die Zeitreihe auf den Stand der lokalen Stationsdatei cached und liefert sie.
+    """
+    data_path, meta_path = _paths(station_id)
+    version = station_cache.source_version(cached.path)
+    series = load_matching(station_id, cached)
+    if series is None:
+        with open_station_file(cached.path) as f:
+            data = convert(f)
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(data_path, data)
+        series = StationSeries.open(data_path)
+    atomic_write(meta_path, json.dumps({"source_version": version, "checked_at": time.time()}).encode("utf-8"))
+    return series
+
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -30,6 +31,12 @@ ALLOWED_HOSTS = ['localhost', '127.0.0.1']
 
 # Application definition
 
+# Schlankes Profil für den Betrieb (GHCN_API_ONLY=1): die API und die Startseite
+# brauchen weder Admin noch Benutzer, Sessions oder Messages; ohne diese Apps und
+# ihre Middleware startet jeder Worker schneller und jeder Request durchläuft
+# weniger Middleware
+GHCN_API_ONLY = os.environ.get('GHCN_API_ONLY', '0') == '1'
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -37,10 +44,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'weather_stations',
+] if not GHCN_API_ONLY else [
+    'django.contrib.staticfiles',
+    'weather_stations',
 ]
 
 
 MIDDLEWARE = [
+    'weather_stations.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,6 +60,11 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+] if not GHCN_API_ONLY else [
+    'weather_stations.metrics.MetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'weather_stations.urls'
@@ -61,9 +78,10 @@ TEMPLATES = [
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
+            ] + ([] if GHCN_API_ONLY else [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-            ],
+            ]),
         },
     },
 ]
@@ -111,3 +129,94 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# GHCN-Daily (NOAA) Datenquelle und lokale Caches
+
+# Basis-URL des öffentlichen S3-Buckets mit den GHCN-Daily-Dateien
+GHCN_BASE_URL = os.environ.get('GHCN_BASE_URL', 'https://noaa-ghcn-pds.s3.amazonaws.com')
+
+# Verzeichnis für lokal zwischengespeicherte (und geparste) GHCN-Daten
+GHCN_CACHE_DIR = Path(os.environ.get('GHCN_CACHE_DIR', BASE_DIR / 'cache'))
+
+# Nach wie vielen Sekunden der Stationskatalog (ghcnd-stations.txt und
+# ghcnd-inventory.txt) im Hintergrund neu validiert wird
+GHCN_CATALOG_TTL = int(os.environ.get('GHCN_CATALOG_TTL', 24 * 60 * 60))
+
+# Lokaler Cache der Stationsdateien (by_station/*.csv.gz): Gesamtgröße in Bytes
+# und Zeit in Sekunden, in der eine Kopie ohne Rückfrage beim Upstream gilt
+GHCN_STATION_CACHE_MAX_BYTES = int(os.environ.get('GHCN_STATION_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+GHCN_STATION_CACHE_TTL = int(os.environ.get('GHCN_STATION_CACHE_TTL', 6 * 60 * 60))
+
+# Parser für die Stationsdateien: "pandas" (Standard), "pyarrow" (benötigt das
+# Paket pyarrow) oder "numpy" (siehe weather_stations/parsing.py). "pyarrow" liest
+# die entpackte Datei vollständig in den Speicher (fileobj.read()), der Speicherbedarf
+# wächst also mit der Dateigröße statt mit der Blockgröße wie bei den anderen Parsern
+GHCN_CSV_PARSER = os.environ.get('GHCN_CSV_PARSER', 'pandas')
+
+# Größe des gemeinsamen Verbindungs-Pools zum Upstream (Keep-Alive, je Prozess)
+GHCN_UPSTREAM_POOL_SIZE = int(os.environ.get('GHCN_UPSTREAM_POOL_SIZE', 32))
+
+# Schutz vor einem langsamen oder gestörten Upstream (siehe weather_stations/upstream.py):
+# Timeouts in Sekunden für Verbindungsaufbau und Lesen, gleichzeitige Abrufe je Prozess,
+# Plätze und maximale Wartezeit in der Warteschlange dahinter, Wiederholungen bei
+# vorübergehenden Fehlern mit der Basis der zufälligen Pause in Sekunden, sowie der
+# Retry-After-Wert (Sekunden) der 503-Antworten, wenn kein Platz frei ist
+GHCN_UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('GHCN_UPSTREAM_CONNECT_TIMEOUT', 5))
+GHCN_UPSTREAM_READ_TIMEOUT = float(os.environ.get('GHCN_UPSTREAM_READ_TIMEOUT', 30))
+GHCN_UPSTREAM_MAX_CONCURRENT = int(os.environ.get('GHCN_UPSTREAM_MAX_CONCURRENT', 8))
+GHCN_UPSTREAM_QUEUE_DEPTH = int(os.environ.get('GHCN_UPSTREAM_QUEUE_DEPTH', 16))
+GHCN_UPSTREAM_QUEUE_TIMEOUT = float(os.environ.get('GHCN_UPSTREAM_QUEUE_TIMEOUT', 10))
+GHCN_UPSTREAM_RETRIES = int(os.environ.get('GHCN_UPSTREAM_RETRIES', 2))
+GHCN_UPSTREAM_RETRY_BACKOFF = float(os.environ.get('GHCN_UPSTREAM_RETRY_BACKOFF', 0.2))
+GHCN_UPSTREAM_RETRY_AFTER = int(os.environ.get('GHCN_UPSTREAM_RETRY_AFTER', 5))
+
+# Asynchrone API-Views (für den Betrieb unter ASGI, z.B. uvicorn) und die Anzahl
+# Threads, auf die blockierende Arbeit (Downloads, pandas/NumPy) ausgelagert wird
+GHCN_ASYNC_VIEWS = os.environ.get('GHCN_ASYNC_VIEWS', '0') == '1'
+GHCN_ASYNC_WORKERS = int(os.environ.get('GHCN_ASYNC_WORKERS', 16))
+
+# Sekunden, nach denen gunicorn einen Worker ohne Lebenszeichen beendet (timeout in
+# gunicorn.conf.py, das dieselbe Variable liest); bei sync-Workern also die längste
+# mögliche Anfragedauer
+GHCN_WORKER_TIMEOUT = int(os.environ.get('GHCN_WORKER_TIMEOUT', 90))
+
+# Anzahl der gunicorn-Worker (workers in gunicorn.conf.py, das dieselbe Variable liest)
+GHCN_WORKERS = int(os.environ.get('GHCN_WORKERS', 3))
+
+# Batch-Endpunkt (siehe weather_stations/batch.py): höchstens so viele Stationen je
+# Anfrage, parallele Downloads, Prozesse für das Parsen und die Zeit in Sekunden, nach der unfertige Stationen als Fehler gemeldet werden.
+# Standard: zwei Drittel des Worker-Timeouts, damit die Teilergebnisse noch vor dem
+# Abbruch des Workers ausgeliefert werden. Jeder gunicorn-Worker hat einen eigenen
+# Prozess-Pool; GHCN_BATCH_PROCESSES=0 teilt die CPU-Kerne daher auf die Worker auf
+# (Anzahl CPU-Kerne // GHCN_WORKERS, mindestens 1)
+GHCN_BATCH_MAX_STATIONS = int(os.environ.get('GHCN_BATCH_MAX_STATIONS', 200))
+GHCN_BATCH_DOWNLOAD_THREADS = int(os.environ.get('GHCN_BATCH_DOWNLOAD_THREADS', 8))
+GHCN_BATCH_PROCESSES = int(os.environ.get('GHCN_BATCH_PROCESSES', 0))
+GHCN_BATCH_TIMEOUT = float(os.environ.get('GHCN_BATCH_TIMEOUT', GHCN_WORKER_TIMEOUT * 2 / 3))
+
+# Cache für fertige API-Antworten (siehe weather_stations/response_cache.py):
+# "locmem" (je Worker im Speicher, Standard) oder "file" (unter GHCN_CACHE_DIR,
+# von allen Workern gemeinsam genutzt), sowie die Gültigkeit in Sekunden je Endpunkt
+GHCN_RESPONSE_CACHE = os.environ.get('GHCN_RESPONSE_CACHE', 'locmem')
+GHCN_SEARCH_CACHE_TTL = int(os.environ.get('GHCN_SEARCH_CACHE_TTL', 10 * 60))
+GHCN_STATION_DATA_CACHE_TTL = int(os.environ.get('GHCN_STATION_DATA_CACHE_TTL', 60 * 60))
+
+# Server-Timing-Header und Kennzahlen unter /metrics (Prometheus-Textformat, je
+# Prozess, siehe weather_stations/metrics.py)
+GHCN_METRICS = os.environ.get('GHCN_METRICS', '1') == '1'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    } if GHCN_RESPONSE_CACHE == 'locmem' else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(GHCN_CACHE_DIR / 'responses'),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
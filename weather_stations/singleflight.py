@@ -0,0 +1,120 @@
+"""
+Zusammenfassen gleichzeitiger identischer Abrufe ("single flight").
+
+Fragen viele Requests gleichzeitig dieselbe Station an (z.B. nach dem Teilen
+eines Links), soll die Stationsdatei trotzdem nur einmal heruntergeladen und
+ausgewertet werden:
+
+- Innerhalb eines Prozesses führt nur der erste Thread je Schlüssel die Arbeit
+  aus; alle weiteren warten und erhalten dasselbe Ergebnis (bzw. dieselbe
+  Ausnahme).
+- Zwischen Prozessen (gunicorn-Worker) sorgt eine Dateisperre (flock) unter
+  GHCN_CACHE_DIR/locks dafür, dass immer nur ein Worker arbeitet. Ein Ergebnis
+  kann nicht zwischen Prozessen übergeben werden; die wartenden Worker finden
+  es nach dem Freiwerden der Sperre im gemeinsamen Datei-Cache. Die Funktion
+  muss deshalb zu Beginn prüfen, ob das Ergebnis inzwischen vorliegt.
+
+Ohne fcntl (Windows) entfällt die prozessübergreifende Sperre.
+"""
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - nur unter Windows
+    fcntl = None
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+class _Call:
+    """
+    Ein laufender Abruf, auf dessen Ergebnis weitere Threads warten können.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def stats():
+    """
+    Zähler in diesem Prozess: executed (Arbeit ausgeführt), coalesced (auf fremdes Ergebnis gewartet).
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def lock_directory():
+    return Path(settings.GHCN_CACHE_DIR) / "locks"
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Exklusive, prozessübergreifende Sperre auf die Datei path (wird bei Bedarf angelegt).
+    Die Sperrdatei bleibt bestehen; gelöscht würde sie zwischen zwei Workern nicht mehr schützen.
+    """
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Schließen gibt die Sperre frei
+        os.close(fd)
+
+
+def run(key, func, lock_path=None):
+    """
+    Führt func() für key aus, sofern nicht bereits ein anderer Thread dieses Prozesses
+    damit beschäftigt ist; sonst wird auf dessen Ergebnis gewartet. Die Ausführung selbst
+    geschieht unter der Dateisperre lock_path (Standard: GHCN_CACHE_DIR/locks/{key}.lock).
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+    if not leader:
+        call.done.wait()
+        _count("coalesced")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        with file_lock(lock_path or lock_directory() / f"{key}.lock"):
+            call.result = func()
+        _count("executed")
+        return call.result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            del _calls[key]
+        call.done.set()
@@ -0,0 +1,244 @@
+"""
+Lokaler Festplatten-Cache für die Stationsdateien by_station/{station_id}.csv.gz.
+
+Jede Datei wird beim ersten Abruf heruntergeladen und unter
+GHCN_CACHE_DIR/by_station abgelegt, zusammen mit einer kleinen JSON-Datei
+mit den Validatoren (ETag/Last-Modified) und dem Zeitpunkt der letzten Prüfung.
+Innerhalb von GHCN_STATION_CACHE_TTL wird die lokale Kopie ohne jeden
+Upstream-Zugriff ausgeliefert, danach mit einem bedingten Request geprüft
+(304 -> lokale Kopie bleibt gültig). Die Gesamtgröße des Caches ist auf
+GHCN_STATION_CACHE_MAX_BYTES begrenzt; verdrängt werden die am längsten nicht
+benutzten Dateien (LRU über den Änderungszeitpunkt, der bei jedem Treffer
+aktualisiert wird).
+
+Bei einem Neuladen kann der Inhalt schon während des Downloads verarbeitet
+werden (fetch(..., consume=...), siehe pipeline.py).
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter, namedtuple
+from pathlib import Path
+
+from django.conf import settings
+
+from . import pipeline, singleflight, upstream
+from .storage import atomic_open, atomic_write
+
+logger = logging.getLogger(__name__)
+
+STATION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Ergebnis eines Abrufs: Pfad zur lokalen Datei und wie sie zustande kam
+# ("hit": ohne Upstream-Zugriff, "revalidated": 304, "miss": neu geladen, "stale": Upstream-Fehler, alte Kopie),
+# sowie das Ergebnis von consume(), falls die Datei beim Download verarbeitet wurde
+CachedFile = namedtuple("CachedFile", ["path", "status", "result"], defaults=[None])
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+class InvalidStationId(ValueError):
+    """
+    Die Station-ID ist syntaktisch ungültig (und darf nicht als Dateiname benutzt werden).
+    """
+
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def stats():
+    """
+    Zähler des Caches in diesem Prozess: hit, revalidated, miss, stale, evicted, bytes_downloaded.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def cache_directory():
+    return Path(settings.GHCN_CACHE_DIR) / "by_station"
+
+
+def station_path(station_id):
+    """
+    Pfad der lokalen Kopie (unabhängig davon, ob sie existiert).
+    """
+    if not STATION_ID_PATTERN.match(station_id or ""):
+        raise InvalidStationId(station_id)
+    return cache_directory() / f"{station_id}.csv.gz"
+
+
+def _meta_path(path):
+    return path.with_name(path.name[:-len(".csv.gz")] + ".json")
+
+
+def _read_meta(path):
+    try:
+        with open(_meta_path(path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path, meta):
+    atomic_write(_meta_path(path), json.dumps(meta).encode("utf-8"))
+
+
+def _touch(path):
+    """
+    Markiert die Datei als zuletzt benutzt (Grundlage der LRU-Verdrängung).
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def fetch(station_id, consume=None):
+    """
+    Stellt sicher, dass eine aktuelle Kopie von by_station/{station_id}.csv.gz lokal vorliegt,
+    und liefert sie als CachedFile. Fehler des Upstreams werden weitergereicht, außer es
+    existiert bereits eine (abgelaufene) lokale Kopie; dann wird diese ausgeliefert.
+
+    consume (optional) ist eine Funktion, die beim Neuladen die entpackten Daten als
+    Dateiobjekt erhält, während der Download noch läuft; ihr Ergebnis steht in
+    CachedFile.result. Schlägt sie fehl, wird die neue Datei verworfen.
+
+    Gleichzeitige Abrufe derselben Station (auch aus anderen Workern) werden zu einem
+    Upstream-Zugriff zusammengefasst (siehe singleflight.py).
+    """
+    path = station_path(station_id)
+    cached = _fresh_copy(path)
+    if cached is not None:
+        return cached
+    return singleflight.run(f"station-{station_id}", lambda: _fetch(station_id, path, consume))
+
+
+def _fresh_copy(path):
+    """
+    Die lokale Kopie als Treffer, wenn sie innerhalb der TTL geprüft wurde, sonst None.
+    """
+    meta = _read_meta(path) if path.exists() else {}
+    if meta and time.time() - meta.get("checked_at", 0.0) < settings.GHCN_STATION_CACHE_TTL:
+        _touch(path)
+        _count("hit")
+        return CachedFile(path, "hit")
+    return None
+
+
+def _fetch(station_id, path, consume):
+    # Ein anderer Worker kann die Datei erneuert haben, während auf die Sperre gewartet wurde
+    cached = _fresh_copy(path)
+    if cached is not None:
+        return cached
+    meta = _read_meta(path) if path.exists() else {}
+
+    url = upstream.ghcn_url(f"csv.gz/by_station/{station_id}.csv.gz")
+    response = None
+    try:
+        response = upstream.conditional_get(url, stream=True, **meta.get("validators", {}))
+        if response.status_code == 304:
+            meta["checked_at"] = time.time()
+            _write_meta(path, meta)
+            _touch(path)
+            _count("revalidated")
+            return CachedFile(path, "revalidated")
+        response.raise_for_status()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        result = None
+        with atomic_open(path) as f:
+            if consume is None:
+                shutil.copyfileobj(response.raw, f, COPY_CHUNK_SIZE)
+            else:
+                with pipeline.Pipeline(response.raw, sink=f) as reader:
+                    result = consume(reader)
+                    reader.drain()
+        now = time.time()
+        _write_meta(path, {"validators": upstream.validators(response), "checked_at": now, "downloaded_at": now})
+    except Exception:
+        if meta:
+            logger.warning("Stationsdatei %s konnte nicht geprüft werden, liefere lokale Kopie", station_id,
+                           exc_info=True)
+            _count("stale")
+            return CachedFile(path, "stale")
+        raise
+    finally:
+        # Gibt auch den Platz der Zugangskontrolle frei (siehe upstream.conditional_get())
+        if response is not None:
+            response.close()
+    _count("miss")
+    _count("bytes_downloaded", path.stat().st_size)
+    evict(keep=path)
+    return CachedFile(path, "miss", result)
+
+
+def add_file(station_id, source, validators):
+    """
+    Übernimmt eine bereits vorliegende Stationsdatei source (z.B. aus einem Abzug des
+    Buckets) als geprüfte lokale Kopie mit den Validatoren validators. Es wird nicht
+    verdrängt; nach vielen Dateien sollte evict() aufgerufen werden.
+    """
+    path = station_path(station_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(source, "rb") as src, atomic_open(path) as f:
+        shutil.copyfileobj(src, f, COPY_CHUNK_SIZE)
+    now = time.time()
+    _write_meta(path, {"validators": validators, "checked_at": now, "downloaded_at": now})
+    return path
+
+
+def source_version(path):
+    """
+    Kennung des Inhalts einer lokalen Kopie: ETag bzw. Last-Modified des Upstreams,
+    ersatzweise der Download-Zeitpunkt. Ändert sich die Kennung, hat sich die Datei geändert.
+    """
+    meta = _read_meta(path)
+    validators = meta.get("validators", {})
+    return validators.get("etag") or validators.get("last_modified") or str(meta.get("downloaded_at"))
+
+
+def evict(keep=None, max_bytes=None):
+    """
+    Löscht die am längsten nicht benutzten Dateien, bis der Cache höchstens
+    max_bytes (Standard: GHCN_STATION_CACHE_MAX_BYTES) groß ist. Die Datei keep
+    (gerade geladen) wird nie gelöscht.
+    """
+    if max_bytes is None:
+        max_bytes = settings.GHCN_STATION_CACHE_MAX_BYTES
+    entries = []
+    try:
+        with os.scandir(cache_directory()) as it:
+            for entry in it:
+                if entry.name.endswith(".csv.gz"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= max_bytes:
+            break
+        if keep is not None and path == keep:
+            continue
+        try:
+            path.unlink()
+            _meta_path(path).unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
+        _count("evicted")
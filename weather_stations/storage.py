@@ -0,0 +1,31 @@
+"""
+Hilfsfunktionen für Dateien im lokalen Cache-Verzeichnis (GHCN_CACHE_DIR).
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_open(path, mode="wb"):
+    """
+    Öffnet eine temporäre Datei neben path zum Schreiben und benennt sie erst nach
+    erfolgreichem Schreiben atomar in path um. Parallel lesende Worker sehen so nie
+    eine halb geschriebene Datei; bei einem Fehler bleibt die alte Datei erhalten.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def atomic_write(path, data):
+    """
+    Schreibt Bytes atomar nach path (siehe atomic_open()).
+    """
+    with atomic_open(path) as f:
+        f.write(data)
@@ -0,0 +1,324 @@
+import os
+import django
+from django.conf import settings
+from django.http import JsonResponse
+from django.test import override_settings
+import unittest
+import gzip
+import shutil
+import tempfile
+from io import BytesIO
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import aggregates, station_cache
+from weather_stations.aggregates import StationAggregates
+from weather_stations.parsing import iter_year_blocks, read_station_file
+from weather_stations.series import StationSeries, convert
+
+
+def synthetic_csv(station_id="FRK00000001", first_year=1995, last_year=2004, seed=0):
+    """
+    Tageswerte für TMAX, TMIN und PRCP mit Lücken, als CSV-Text im GHCN-Format.
+    """
+    rng = np.random.default_rng(seed)
+    lines = []
+    for day in pd.date_range(f"{first_year}-01-01", f"{last_year}-12-31"):
+        date = day.strftime("%Y%m%d")
+        for element, low, high in (("TMAX", -50, 380), ("TMIN", -150, 220), ("PRCP", 0, 500)):
+            if rng.random() < 0.1:
+                continue
+            lines.append(f"{station_id},{date},{element},{rng.integers(low, high)},,,E,")
+    # Ungültiges Datum wird verworfen
+    lines.append(f"{station_id},20010231,TMAX,999,,,E,")
+    return "\n".join(lines) + "\n"
+
+
+def sparse_csv(station_id="TIES", first_year=1990, last_year=2009, seed=3):
+    """
+    Wenige Tageswerte je Monat (TMAX, TMIN): kleine Anzahlen, daher viele Mittel genau auf
+    einer Rundungsgrenze (x.x5 °C oder 0).
+    """
+    rng = np.random.default_rng(seed)
+    lines = []
+    for year in range(first_year, last_year + 1):
+        for month in range(1, 13):
+            for day in sorted(rng.choice(np.arange(1, 29), rng.integers(1, 4), replace=False).tolist()):
+                for element in ("TMAX", "TMIN"):
+                    lines.append(f"{station_id},{year}{month:02d}{day:02d},{element},{rng.integers(-30, 40)},,,E,")
+    return "\n".join(lines) + "\n"
+
+
+def baseline_summary(path, start_year, end_year):
+    """
+    Die ursprüngliche Berechnung aus views.get_station_data, unverändert (nur mit einer
+    lokalen Datei statt des Downloads).
+    """
+    with gzip.open(path) as f:
+        data = pd.read_csv(
+            f,
+            header=None,
+            names=['ID', 'DATE', 'ELEMENT', 'VALUE', 'M-FLAG', 'Q-FLAG', 'S-FLAG', 'OBS-TIME'],
+            dtype={
+                'ID': str,
+                'DATE': str,
+                'ELEMENT': str,
+                'VALUE': float,
+                'M-FLAG': str,
+                'Q-FLAG': str,
+                'S-FLAG': str,
+                'OBS-TIME': str,
+            },
+            low_memory=False
+        )
+
+    data['DATE'] = pd.to_datetime(data['DATE'], format="%Y%m%d", errors='coerce')
+    data = data.dropna(subset=['DATE'])
+    data['YEAR'] = data['DATE'].dt.year
+    data['MONTH'] = data['DATE'].dt.month
+    data = data[(data['YEAR'] >= start_year - 1) & (data['YEAR'] <= end_year)]
+    data = data[data['ELEMENT'].isin(['TMAX', 'TMIN'])]
+    data['VALUE'] = data['VALUE'] / 10.0
+
+    annual = {}
+    seasonal = {}
+    for year in range(start_year, end_year + 1):
+        annual[year] = {"TMAX": {"avg": None}, "TMIN": {"avg": None}}
+        seasonal[year] = {
+            "spring": {"TMAX": None, "TMIN": None},
+            "summer": {"TMAX": None, "TMIN": None},
+            "autumn": {"TMAX": None, "TMIN": None},
+            "winter": {"TMAX": None, "TMIN": None},
+        }
+
+    for year in range(start_year, end_year + 1):
+        year_data = data[data['YEAR'] == year]
+        if not year_data.empty:
+            tmax_vals = year_data[year_data['ELEMENT'] == 'TMAX']['VALUE']
+            tmin_vals = year_data[year_data['ELEMENT'] == 'TMIN']['VALUE']
+            if not tmax_vals.empty:
+                annual[year]["TMAX"]["avg"] = format(tmax_vals.mean(), '.1f')
+            if not tmin_vals.empty:
+                annual[year]["TMIN"]["avg"] = format(tmin_vals.mean(), '.1f')
+
+    for year in range(start_year, end_year + 1):
+        for season, months in (("spring", [3, 4, 5]), ("summer", [6, 7, 8]), ("autumn", [9, 10, 11])):
+            rows = data[(data['YEAR'] == year) & (data['MONTH'].isin(months))]
+            if not rows.empty:
+                tmax_vals = rows[rows['ELEMENT'] == 'TMAX']['VALUE']
+                tmin_vals = rows[rows['ELEMENT'] == 'TMIN']['VALUE']
+                if not tmax_vals.empty:
+                    seasonal[year][season]["TMAX"] = format(tmax_vals.mean(), '.1f')
+                if not tmin_vals.empty:
+                    seasonal[year][season]["TMIN"] = format(tmin_vals.mean(), '.1f')
+        winter = pd.concat([
+            data[(data['YEAR'] == year - 1) & (data['MONTH'] == 12)],
+            data[(data['YEAR'] == year) & (data['MONTH'].isin([1, 2]))]
+        ])
+        if not winter.empty:
+            tmax_vals = winter[winter['ELEMENT'] == 'TMAX']['VALUE']
+            tmin_vals = winter[winter['ELEMENT'] == 'TMIN']['VALUE']
+            if not tmax_vals.empty:
+                seasonal[year]["winter"]["TMAX"] = format(tmax_vals.mean(), '.1f')
+            if not tmin_vals.empty:
+                seasonal[year]["winter"]["TMIN"] = format(tmin_vals.mean(), '.1f')
+
+    return {"annual": annual, "seasonal": seasonal}
+
+
+class AggregatesTestCase(unittest.TestCase):
+    """
+    Testfälle für die Monatsaggregate (aggregates.py).
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(GHCN_CACHE_DIR=self.cache_dir, GHCN_STATION_CACHE_TTL=3600)
+        self.settings_override.enable()
+        self.csv_path = os.path.join(self.cache_dir, "FRK00000001.csv.gz")
+        with gzip.open(self.csv_path, "wt") as f:
+            f.write(synthetic_csv())
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def write_station(self, name, text):
+        path = os.path.join(self.cache_dir, f"{name}.csv.gz")
+        with gzip.open(path, "wt") as f:
+            f.write(text)
+        return path
+
+    def assertSameJson(self, station, path, start_year, end_year):
+        self.assertEqual(
+            JsonResponse(station.summarize(start_year, end_year)).content,
+            JsonResponse(baseline_summary(path, start_year, end_year)).content,
+        )
+
+    def test_summary_matches_original_loops(self):
+        station = StationAggregates.from_dataframe(read_station_file(self.csv_path))
+        self.assertEqual((station.first_year, station.last_year), (1995, 2004))
+        # Auch Jahre außerhalb der Daten (1990-1994, 2005) müssen wie bisher None liefern
+        self.assertSameJson(station, self.csv_path, 1990, 2005)
+
+    def test_json_is_byte_identical_on_long_station(self):
+        # 150 Jahre: die JSON-Antwort muss Byte für Byte der ursprünglichen Berechnung entsprechen
+        path = self.write_station("LONG", synthetic_csv("LONG", 1875, 2024, seed=1))
+        station = StationAggregates.from_dataframe(read_station_file(path))
+        self.assertSameJson(station, path, 1870, 2024)
+        self.assertEqual(station.summarize(2010, 2005), {"annual": {}, "seasonal": {}})
+
+    def test_rounding_ties_match_original(self):
+        text = sparse_csv()
+        path = self.write_station("TIES", text)
+        station = aggregates.build(path)
+        self.assertSameJson(station, path, 1989, 2009)
+
+        # Ohne die gespeicherten Mittel wichen die Strings ab: der Fall wird tatsächlich geprüft
+        exact = StationAggregates(station.first_year, station.sums, station.counts)
+        self.assertNotEqual(exact.summarize(1989, 2009), station.summarize(1989, 2009))
+        self.assertTrue(any(key[1] == aggregates.PERIODS.index("winter") for key in station.ties))
+
+        # Dieselben Mittel auf allen Wegen zum Aggregat
+        self.assertEqual(StationAggregates.from_dataframe(read_station_file(path)).ties, station.ties)
+        with patch("weather_stations.parsing.CHUNK_ROWS", 97):
+            self.assertEqual(aggregates.build(path).ties, station.ties)
+        directory = aggregates.aggregate_directory()
+        directory.mkdir(parents=True)
+        station.save(directory / "TIES.npz")
+        self.assertEqual(StationAggregates.load(directory / "TIES.npz").ties, station.ties)
+        series = StationSeries(convert(BytesIO(text.encode("ascii"))))
+        self.assertTrue(series.ordered)
+        self.assertEqual(StationAggregates.from_series(series).ties, station.ties)
+
+        # Inkrementell: übernommene Jahre behalten ihre Mittel, neue werden berechnet
+        previous = aggregates.aggregate_stream(BytesIO(sparse_csv(last_year=2005).encode("ascii")))
+        incremental = aggregates.aggregate_stream(BytesIO(text.encode("ascii")), previous=previous)
+        if incremental is not None:
+            self.assertEqual(incremental.ties, station.ties)
+
+    def test_chunked_build_matches_single_frame(self):
+        # Kleine Blöcke: Jahre und Monate verteilen sich über viele Blöcke
+        with patch("weather_stations.parsing.CHUNK_ROWS", 97):
+            chunked = aggregates.build(self.csv_path)
+        whole = StationAggregates.from_dataframe(read_station_file(self.csv_path))
+        self.assertEqual(chunked.first_year, whole.first_year)
+        np.testing.assert_array_equal(chunked.sums, whole.sums)
+        np.testing.assert_array_equal(chunked.counts, whole.counts)
+
+    def test_save_and_load(self):
+        station = StationAggregates.from_dataframe(read_station_file(self.csv_path))
+        path = aggregates.aggregate_directory()
+        path.mkdir(parents=True)
+        station.save(path / "FRK00000001.npz")
+        loaded = StationAggregates.load(path / "FRK00000001.npz")
+        self.assertEqual(loaded.first_year, station.first_year)
+        np.testing.assert_array_equal(loaded.sums, station.sums)
+        np.testing.assert_array_equal(loaded.counts, station.counts)
+
+    def test_empty_station(self):
+        data = read_station_file(self.csv_path, elements=None)
+        station = StationAggregates.from_dataframe(data[data['ELEMENT'] == 'PRCP'])
+        summary = station.summarize(2000, 2000)
+        self.assertEqual(summary["annual"][2000], {"TMAX": {"avg": None}, "TMIN": {"avg": None}})
+        self.assertEqual(summary["seasonal"][2000]["winter"], {"TMAX": None, "TMIN": None})
+
+    def test_update_reuses_aggregate_of_same_file_version(self):
+        cached = station_cache.CachedFile(station_cache.station_path("FRK00000001"), "miss")
+        cached.path.parent.mkdir(parents=True)
+        shutil.copy(self.csv_path, cached.path)
+        self.assertIsNone(aggregates.load_fresh("FRK00000001"))
+
+        with patch.object(station_cache, "source_version", return_value='"v1"'):
+            first = aggregates.update("FRK00000001", cached)
+            with patch.object(aggregates, "build") as build:
+                second = aggregates.update("FRK00000001", cached)
+                build.assert_not_called()
+        np.testing.assert_array_equal(first.sums, second.sums)
+        self.assertIsNotNone(aggregates.load_fresh("FRK00000001"))
+
+        # Neue Dateiversion -> neu aggregieren
+        with patch.object(station_cache, "source_version", return_value='"v2"'):
+            with patch.object(aggregates, "build", wraps=aggregates.build) as build:
+                aggregates.update("FRK00000001", cached)
+                build.assert_called_once()
+
+        with override_settings(GHCN_STATION_CACHE_TTL=0):
+            self.assertIsNone(aggregates.load_fresh("FRK00000001"))
+
+
+    def test_year_blocks(self):
+        text = synthetic_csv().encode("ascii")
+        blocks = list(iter_year_blocks(BytesIO(text), block_size=1000))
+        # Die ungültige Zeile 20010231 am Dateiende bildet einen eigenen Block
+        self.assertEqual([block.year for block in blocks], list(range(1995, 2005)) + [2001])
+        self.assertEqual(b"".join(block.data for block in blocks), text)
+        self.assertEqual(sum(block.lines for block in blocks), text.count(b"\n"))
+        same = list(iter_year_blocks(BytesIO(text), block_size=1 << 20))
+        self.assertEqual([(b.year, b.lines, b.checksum) for b in same], [(b.year, b.lines, b.checksum) for b in blocks])
+
+    def test_incremental_update_parses_only_changed_years(self):
+        sorted_csv = synthetic_csv("FRK00000001", 1995, 2004).rsplit("FRK00000001,20010231", 1)[0]
+        previous = aggregates.aggregate_stream(BytesIO(sorted_csv.encode("ascii")))
+        self.assertEqual(sorted(previous.fingerprints), list(range(1995, 2005)))
+
+        # Neue Tage im letzten Jahr und im Folgejahr, eine Korrektur in 1996
+        lines = sorted_csv.splitlines(keepends=True)
+        corrected = next(i for i, line in enumerate(lines) if line.startswith("FRK00000001,1996") and "TMAX" in line)
+        fields = lines[corrected].split(",")
+        fields[3] = str(int(fields[3]) + 7)
+        lines[corrected] = ",".join(fields)
+        changed = "".join(lines) + "FRK00000001,20041231,TMIN,-33,,,E,\nFRK00000001,20050101,TMAX,12,,,E,\n"
+        full = aggregates.aggregate_stream(BytesIO(changed.encode("ascii")))
+
+        parsed = []
+        real = aggregates.iter_station_chunks
+
+        def recording(fileobj, *args, **kwargs):
+            data = fileobj.getvalue()
+            parsed.extend(sorted({int(line[12:16]) for line in data.decode("ascii").splitlines()}))
+            return real(BytesIO(data), *args, **kwargs)
+
+        with patch.object(aggregates, "iter_station_chunks", side_effect=recording):
+            incremental = aggregates.aggregate_stream(BytesIO(changed.encode("ascii")), previous=previous)
+        self.assertEqual(parsed, [1996, 2004, 2005])
+        self.assertEqual(incremental.first_year, full.first_year)
+        np.testing.assert_array_equal(incremental.sums, full.sums)
+        np.testing.assert_array_equal(incremental.counts, full.counts)
+        self.assertEqual(incremental.fingerprints, full.fingerprints)
+
+        # Unsortierte Datei: ein übernommenes Jahr taucht später erneut auf -> Neuberechnung nötig
+        unsorted = sorted_csv + "FRK00000001,19980315,TMAX,100,,,E,\n"
+        self.assertIsNone(aggregates.aggregate_stream(BytesIO(unsorted.encode("ascii")), previous=previous))
+        rebuilt = aggregates.aggregate_stream(BytesIO(unsorted.encode("ascii")))
+        self.assertIsNone(rebuilt.fingerprints)
+        expected = StationAggregates.from_dataframe(read_station_file_text(unsorted))
+        np.testing.assert_array_equal(rebuilt.sums, expected.sums)
+
+    def test_load_aggregate_without_fingerprints(self):
+        path = aggregates.aggregate_directory()
+        path.mkdir(parents=True)
+        station = StationAggregates.from_dataframe(read_station_file(self.csv_path))
+        station.save(path / "OLD.npz")
+        self.assertIsNone(StationAggregates.load(path / "OLD.npz").fingerprints)
+        station.fingerprints = {2000: (10, 1234)}
+        station.save(path / "NEW.npz")
+        self.assertEqual(StationAggregates.load(path / "NEW.npz").fingerprints, {2000: (10, 1234)})
+
+
+def read_station_file_text(text):
+    """
+    Wie read_station_file(), aber für CSV-Text.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".csv.gz") as f:
+        f.write(gzip.compress(text.encode("ascii")))
+        f.flush()
+        return read_station_file(f.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import os
+import django
+from django.conf import settings
+from django.test import RequestFactory, override_settings
+import unittest
+import gzip
+import json
+import shutil
+import tempfile
+import time
+from io import BytesIO
+from unittest.mock import patch, MagicMock
+import numpy as np
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import aggregates, batch, station_cache, upstream
+from weather_stations.tests.test_aggregates import synthetic_csv
+from weather_stations.views import get_station_data_batch
+
+STATIONS = {
+    "FRK00000001": synthetic_csv("FRK00000001", 1995, 2004, seed=1),
+    "FRK00000002": synthetic_csv("FRK00000002", 2000, 2009, seed=2),
+}
+
+
+def station_files(url, **kwargs):
+    """
+    side_effect für Session.get: liefert die Stationen aus STATIONS, sonst 404.
+    """
+    station_id = url.rsplit("/", 1)[-1][:-len(".csv.gz")]
+    resp = MagicMock(headers={"ETag": f'"{station_id}"'})
+    if station_id in STATIONS:
+        resp.status_code = 200
+        resp.raw = BytesIO(gzip.compress(STATIONS[station_id].encode("ascii")))
+    else:
+        resp.status_code = 404
+        resp.raise_for_status.side_effect = Exception("404 Not Found")
+    return resp
+
+
+def slow_build(*args):
+    """
+    Ersatz für aggregates.build im Worker-Prozess: überschreitet jede kurze Frist.
+    """
+    time.sleep(6)
+    return aggregates.build(*args)
+
+
+class BatchTestCase(unittest.TestCase):
+    """
+    Testfälle für die Auswertung mehrerer Stationen (batch.py, get_station_data_batch).
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(GHCN_CACHE_DIR=self.cache_dir, GHCN_BATCH_PROCESSES=1)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        batch.reset_process_pool()
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_process_count_shares_cores_between_workers(self):
+        with override_settings(GHCN_BATCH_PROCESSES=0, GHCN_WORKERS=3):
+            with patch("weather_stations.batch.os.cpu_count", return_value=8):
+                self.assertEqual(batch.process_count(), 2)
+            with patch("weather_stations.batch.os.cpu_count", return_value=2):
+                self.assertEqual(batch.process_count(), 1)
+        with override_settings(GHCN_BATCH_PROCESSES=5, GHCN_WORKERS=3):
+            self.assertEqual(batch.process_count(), 5)
+
+    @patch("weather_stations.upstream.requests.Session.get", side_effect=station_files)
+    def test_load_many_with_partial_errors(self, mock_get):
+        ids = ["FRK00000001", "MISSING0001", "../etc", "FRK00000002"]
+        result = batch.load_many(ids)
+        self.assertEqual(sorted(result.aggregates), ["FRK00000001", "FRK00000002"])
+        self.assertEqual(result.statuses["FRK00000001"], "miss")
+        self.assertEqual(result.errors["../etc"], "Ungültige Station ID.")
+        self.assertIn("Fehler beim Abrufen der Stationsdatei", result.errors["MISSING0001"])
+
+        # Im Worker-Prozess berechnet und wie bei einem Einzelabruf gespeichert
+        expected = aggregates.build(aggregates.station_cache.station_path("FRK00000002"))
+        np.testing.assert_array_equal(result.aggregates["FRK00000002"].sums, expected.sums)
+        self.assertIsNotNone(aggregates.load_fresh("FRK00000002"))
+
+        # Zweiter Aufruf: alles aus den gespeicherten Aggregaten, ohne Upstream und Prozess-Pool
+        mock_get.reset_mock()
+        with patch.object(batch, "get_process_pool") as pool:
+            again = batch.load_many(["FRK00000001", "FRK00000002"])
+            pool.assert_not_called()
+        mock_get.assert_not_called()
+        self.assertEqual(again.statuses, {"FRK00000001": "hit", "FRK00000002": "hit"})
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_timeout_reports_unfinished_stations(self, mock_get):
+        def slow_get(url, **kwargs):
+            time.sleep(0.5)
+            return station_files(url, **kwargs)
+
+        mock_get.side_effect = slow_get
+        start = time.monotonic()
+        result = batch.load_many(["FRK00000001", "FRK00000002"], timeout=0.1)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(result.aggregates, {})
+        self.assertEqual(set(result.errors), {"FRK00000001", "FRK00000002"})
+        # Die abgebrochenen Downloads laufen im Hintergrund zu Ende (noch im Cache-Verzeichnis des Tests)
+        time.sleep(0.8)
+
+    @patch("weather_stations.upstream.requests.Session.get", side_effect=station_files)
+    def test_timeout_does_not_delay_next_request(self, mock_get):
+        # Pool vorab starten (spawn), damit der Build sicher innerhalb der Frist beginnt
+        batch.get_process_pool().submit(int).result()
+        with patch.object(aggregates, "build", slow_build):
+            result = batch.load_many(["FRK00000001"], timeout=1.5)
+        self.assertEqual(result.errors, {"FRK00000001": batch.TIMEOUT_ERROR})
+
+        # Der laufende Build lässt sich nicht abbrechen; die nächste Anfrage wartet trotzdem nicht auf ihn
+        start = time.monotonic()
+        result = batch.load_many(["FRK00000002"], timeout=30)
+        self.assertEqual(list(result.aggregates), ["FRK00000002"])
+        self.assertLess(time.monotonic() - start, 4)
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_no_builds_after_deadline(self, mock_get):
+        def slow_get(url, **kwargs):
+            time.sleep(0.3)
+            return station_files(url, **kwargs)
+
+        mock_get.side_effect = slow_get
+        # Ohne Timeout gewartet: die Frist ist abgelaufen, wenn der Download fertig wird
+        wait = batch.wait
+        with patch.object(batch, "wait", side_effect=lambda futures, **kwargs: wait(futures)), \
+                patch.object(batch, "get_process_pool", side_effect=AssertionError("Build nach Ablauf der Frist")):
+            result = batch.load_many(["FRK00000001"], timeout=0.1)
+        self.assertEqual(result.errors, {"FRK00000001": batch.TIMEOUT_ERROR})
+
+    @patch("weather_stations.upstream.requests.Session.get", side_effect=station_files)
+    def test_busy_upstream_is_not_a_station_error(self, mock_get):
+        fetch = station_cache.fetch
+
+        def busy_fetch(station_id):
+            if station_id == "FRK00000002":
+                raise upstream.UpstreamBusy("Warteschlange voll", retry_after=7)
+            return fetch(station_id)
+
+        with patch.object(station_cache, "fetch", side_effect=busy_fetch):
+            result = batch.load_many(["FRK00000001", "FRK00000002"])
+            self.assertEqual(list(result.aggregates), ["FRK00000001"])
+            self.assertEqual(result.errors, {})
+            self.assertEqual(list(result.busy), ["FRK00000002"])
+
+            req = self.factory.get("/api/get_station_data_batch/", {
+                "station_ids": "FRK00000001,FRK00000002", "start_year": "2000", "end_year": "2001",
+            })
+            resp = get_station_data_batch(req)
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp["Retry-After"], "7")
+
+    @patch("weather_stations.upstream.requests.Session.get", side_effect=station_files)
+    def test_batch_view(self, mock_get):
+        req = self.factory.get("/api/get_station_data_batch/", {
+            "station_ids": "FRK00000002, MISSING0001,FRK00000002", "start_year": "2000", "end_year": "2001",
+        })
+        with patch.object(batch, "get_process_pool", return_value=batch.ThreadPoolExecutor(1)):
+            resp = get_station_data_batch(req)
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.content)
+        self.assertEqual(list(data["stations"]), ["FRK00000002"])
+        self.assertEqual(list(data["stations"]["FRK00000002"]["annual"]), ["2000", "2001"])
+        self.assertEqual(list(data["errors"]), ["MISSING0001"])
+
+        for params in ({"start_year": "2000", "end_year": "2001"},
+                       {"station_ids": "A", "start_year": "x", "end_year": "2001"},
+                       {"station_ids": ",".join(f"S{i}" for i in range(5)), "start_year": "2000", "end_year": "2001"}):
+            with override_settings(GHCN_BATCH_MAX_STATIONS=4):
+                resp = get_station_data_batch(self.factory.get("/api/get_station_data_batch/", params))
+            self.assertEqual(resp.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,264 @@
+import os
+import django
+from django.conf import settings
+import unittest
+import shutil
+import tempfile
+import threading
+import time
+from unittest.mock import patch, MagicMock
+import numpy as np
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import catalog
+from weather_stations.catalog import (
+    INVENTORY_FILE, STATIONS_FILE, CatalogCache, CatalogError, StationCatalog, _restore_coordinates, build_catalog,
+    parse_inventory, parse_stations,
+)
+
+
+def station_line(station_id, lat, lon, name):
+    return "{:<11} {:>8} {:>9}           {:<30}".format(station_id, lat, lon, name)
+
+
+STATIONS_TXT = "\n".join([
+    station_line("FRK00000001", "50.1109", "8.6821", "FRANKFURT MAIN STATION"),
+    station_line("FRK00000002", "50.1700", "8.7000", "FRANKFURT RIEDBERG"),
+    "KAPUTT",
+]) + "\n"
+
+INVENTORY_TXT = (
+    "FRK00000001 50.1109 8.6821 TMAX 2000 2020\n"
+    "FRK00000001 50.1109 8.6821 TMIN 1990 2015\n"
+    "FRK00000001 50.1109 8.6821 PRCP 1900 2020\n"
+    "FRK00000002 50.1700 8.7000 TMAX 2000 2020\n"
+)
+
+
+def fake_response(status_code, text="", headers=None):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.text = text
+    resp.headers = headers or {}
+    return resp
+
+
+def upstream_files(stations=(), inventory=()):
+    """
+    side_effect für Session.get: liefert je Datei die angegebenen Antworten der Reihe nach
+    (die Katalogteile werden parallel und damit in beliebiger Reihenfolge abgerufen).
+    """
+    responses = {STATIONS_FILE: list(stations), INVENTORY_FILE: list(inventory)}
+
+    def get(url, **kwargs):
+        return responses[url.rsplit("/", 1)[-1]].pop(0)
+
+    return get
+
+
+def requested(mock_get, start=0):
+    """
+    (Datei, Header) der Aufrufe von Session.get ab Aufruf start.
+    """
+    return [(call.args[0].rsplit("/", 1)[-1], call.kwargs["headers"]) for call in mock_get.call_args_list[start:]]
+
+
+class CatalogTestCase(unittest.TestCase):
+    """
+    Testfälle für den Stationskatalog-Cache (catalog.py).
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_parse_stations_and_inventory(self):
+        stations = parse_stations(STATIONS_TXT.splitlines())
+        self.assertEqual(stations["ids"], ["FRK00000001", "FRK00000002"])
+        self.assertEqual(stations["names"][1], "FRANKFURT RIEDBERG")
+        self.assertEqual(stations["latitudes"][0], 50.1109)
+
+        inventory = parse_inventory(INVENTORY_TXT.splitlines())
+        self.assertEqual(inventory["FRK00000001"], {"TMAX": (2000, 2020), "TMIN": (1990, 2015)})
+        self.assertEqual(inventory["FRK00000002"], {"TMAX": (2000, 2020)})
+
+    def test_columnar_catalog_roundtrip(self):
+        stations = parse_stations(STATIONS_TXT.splitlines())
+        station_catalog = StationCatalog(build_catalog(stations, parse_inventory(INVENTORY_TXT.splitlines())))
+        self.assertEqual(len(station_catalog), 2)
+        self.assertEqual(station_catalog.station(1), {
+            "id": "FRK00000002", "name": "FRANKFURT RIEDBERG", "latitude": 50.17, "longitude": 8.7,
+        })
+        self.assertEqual(station_catalog.coverage_mask(2000, 2015).tolist(), [True, False])
+        self.assertEqual(station_catalog.latitudes.dtype, np.float32)
+
+    def test_float32_coordinates_are_restored_exactly(self):
+        # Alle Koordinaten mit vier Nachkommastellen überstehen den Umweg über float32
+        rng = np.random.default_rng(3)
+        texts = ["%.4f" % value for value in rng.uniform(-180, 180, 20000)] + ["-90.0000", "90.0000", "179.9999"]
+        values = np.array([float(text) for text in texts])
+        restored = _restore_coordinates(values.astype(np.float32))
+        self.assertEqual(restored.tolist(), values.tolist())
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_catalog_is_persisted_and_reused(self, mock_get):
+        mock_get.side_effect = upstream_files(
+            [fake_response(200, STATIONS_TXT, {"ETag": '"s1"'})],
+            [fake_response(200, INVENTORY_TXT, {"Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})],
+        )
+        station_catalog = CatalogCache(self.cache_dir, ttl=3600).get()
+        self.assertEqual(len(station_catalog), 2)
+        self.assertTrue(station_catalog.covers(0, 2000, 2015))
+        self.assertFalse(station_catalog.covers(0, 2000, 2016))
+        self.assertFalse(station_catalog.covers(1, 2000, 2010))
+
+        # Ein neuer Prozess (neuer Cache) liest von der Platte, ohne Netzwerkzugriff
+        mock_get.reset_mock()
+        reloaded = CatalogCache(self.cache_dir, ttl=3600).get()
+        mock_get.assert_not_called()
+        self.assertEqual([reloaded.station(i) for i in range(2)], [station_catalog.station(i) for i in range(2)])
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_refresh_sends_validators_and_keeps_unchanged_parts(self, mock_get):
+        mock_get.side_effect = upstream_files(
+            [fake_response(200, STATIONS_TXT, {"ETag": '"s1"'})],
+            [fake_response(200, INVENTORY_TXT, {"ETag": '"i1"'})],
+        )
+        cache = CatalogCache(self.cache_dir, ttl=3600)
+        cache.get()
+
+        new_inventory = INVENTORY_TXT + "FRK00000002 50.1700 8.7000 TMIN 2000 2020\n"
+        mock_get.side_effect = upstream_files(
+            [fake_response(304), fake_response(200, STATIONS_TXT, {"ETag": '"s1"'})],
+            [fake_response(200, new_inventory, {"ETag": '"i2"'})],
+        )
+        cache.refresh()
+        self.assertCountEqual(requested(mock_get, 2)[:2], [
+            (STATIONS_FILE, {"If-None-Match": '"s1"'}),
+            (INVENTORY_FILE, {"If-None-Match": '"i1"'}),
+        ])
+        # Der unveränderte Teil wird für den Neuaufbau unbedingt nachgeladen
+        self.assertEqual(requested(mock_get, 4), [(STATIONS_FILE, {})])
+
+        # Antworten beide Dateien mit 304, wird nichts neu gebaut
+        mock_get.side_effect = upstream_files([fake_response(304)], [fake_response(304)])
+        before = cache.get()
+        cache.refresh()
+        self.assertIs(cache.get(), before)
+        station_catalog = cache.get()
+        self.assertEqual(len(station_catalog), 2)
+        self.assertTrue(station_catalog.covers(1, 2000, 2020))
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_stale_catalog_is_served_while_refreshing(self, mock_get):
+        mock_get.side_effect = upstream_files([fake_response(200, STATIONS_TXT)], [fake_response(200, INVENTORY_TXT)])
+        cache = CatalogCache(self.cache_dir, ttl=0)
+        with patch.object(cache, "refresh_in_background") as refresh:
+            first = cache.get()
+            second = cache.get()
+        self.assertIs(first, second)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(refresh.call_count, 2)
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_searches_do_not_wait_for_a_running_refresh(self, mock_get):
+        mock_get.side_effect = upstream_files([fake_response(200, STATIONS_TXT)], [fake_response(200, INVENTORY_TXT)])
+        cache = CatalogCache(self.cache_dir, ttl=3600)
+        before = cache.get()
+        before.index
+
+        new_inventory = INVENTORY_TXT + "FRK00000002 50.1700 8.7000 TMIN 2000 2020\n"
+        files = upstream_files([fake_response(200, STATIONS_TXT)], [fake_response(200, new_inventory)])
+        downloading, release = threading.Event(), threading.Event()
+
+        def slow_get(url, **kwargs):
+            downloading.set()
+            release.wait(10)
+            return files(url, **kwargs)
+
+        mock_get.side_effect = slow_get
+        cache._checked_at = 0.0
+        cache._save()
+        cache.refresh_in_background()
+        self.assertTrue(downloading.wait(5))
+
+        # Während der Download hängt, liefert get() sofort den bisherigen Katalog
+        results = []
+        search = threading.Thread(target=lambda: results.append(cache.get()))
+        search.start()
+        search.join(2)
+        self.assertFalse(search.is_alive())
+        self.assertIs(results[0], before)
+
+        release.set()
+        deadline = time.monotonic() + 10
+        while cache.get() is before and time.monotonic() < deadline:
+            time.sleep(0.01)
+        station_catalog = cache.get()
+        self.assertIsNot(station_catalog, before)
+        self.assertTrue(station_catalog.covers(1, 2000, 2020))
+        # Der Index des neuen Katalogs wurde vor dem Austausch gebaut
+        self.assertIsNotNone(station_catalog._index)
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_failed_background_refresh_retries_later(self, mock_get):
+        mock_get.side_effect = upstream_files([fake_response(200, STATIONS_TXT)], [fake_response(200, INVENTORY_TXT)])
+        cache = CatalogCache(self.cache_dir, ttl=3600)
+        before = cache.get()
+
+        mock_get.side_effect = upstream_files([fake_response(500)], [fake_response(500)])
+        cache._checked_at = 0.0
+        cache._save()
+        with patch.object(catalog.threading, "Thread") as thread:
+            cache.refresh_in_background()
+        worker = thread.call_args.kwargs["target"]
+        with self.assertLogs(catalog.logger, "ERROR"):
+            worker()
+        # Beendet, mit aufgeschobenem nächsten Versuch: kein sofortiger neuer Abgleich
+        self.assertFalse(cache._refreshing)
+        self.assertFalse(cache.is_stale())
+        with patch.object(catalog.threading, "Thread") as thread:
+            self.assertIs(cache.get(), before)
+        thread.assert_not_called()
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_preload_refreshes_synchronously(self, mock_get):
+        mock_get.side_effect = upstream_files(
+            [fake_response(200, STATIONS_TXT, {"ETag": '"s1"'})],
+            [fake_response(200, INVENTORY_TXT, {"ETag": '"i1"'})],
+        )
+        cache = CatalogCache(self.cache_dir, ttl=3600)
+        cache.get()
+        # Abgelaufener Stand auf der Platte, wie beim Start nach längerer Pause
+        cache._checked_at = 0.0
+        cache._save()
+
+        mock_get.side_effect = upstream_files([fake_response(304)], [fake_response(304)])
+        cache = CatalogCache(self.cache_dir, ttl=3600)
+        with patch.object(catalog, "get_cache", return_value=cache), \
+                patch.object(cache, "refresh_in_background") as refresh:
+            station_catalog = catalog.preload()
+        refresh.assert_not_called()
+        # Die Kopie von der Platte wird bedingt abgeglichen
+        self.assertCountEqual(requested(mock_get, 2), [
+            (STATIONS_FILE, {"If-None-Match": '"s1"'}),
+            (INVENTORY_FILE, {"If-None-Match": '"i1"'}),
+        ])
+        self.assertEqual(len(station_catalog), 2)
+        self.assertFalse(cache.is_stale())
+        self.assertIsNotNone(station_catalog._index)
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_fetch_error(self, mock_get):
+        mock_get.return_value = fake_response(500)
+        with self.assertRaises(CatalogError) as ctx:
+            CatalogCache(self.cache_dir).get()
+        self.assertEqual(str(ctx.exception), "Fehler beim Abrufen der Stationendaten.")
+
+
+if __name__ == "__main__":
+    unittest.main()
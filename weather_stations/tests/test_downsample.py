@@ -0,0 +1,58 @@
+import os
+import django
+from django.conf import settings
+import unittest
+import numpy as np
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import downsample
+
+
+class DownsampleTestCase(unittest.TestCase):
+    """
+    Testfälle für das Ausdünnen von Zeitreihen (downsample.py).
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.x = np.arange(10_000) * 2
+        self.y = rng.integers(-100, 100, len(self.x)).astype(np.int16)
+        # Ausreißer, die in jedem Fall erhalten bleiben müssen
+        self.y[1234], self.y[7777] = 400, -400
+
+    def test_minmax_keeps_extremes(self):
+        keep = downsample.minmax(self.y, 200)
+        self.assertLessEqual(len(keep), 200)
+        self.assertTrue(np.all(np.diff(keep) > 0))
+        self.assertIn(1234, keep)
+        self.assertIn(7777, keep)
+        # Jeder Abschnitt liefert sein Minimum und Maximum: globale Extreme stimmen überein
+        self.assertEqual(self.y[keep].min(), self.y.min())
+        self.assertEqual(self.y[keep].max(), self.y.max())
+
+    def test_lttb(self):
+        keep = downsample.lttb(self.x, self.y, 300)
+        self.assertEqual(len(keep), 300)
+        self.assertEqual((keep[0], keep[-1]), (0, len(self.y) - 1))
+        self.assertTrue(np.all(np.diff(keep) > 0))
+        self.assertIn(1234, keep)
+        self.assertIn(7777, keep)
+
+        # Eine Gerade wird auf beliebige Punkte reduziert, ein einzelner Knick bleibt erhalten
+        y = np.r_[np.arange(500), np.arange(500)[::-1]]
+        keep = downsample.lttb(np.arange(1000), y, 3)
+        self.assertEqual(keep.tolist(), [0, 499, 999])
+
+    def test_short_series_unchanged(self):
+        for method in downsample.METHODS:
+            keep = downsample.select(method, self.x[:50], self.y[:50], 100)
+            self.assertEqual(keep.tolist(), list(range(50)))
+            self.assertEqual(len(downsample.select(method, self.x[:0], self.y[:0], 100)), 0)
+        with self.assertRaises(ValueError):
+            downsample.select("mean", self.x, self.y, 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from weather_stations.geo import StationIndex, haversine, haversine_many
+
+
+def brute_force(lat, lon, latitudes, longitudes):
+    """
+    Referenz: haversine() für jede einzelne Station (wie die ursprüngliche Suchschleife).
+    """
+    return np.array([haversine(lat, lon, a, b) for a, b in zip(latitudes, longitudes)])
+
+
+class HaversineManyTestCase(unittest.TestCase):
+    """
+    Vergleicht haversine_many() mit der skalaren haversine()-Funktion.
+    """
+
+    def test_matches_scalar_haversine(self):
+        rng = np.random.default_rng(7)
+        lats = rng.uniform(-90, 90, 1000)
+        lons = rng.uniform(-180, 180, 1000)
+        expected = brute_force(50.1109, 8.6821, lats, lons)
+        np.testing.assert_allclose(haversine_many(50.1109, 8.6821, lats, lons), expected, rtol=1e-12, atol=1e-9)
+
+    def test_broadcast_and_preallocated_buffers(self):
+        query_lats = np.array([[50.1109], [-33.9], [0.0]])
+        query_lons = np.array([[8.6821], [151.2], [180.0]])
+        lats = np.array([50.17, 48.1351, -90.0, 0.0])
+        lons = np.array([8.70, 11.5820, 0.0, -180.0])
+        out = np.empty((3, 4))
+        work = np.empty((3, 4))
+        result = haversine_many(query_lats, query_lons, lats, lons, out=out, work=work)
+        self.assertIs(result, out)
+        for m in range(3):
+            np.testing.assert_allclose(
+                result[m], brute_force(query_lats[m, 0], query_lons[m, 0], lats, lons), rtol=1e-12, atol=1e-9)
+        self.assertAlmostEqual(result[2, 3], 0.0)
+
+    def test_preallocated_buffers_avoid_temporaries(self):
+        lats = np.linspace(-90, 90, 100_000)
+        lons = np.linspace(-180, 180, 100_000)
+        out = np.empty_like(lats)
+        work = np.empty_like(lats)
+        haversine_many(50.1109, 8.6821, lats, lons, out=out, work=work)
+        tracemalloc.start()
+        try:
+            haversine_many(50.1109, 8.6821, lats, lons, out=out, work=work)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # Kein Zwischenergebnis in Größe der Stationsarrays (800 kB)
+        self.assertLess(peak, lats.nbytes // 10)
+
+
+class StationIndexTestCase(unittest.TestCase):
+    """
+    Vergleicht den räumlichen Index mit der einfachen Haversine-Schleife.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        # Gleichverteilt auf der Kugel, plus Stationen an Polen und Datumsgrenze
+        latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, 5000)))
+        longitudes = rng.uniform(-180, 180, 5000)
+        extra = [(90.0, 0.0), (-90.0, 10.0), (0.0, 180.0), (0.0, -180.0), (50.1109, 8.6821), (50.1109, 8.6821)]
+        self.latitudes = np.round(np.concatenate([latitudes, [e[0] for e in extra]]), 4).tolist()
+        self.longitudes = np.round(np.concatenate([longitudes, [e[1] for e in extra]]), 4).tolist()
+        self.index = StationIndex(self.latitudes, self.longitudes)
+        self.queries = [
+            (50.115, 8.685), (89.9, 45.0), (-89.5, -120.0), (0.0, 179.9), (10.0, -179.95), (0.0, 0.0),
+        ] + list(zip(rng.uniform(-90, 90, 20).tolist(), rng.uniform(-180, 180, 20).tolist()))
+
+    def test_within_matches_brute_force(self):
+        for lat, lon in self.queries:
+            reference = brute_force(lat, lon, self.latitudes, self.longitudes)
+            for radius in (10, 150, 800, 5000, 25000):
+                indices, distances = self.index.within(lat, lon, radius)
+                expected = np.flatnonzero(reference <= radius)
+                np.testing.assert_array_equal(indices, expected, err_msg=f"{lat}, {lon}, {radius}")
+                np.testing.assert_allclose(distances, reference[expected], rtol=1e-12, atol=1e-9)
+                np.testing.assert_array_equal(np.round(distances, 2), np.round(reference[expected], 2))
+
+    def test_nearest_matches_brute_force(self):
+        for lat, lon in self.queries:
+            reference = brute_force(lat, lon, self.latitudes, self.longitudes)
+            order = np.lexsort((np.arange(len(reference)), reference))
+            for k in (1, 7, 60):
+                indices, distances = self.index.nearest(lat, lon, k)
+                np.testing.assert_array_equal(indices, order[:k])
+                np.testing.assert_allclose(distances, reference[order[:k]], rtol=1e-12, atol=1e-9)
+
+    def test_mask_is_applied(self):
+        mask = np.zeros(len(self.latitudes), dtype=bool)
+        mask[::3] = True
+        lat, lon = self.queries[0]
+        reference = brute_force(lat, lon, self.latitudes, self.longitudes)
+        reference[~mask] = np.inf
+        indices, _ = self.index.nearest(lat, lon, 25, mask)
+        order = np.lexsort((np.arange(len(reference)), reference))
+        np.testing.assert_array_equal(indices, order[:25])
+
+        indices, _ = self.index.within(lat, lon, 2000, mask)
+        np.testing.assert_array_equal(indices, np.flatnonzero(reference <= 2000))
+
+    def test_empty_results(self):
+        index = StationIndex([], [])
+        self.assertEqual(len(index.within(0, 0, 100)[0]), 0)
+        self.assertEqual(len(index.nearest(0, 0, 3)[0]), 0)
+        self.assertEqual(len(self.index.nearest(0, 0, 0)[0]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
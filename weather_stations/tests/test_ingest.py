@@ -0,0 +1,110 @@
+import os
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings
+import unittest
+import gzip
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+import numpy as np
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import aggregates, ingest, station_cache
+from weather_stations.tests.test_aggregates import synthetic_csv
+
+
+class IngestTestCase(unittest.TestCase):
+    """
+    Testfälle für den Offline-Import (ingest.py, manage.py ingest_ghcn).
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.source_dir = Path(tempfile.mkdtemp())
+        self.settings_override = override_settings(GHCN_CACHE_DIR=self.cache_dir)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        shutil.rmtree(self.source_dir, ignore_errors=True)
+
+    def write_source(self, station_id, seed=0, content=None):
+        path = self.source_dir / f"{station_id}.csv.gz"
+        path.write_bytes(content or gzip.compress(synthetic_csv(station_id, 2000, 2004, seed).encode("ascii")))
+        return path
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command("ingest_ghcn", str(self.source_dir), "--processes", "1", *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_ingest_and_resume(self):
+        self.write_source("FRK00000001", seed=1)
+        (self.source_dir / "README.txt").write_text("kein Stationsfile")
+        output = self.run_command()
+        self.assertIn("1/1 Dateien", output)
+        self.assertIn("Fertig: 1 berechnet, 0 übersprungen, 0 Fehler", output)
+
+        expected = aggregates.build(self.source_dir / "FRK00000001.csv.gz")
+        stored = aggregates.load_fresh("FRK00000001")
+        np.testing.assert_array_equal(stored.sums, expected.sums)
+        np.testing.assert_array_equal(stored.counts, expected.counts)
+
+        # Fortsetzen: nur die neue Datei wird berechnet
+        self.write_source("FRK00000002", seed=2)
+        output = self.run_command()
+        self.assertIn("Fertig: 1 berechnet, 1 übersprungen", output)
+        self.assertEqual(set(ingest.load_manifest()), {"FRK00000001", "FRK00000002"})
+
+        # Neuer Zeitstempel bei gleichem Inhalt: nur die Version wird angepasst
+        path = self.source_dir / "FRK00000001.csv.gz"
+        os.utime(path, (1_000_000_000, 1_000_000_000))
+        with patch.object(aggregates, "store") as store:
+            output = self.run_command()
+            store.assert_not_called()
+        self.assertIn("Fertig: 0 berechnet, 2 übersprungen", output)
+        self.assertEqual(aggregates._read_meta(aggregates._paths("FRK00000001")[1])["source_version"],
+                         "Sun, 09 Sep 2001 01:46:40 GMT")
+
+        # Geänderter Inhalt und --restart berechnen neu
+        self.write_source("FRK00000001", seed=3)
+        self.assertIn("Fertig: 1 berechnet, 1 übersprungen", self.run_command())
+        self.assertIn("Fertig: 2 berechnet, 0 übersprungen", self.run_command("--restart"))
+
+    def test_failed_file(self):
+        self.write_source("FRK00000001")
+        self.write_source("BROKEN00001", content=b"kein gzip")
+        with self.assertRaises(CommandError):
+            self.run_command()
+        self.assertIsNotNone(aggregates.load_fresh("FRK00000001"))
+        self.assertEqual(list(ingest.load_manifest()), ["FRK00000001"])
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_copied_files_revalidate_without_rebuild(self, mock_get):
+        path = self.write_source("FRK00000001")
+        os.utime(path, (1_600_000_000, 1_600_000_000))
+        self.run_command("--copy-files")
+        self.assertTrue(station_cache.station_path("FRK00000001").exists())
+
+        # Nach Ablauf der TTL: If-Modified-Since mit dem Zeitstempel der Quelldatei, 304
+        mock_get.return_value = MagicMock(status_code=304, headers={})
+        with override_settings(GHCN_STATION_CACHE_TTL=0):
+            self.assertIsNone(aggregates.load_fresh("FRK00000001"))
+            cached = station_cache.fetch("FRK00000001")
+            self.assertEqual(mock_get.call_args.kwargs["headers"],
+                             {"If-Modified-Since": "Sun, 13 Sep 2020 12:26:40 GMT"})
+            with patch.object(aggregates, "build") as build:
+                aggregates.update("FRK00000001", cached)
+                build.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import django
+from django.conf import settings
+from django.test import AsyncClient, Client, override_settings
+from django.core.cache import caches
+import unittest
+import asyncio
+import shutil
+import tempfile
+from unittest.mock import patch
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import metrics, response_cache, singleflight, station_cache
+from weather_stations.tests.test_batch import station_files
+
+
+def timing_names(header):
+    return [entry.split(";")[0] for entry in header.split(", ")]
+
+
+class MetricsTestCase(unittest.TestCase):
+    """
+    Testfälle für Server-Timing und den Endpunkt /metrics (metrics.py).
+    """
+
+    def setUp(self):
+        self.client = Client(SERVER_NAME="localhost")
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(GHCN_CACHE_DIR=self.cache_dir)
+        self.settings_override.enable()
+        caches["responses"].clear()
+        metrics.reset()
+        for module in (response_cache, singleflight, station_cache):
+            module.reset_stats()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_phase_outside_request(self):
+        # Ohne laufenden Request wird nichts gemessen
+        with metrics.phase("parse"):
+            pass
+        self.assertEqual(list(metrics.timed([1, 2], "parse")), [1, 2])
+        self.assertNotIn("phase=", metrics.render())
+
+    @patch("weather_stations.upstream.requests.Session.get", side_effect=station_files)
+    def test_server_timing_and_metrics(self, mock_get):
+        params = {"station_id": "FRK00000001", "start_year": "2000", "end_year": "2001"}
+        resp = self.client.get("/api/get_station_data/", params)
+        self.assertEqual(resp.status_code, 200)
+        names = timing_names(resp["Server-Timing"])
+        for name in ("load", "download", "inflate", "parse", "dates", "aggregate", "summarize", "serialize"):
+            self.assertIn(name, names)
+        self.assertEqual(names[-1], "total")
+
+        # Aus dem Antwort-Cache: nur noch die Gesamtdauer
+        resp = self.client.get("/api/get_station_data/", params)
+        self.assertEqual(timing_names(resp["Server-Timing"]), ["total"])
+
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = resp.content.decode("utf-8")
+        self.assertIn('ghcn_request_duration_seconds_count{endpoint="get_station_data"} 2', text)
+        self.assertIn('ghcn_phase_duration_seconds_count{endpoint="get_station_data",phase="download"} 1', text)
+        self.assertIn('ghcn_phase_duration_seconds_bucket{endpoint="get_station_data",phase="parse",le="+Inf"} 1',
+                      text)
+        self.assertIn('ghcn_requests_total{endpoint="get_station_data",status="200"} 2', text)
+        self.assertIn('ghcn_station_cache_events_total{event="miss"} 1', text)
+        self.assertIn("ghcn_station_cache_downloaded_bytes_total ", text)
+        self.assertIn('ghcn_singleflight_calls_total{result="executed"}', text)
+        self.assertIn('ghcn_response_cache_requests_total{result="hit"} 1', text)
+        self.assertIn('ghcn_response_cache_requests_total{result="miss"} 1', text)
+
+    @patch("weather_stations.upstream.requests.Session.get", side_effect=station_files)
+    def test_async_request(self, mock_get):
+        params = {"station_id": "FRK00000001", "start_year": "2000", "end_year": "2001"}
+        resp = asyncio.run(AsyncClient(SERVER_NAME="localhost").get("/api/get_station_data/", params))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("parse", timing_names(resp["Server-Timing"]))
+
+    def test_disabled(self):
+        with override_settings(GHCN_METRICS=False):
+            resp = self.client.get("/metrics")
+            self.assertEqual(resp.status_code, 404)
+            self.assertFalse(resp.has_header("Server-Timing"))
+
+
+if __name__ == "__main__":
+    unittest.main()
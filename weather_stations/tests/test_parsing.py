@@ -0,0 +1,134 @@
+import os
+import django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+import importlib.util
+import unittest
+from io import BytesIO
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations.parsing import PARSERS, get_parser, iter_station_chunks, split_dates
+from weather_stations import series
+from weather_stations.series import StationSeries, convert
+from weather_stations.tests.test_aggregates import synthetic_csv
+
+CSV = (
+    "FRK00000001,19991231,TMAX,55,,,E,\n"
+    "FRK00000001,20000101,TMAX,60,,,E,\n"
+    "FRK00000001,20000101,PRCP,12,,,E,\n"
+    "FRK00000001,20000229,TMIN,-25,,,E,0700\n"
+    "FRK00000001,20010229,TMIN,-30,,,E,\n"
+    "FRK00000001,20011301,TMIN,-30,,,E,\n"
+    "FRK00000001,20020615,TMAX,301,,I,E,\n"
+).encode("ascii")
+
+
+class ParsingTestCase(unittest.TestCase):
+    """
+    Testfälle für das blockweise Einlesen der Stationsdateien (parsing.py).
+    """
+
+    def test_split_dates(self):
+        year, month, day, valid = split_dates([20000229, 19000229, 20010231, 20011301, 20010100, 20241231])
+        self.assertEqual(year.tolist(), [2000, 1900, 2001, 2001, 2001, 2024])
+        self.assertEqual(month.tolist(), [2, 2, 2, 13, 1, 12])
+        self.assertEqual(day.tolist(), [29, 29, 31, 1, 0, 31])
+        self.assertEqual(valid.tolist(), [True, False, False, False, False, True])
+
+    def test_filters_elements_years_and_invalid_dates(self):
+        chunks = list(iter_station_chunks(BytesIO(CSV), start_year=2000, end_year=2001))
+        self.assertEqual(len(chunks), 1)
+        data = chunks[0]
+        self.assertEqual(list(data.columns), ["YEAR", "MONTH", "ELEMENT", "VALUE"])
+        self.assertEqual(data["YEAR"].tolist(), [2000, 2000])
+        self.assertEqual(data["ELEMENT"].tolist(), ["TMAX", "TMIN"])
+        self.assertEqual(data["VALUE"].tolist(), [60.0, -25.0])
+
+    def test_all_elements_in_small_chunks(self):
+        with patch("weather_stations.parsing.CHUNK_ROWS", 2):
+            chunks = list(iter_station_chunks(BytesIO(CSV), elements=None))
+        self.assertEqual(len(chunks), 3)
+        values = np.concatenate([chunk["VALUE"].to_numpy() for chunk in chunks])
+        self.assertEqual(values.tolist(), [55.0, 60.0, 12.0, -25.0, 301.0])
+
+    def test_parsers_agree(self):
+        # Kurze ID, negative Werte, ungültiges Datum und fehlender Zeilenumbruch am Ende;
+        # die kleine Blockgröße zerschneidet beim NumPy-Parser Zeilen an den Blockgrenzen
+        data = synthetic_csv("SHORT", 1998, 2001).encode("ascii") + b"SHORT,20011231,TMIN,-123,,,E,0700"
+        parsers = [name for name in PARSERS if name != "pyarrow" or importlib.util.find_spec("pyarrow")]
+        results = {}
+        for name in parsers:
+            for elements in (("TMAX", "TMIN"), None):
+                chunks = list(iter_station_chunks(BytesIO(data), elements, 1999, 2001, chunksize=500, parser=name))
+                results[name, elements] = pd.concat(chunks, ignore_index=True)
+        for (name, elements), result in results.items():
+            expected = results["pandas", elements]
+            self.assertEqual(result["ELEMENT"].tolist(), expected["ELEMENT"].tolist(), name)
+            for column in ("YEAR", "MONTH", "VALUE"):
+                np.testing.assert_array_equal(result[column].to_numpy(), expected[column].to_numpy())
+        self.assertEqual(results["pandas", None].iloc[-1].tolist(), [2001, 12, "TMIN", -123.0])
+        self.assertEqual(set(results["numpy", None]["ELEMENT"]), {"TMAX", "TMIN", "PRCP"})
+
+        # Leere Dateien (auch nur ein Zeilenumbruch) ergeben bei allen Parsern keine Zeilen
+        for name in parsers:
+            for empty in (b"", b"\n"):
+                chunks = list(iter_station_chunks(BytesIO(empty), parser=name))
+                self.assertEqual(sum(len(chunk) for chunk in chunks), 0, name)
+
+    def test_malformed_date_is_dropped(self):
+        # Ein fehlerhaftes Datum verwirft nur seine Zeile (wie split_dates() für 20010231)
+        data = CSV + b"FRK00000001,2000XX01,TMAX,70,,,E,\nFRK00000001,,TMIN,10,,,E,\n"
+        with patch("weather_stations.parsing.CHUNK_ROWS", 4):
+            chunks = list(iter_station_chunks(BytesIO(data), parser="pandas"))
+        values = np.concatenate([chunk["VALUE"].to_numpy() for chunk in chunks])
+        self.assertEqual(values.tolist(), [55.0, 60.0, -25.0, 301.0])
+        station = StationSeries(convert(BytesIO(data)))
+        self.assertEqual(np.datetime_as_string(station.days.astype("M8[D]")).tolist(),
+                         ["1999-12-31", "2000-01-01", "2000-02-29", "2002-06-15"])
+
+    def test_parsers_agree_on_malformed_rows(self):
+        # Ungültiges Datum (auch leer oder mit Bindestrichen): Zeile entfällt;
+        # leerer oder nicht numerischer Messwert: NaN
+        data = CSV + (
+            b"FRK00000001,2000XX01,TMAX,70,,,E,\n"
+            b"FRK00000001,,TMIN,10,,,E,\n"
+            b"FRK00000001,2000-01-05,TMAX,80,,,E,\n"
+            b"FRK00000001,20030101,TMAX,,,,E,\n"
+            b"FRK00000001,20030102,TMIN,1x,,,E,\n"
+            b"FRK00000001,20030103,TMIN,-,,,E,\n"
+            b"FRK00000001,20030104,TMAX,-15,,,E,\n"
+        )
+        parsers = [name for name in PARSERS if name != "pyarrow" or importlib.util.find_spec("pyarrow")]
+        for name in parsers:
+            chunks = list(iter_station_chunks(BytesIO(data), chunksize=4, parser=name))
+            result = pd.concat(chunks, ignore_index=True)
+            self.assertEqual(result["YEAR"].tolist(), [1999, 2000, 2000, 2002, 2003, 2003, 2003, 2003], name)
+            self.assertEqual(result["ELEMENT"].tolist(),
+                             ["TMAX", "TMAX", "TMIN", "TMAX", "TMAX", "TMIN", "TMIN", "TMAX"], name)
+            np.testing.assert_array_equal(result["VALUE"].to_numpy(),
+                                          [55.0, 60.0, -25.0, 301.0, np.nan, np.nan, np.nan, -15.0], name)
+
+        # Die Zeitreihe lässt fehlende Messwerte aus
+        station = StationSeries(convert(BytesIO(data)))
+        self.assertEqual(np.datetime_as_string(station.days.astype("M8[D]"))[-1], "2003-01-04")
+        self.assertEqual(station.values[:, -1].tolist(), [-15, series.MISSING])
+
+    def test_parser_setting(self):
+        with override_settings(GHCN_CSV_PARSER="numpy"):
+            self.assertIs(get_parser(), PARSERS["numpy"])
+        with override_settings(GHCN_CSV_PARSER="fortran"):
+            with self.assertRaises(ImproperlyConfigured):
+                get_parser()
+        with patch("weather_stations.parsing.importlib.util.find_spec", return_value=None):
+            with self.assertRaises(ImproperlyConfigured):
+                get_parser("pyarrow")
+
+
+if __name__ == "__main__":
+    unittest.main()
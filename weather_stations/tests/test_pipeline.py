@@ -0,0 +1,77 @@
+import gzip
+import threading
+import time
+import unittest
+from io import BytesIO
+
+from weather_stations import pipeline
+
+
+class SlowSource:
+    """
+    Liefert data in kleinen Blöcken und zählt, wie viel schon gelesen wurde.
+    """
+
+    def __init__(self, data, fail_after=None):
+        self.data = BytesIO(data)
+        self.fail_after = fail_after
+        self.position = 0
+
+    def read(self, n):
+        if self.fail_after is not None and self.position >= self.fail_after:
+            raise ConnectionError("Verbindung abgebrochen")
+        chunk = self.data.read(min(n, 1000))
+        self.position += len(chunk)
+        return chunk
+
+
+class PipelineTestCase(unittest.TestCase):
+    """
+    Testfälle für die Download-/Entpack-Pipeline (pipeline.py).
+    """
+
+    def setUp(self):
+        self.text = b"".join(b"FRK00000001,%08d,TMAX,%d,,,E,\n" % (20000101 + i, i) for i in range(20000))
+
+    def test_reads_and_tees_multi_member_gzip(self):
+        compressed = gzip.compress(self.text[:100000]) + gzip.compress(self.text[100000:])
+        sink = BytesIO()
+        with pipeline.Pipeline(SlowSource(compressed), sink=sink, chunk_size=4096, depth=2) as reader:
+            result = b""
+            while True:
+                chunk = reader.read(3000)
+                if not chunk:
+                    break
+                result += chunk
+        self.assertEqual(result, self.text)
+        self.assertEqual(sink.getvalue(), compressed)
+
+    def test_errors_reach_the_reader(self):
+        compressed = gzip.compress(self.text)
+        with self.assertRaises(EOFError):
+            with pipeline.Pipeline(BytesIO(compressed[:-20])) as reader:
+                reader.drain()
+        with self.assertRaises(ConnectionError):
+            with pipeline.Pipeline(SlowSource(compressed, fail_after=5000)) as reader:
+                reader.drain()
+        with self.assertRaises(Exception):
+            with pipeline.Pipeline(BytesIO(b"kein gzip")) as reader:
+                reader.drain()
+
+    def test_consumer_error_stops_background_threads(self):
+        source = SlowSource(gzip.compress(self.text, compresslevel=0))
+        threads = threading.active_count()
+        with self.assertRaises(RuntimeError):
+            with pipeline.Pipeline(source, chunk_size=1000, depth=1) as reader:
+                reader.read(100)
+                raise RuntimeError("Parserfehler")
+        # Gegendruck: nach dem Abbruch wurde nur ein kleiner Teil heruntergeladen
+        self.assertLess(source.position, len(self.text) // 2)
+        deadline = time.monotonic() + 5
+        while threading.active_count() > threads and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(threading.active_count(), threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
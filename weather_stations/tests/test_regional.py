@@ -0,0 +1,133 @@
+import os
+import django
+from django.conf import settings
+from django.test import RequestFactory, override_settings
+from django.core.cache import caches
+import unittest
+import json
+import shutil
+import tempfile
+from io import BytesIO
+from unittest.mock import patch, MagicMock
+import numpy as np
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import aggregates, batch, catalog
+from weather_stations.aggregates import region_weights, summarize_region
+from weather_stations.catalog import INVENTORY_FILE, STATIONS_FILE
+from weather_stations.geo import haversine
+from weather_stations.tests.test_aggregates import synthetic_csv
+from weather_stations.tests.test_batch import station_files
+from weather_stations.views import get_regional_data
+
+CATALOG = {
+    STATIONS_FILE: "\n".join("{:<11} {:>8} {:>9}           {:<30}".format(*station) for station in (
+        ("FRK00000001", "50.1109", "8.6821", "FRANKFURT MAIN STATION"),
+        ("FRK00000002", "50.1700", "8.7000", "FRANKFURT RIEDBERG"),
+        ("BER00000001", "52.5200", "13.4050", "BERLIN"),
+    )),
+    INVENTORY_FILE: "".join(
+        f"{station_id} 0 0 {element} {first} {last}\n"
+        for station_id, first, last in (("FRK00000001", 1995, 2004), ("FRK00000002", 2000, 2009),
+                                        ("BER00000001", 1990, 2020))
+        for element in ("TMAX", "TMIN")
+    ),
+}
+
+
+def region_files(url, **kwargs):
+    """
+    side_effect für Session.get: Katalog aus CATALOG, Stationsdateien wie test_batch.station_files.
+    """
+    name = url.rsplit("/", 1)[-1]
+    if name in CATALOG:
+        return MagicMock(status_code=200, text=CATALOG[name], headers={})
+    return station_files(url, **kwargs)
+
+
+def station_aggregates(station_id, first_year, last_year, seed):
+    return aggregates.aggregate_stream(BytesIO(synthetic_csv(station_id, first_year, last_year, seed).encode("ascii")))
+
+
+class RegionalTestCase(unittest.TestCase):
+    """
+    Testfälle für Gebietsmittel (aggregates.summarize_region, get_regional_data).
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(GHCN_CACHE_DIR=self.cache_dir, GHCN_BATCH_PROCESSES=1)
+        self.settings_override.enable()
+        catalog.reset()
+        caches["responses"].clear()
+
+    def tearDown(self):
+        batch.reset_process_pool()
+        catalog.reset()
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_weights(self):
+        np.testing.assert_array_equal(region_weights([0.5, 2.0, 4.0], "equal"), [1.0, 1.0, 1.0])
+        np.testing.assert_array_equal(region_weights([0.5, 2.0, 4.0], "distance"), [1.0, 0.5, 0.25])
+        with self.assertRaises(ValueError):
+            region_weights([1.0], "unbekannt")
+
+    def test_summarize_region_matches_weighted_station_means(self):
+        members = [station_aggregates("A", 1995, 2004, 1), station_aggregates("B", 2000, 2009, 2)]
+        weights = np.array([3.0, 1.0])
+        result = summarize_region(members, weights, 1998, 2002)
+        summaries = [member.summarize(1998, 2002) for member in members]
+
+        for year in range(1998, 2003):
+            for element in ("TMAX", "TMIN"):
+                values = [float(s["annual"][year][element]["avg"]) for s in summaries
+                          if s["annual"][year][element]["avg"] is not None]
+                entry = result["annual"][year][element]
+                self.assertEqual(entry["stations"], len(values))
+                # Stationsmittel ungerundet nachrechnen
+                means = [m.sums[year - m.first_year, :, aggregates.ELEMENTS.index(element)].sum()
+                         / m.counts[year - m.first_year, :, aggregates.ELEMENTS.index(element)].sum()
+                         for m in members if m.first_year <= year <= m.last_year]
+                w = weights[[i for i, m in enumerate(members) if m.first_year <= year <= m.last_year]]
+                self.assertEqual(entry["avg"], format(np.dot(w, means) / w.sum() / 10.0, ".1f"))
+            self.assertEqual(set(result["seasonal"][year]), set(aggregates.SEASONS))
+
+        # Eine einzelne Station ergibt ihre eigenen Mittelwerte
+        single = summarize_region(members[:1], [1.0], 1998, 2002)
+        self.assertEqual(single["seasonal"], summaries[0]["seasonal"])
+        self.assertIsNone(summarize_region([], [], 2000, 2000)["annual"][2000]["TMAX"]["avg"])
+
+    @patch("weather_stations.upstream.requests.Session.get", side_effect=region_files)
+    def test_regional_view(self, mock_get):
+        params = {"latitude": "50.1150", "longitude": "8.6850", "radius": "20",
+                  "start_year": "2000", "end_year": "2004", "weighting": "distance"}
+        with patch.object(batch, "get_process_pool", return_value=batch.ThreadPoolExecutor(1)):
+            resp = get_regional_data(self.factory.get("/api/get_regional_data/", params))
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.content)
+        self.assertEqual([s["id"] for s in data["stations"]], ["FRK00000001", "FRK00000002"])
+        self.assertEqual(data["errors"], {})
+        self.assertAlmostEqual(sum(s["weight"] for s in data["stations"]), 1.0, places=3)
+        # Die erste Station liegt näher als MIN_WEIGHT_DISTANCE (1 km) am Mittelpunkt
+        weights = [1.0, 1.0 / haversine(50.1150, 8.6850, 50.1700, 8.7000)]
+        self.assertAlmostEqual(data["stations"][0]["weight"], weights[0] / sum(weights), places=3)
+        self.assertEqual(list(data["annual"]), [str(year) for year in range(2000, 2005)])
+        self.assertEqual(data["annual"]["2000"]["TMAX"]["stations"], 2)
+
+        # Gleiche Anfrage kommt aus dem Antwort-Cache
+        calls = mock_get.call_count
+        resp = get_regional_data(self.factory.get("/api/get_regional_data/", params))
+        self.assertEqual(resp["X-Cache"], "HIT")
+        self.assertEqual(mock_get.call_count, calls)
+
+        for bad in ({"weighting": "median"}, {"latitude": "x"}, {"end_year": ""}):
+            resp = get_regional_data(self.factory.get("/api/get_regional_data/", dict(params, **bad)))
+            self.assertEqual(resp.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+import unittest
+import gzip
+import importlib.util
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+import numpy as np
+import pandas as pd
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import report
+from weather_stations.parsing import read_station_file
+from weather_stations.tests.test_aggregates import synthetic_csv
+
+
+class ReportTestCase(unittest.TestCase):
+    """
+    Testfälle für die Auswertung lokaler Stationsdateien (report.py, manage.py station_report).
+    """
+
+    def setUp(self):
+        self.source_dir = Path(tempfile.mkdtemp())
+        for seed, station_id in enumerate(("FRK00000001", "FRK00000002", "USW00000003")):
+            path = self.source_dir / f"{station_id}.csv.gz"
+            path.write_bytes(gzip.compress(synthetic_csv(station_id, 1999, 2003, seed).encode("ascii")))
+        (self.source_dir / "README.txt").write_text("kein Stationsfile")
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir, ignore_errors=True)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command("station_report", str(self.source_dir), "--processes", "1", *args, stdout=out,
+                     stderr=StringIO())
+        return out.getvalue()
+
+    def test_parse_arguments(self):
+        self.assertEqual(report.parse_years("2001-2003, 1999,2002"), [1999, 2001, 2002, 2003])
+        for text in ("2003-2001", "neunzehn", "2000-"):
+            with self.assertRaises(ValueError):
+                report.parse_years(text)
+        self.assertEqual(report.parse_elements(["tmax", "TMIN", "TMAX"]), ["TMAX", "TMIN"])
+        with self.assertRaises(ValueError):
+            report.parse_elements(["TEMPERATUR"])
+
+    def test_select_files(self):
+        files, missing = report.select_files(self.source_dir)
+        self.assertEqual([station_id for station_id, _ in files], ["FRK00000001", "FRK00000002", "USW00000003"])
+        files, _ = report.select_files(self.source_dir, pattern="FRK*")
+        self.assertEqual([station_id for station_id, _ in files], ["FRK00000001", "FRK00000002"])
+        files, missing = report.select_files(self.source_dir, ["USW00000003", "FRK00000009"])
+        self.assertEqual(files, [("USW00000003", self.source_dir / "USW00000003.csv.gz")])
+        self.assertEqual(missing, ["FRK00000009"])
+        with self.assertRaises(ValueError):
+            report.select_files(self.source_dir, ["../geheim"])
+
+    def test_report_matches_reference(self):
+        files, _ = report.select_files(self.source_dir)
+        years, elements = [2000, 2002, 2010], ["TMIN", "PRCP"]
+        result = report.report(files, years, elements, processes=2)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.progress.done, 3)
+        self.assertEqual(list(result.data.columns), report.COLUMNS)
+        self.assertEqual(len(result.data), 3 * len(years) * len(elements))
+        self.assertEqual(result.data["element"].tolist()[:2], elements)
+
+        for station_id, path in files:
+            # Wie Testcode.py: die ganze Datei je Jahr und Messgröße filtern
+            data = read_station_file(path, elements=None)
+            rows = result.data[result.data["station_id"] == station_id].set_index(["year", "element"])
+            for year in years:
+                for element in elements:
+                    row = rows.loc[(year, element)]
+                    values = data[(data["YEAR"] == year) & (data["ELEMENT"] == element)]["VALUE"] / 10
+                    self.assertEqual(row["count"], len(values))
+                    if values.empty:
+                        self.assertTrue(np.isnan(row["mean"]))
+                        continue
+                    self.assertAlmostEqual(row["mean"], values.mean(), places=2)
+                    self.assertEqual((row["min"], row["max"]), (values.min(), values.max()))
+
+    def test_broken_file(self):
+        (self.source_dir / "FRK00000004.csv.gz").write_bytes(b"kein gzip")
+        files, _ = report.select_files(self.source_dir)
+        result = report.report(files, [2000], processes=1)
+        self.assertEqual([station_id for station_id, _ in result.errors], ["FRK00000004"])
+        self.assertEqual(sorted(set(result.data["station_id"])), ["FRK00000001", "FRK00000002", "USW00000003"])
+
+    def test_command_csv(self):
+        output = self.run_command("--years", "2001", "--glob", "USW*.csv.gz")
+        lines = output.splitlines()
+        self.assertEqual(lines[0], ",".join(report.COLUMNS))
+        self.assertEqual([line.split(",")[:3] for line in lines[1:]],
+                         [["USW00000003", "2001", "TMAX"], ["USW00000003", "2001", "TMIN"]])
+
+        target = self.source_dir / "bericht.csv"
+        self.run_command("--years", "2000-2001", "--elements", "PRCP", "--output", str(target))
+        self.assertEqual(len(pd.read_csv(target)), 3 * 2)
+
+        with self.assertRaises(CommandError):
+            self.run_command("--years", "2001", "--stations", "FRK00000001", "FRK00000009")
+        with self.assertRaises(CommandError):
+            self.run_command("--years", "2001", "--glob", "XYZ*")
+        with self.assertRaises(CommandError):
+            self.run_command("--years", "2001", "--format", "parquet")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow nicht installiert")
+    def test_command_parquet(self):
+        target = self.source_dir / "bericht.parquet"
+        self.run_command("--years", "2000-2003", "--output", str(target))
+        data = pd.read_parquet(target)
+        self.assertEqual(list(data.columns), report.COLUMNS)
+        self.assertEqual(len(data), 3 * 4 * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.test import RequestFactory
+import unittest
+import gzip
+import json
+from unittest.mock import MagicMock, patch
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import response_cache
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    """
+    Testfälle für den Cache der API-Antworten (response_cache.py).
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        caches["responses"].clear()
+        self.data = {"annual": {str(year): {"TMAX": {"avg": "12.3"}} for year in range(1900, 2000)}}
+        self.compute = MagicMock(side_effect=lambda: JsonResponse(self.data))
+
+    def respond(self, params=(50.115, 8.685), **headers):
+        request = self.factory.get("/api/", **headers)
+        return response_cache.cached_response(request, "test", params, 60, self.compute)
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.respond()
+        second = self.respond()
+        self.compute.assert_called_once()
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(json.loads(second.content), self.data)
+        self.assertEqual(second["Content-Type"], "application/json")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertRegex(second["ETag"], r'^"[0-9a-f]{32}"$')
+        self.assertEqual(second["ETag"], first["ETag"])
+
+        # Andere Parameter -> eigener Eintrag
+        self.respond(params=(50.115, 8.7))
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_max_age_is_remaining_lifetime(self):
+        with patch("weather_stations.response_cache.time.time", return_value=1000.0):
+            self.assertEqual(self.respond()["Cache-Control"], "max-age=60")
+        with patch("weather_stations.response_cache.time.time", return_value=1045.5):
+            response = self.respond()
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response["Cache-Control"], "max-age=14")
+
+    def test_if_none_match_returns_304(self):
+        etag = self.respond()["ETag"]
+        for header in (etag, f'"x", W/{etag}', "*"):
+            response = self.respond(HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b"")
+            self.assertEqual(response["ETag"], etag)
+        self.assertEqual(self.respond(HTTP_IF_NONE_MATCH='"anders"').status_code, 200)
+
+        # Das ETag einer anderen Kodierung gilt ebenfalls; das 304 nennt das der gewählten
+        gzip_etag = self.respond(HTTP_ACCEPT_ENCODING="gzip")["ETag"]
+        response = self.respond(HTTP_IF_NONE_MATCH=gzip_etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(self.respond(HTTP_IF_NONE_MATCH=gzip_etag, HTTP_ACCEPT_ENCODING="gzip")["ETag"], gzip_etag)
+
+    def test_compressed_bodies(self):
+        plain = self.respond().content
+        response = self.respond(HTTP_ACCEPT_ENCODING="deflate, gzip;q=0.8")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(response.content), plain)
+        self.assertLess(len(response.content), len(plain))
+        # Jede Kodierung hat ihr eigenes starkes ETag
+        self.assertEqual(response["ETag"], self.respond()["ETag"][:-1] + '-gzip"')
+
+        self.assertFalse(self.respond(HTTP_ACCEPT_ENCODING="gzip;q=0").has_header("Content-Encoding"))
+        with patch.object(response_cache, "brotli", None):
+            caches["responses"].clear()
+            self.assertEqual(self.respond(HTTP_ACCEPT_ENCODING="br, gzip")["Content-Encoding"], "gzip")
+
+    def test_errors_are_not_cached(self):
+        self.compute.side_effect = lambda: JsonResponse({"error": "Fehler"}, status=400)
+        self.assertEqual(self.respond().status_code, 400)
+        self.assertEqual(self.respond().status_code, 400)
+        self.assertEqual(self.compute.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
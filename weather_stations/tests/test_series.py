@@ -0,0 +1,134 @@
+import os
+import django
+from django.conf import settings
+from django.test import RequestFactory, override_settings
+from django.core.cache import caches
+import unittest
+import json
+import shutil
+import tempfile
+from io import BytesIO
+from unittest.mock import patch
+import numpy as np
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import aggregates, series, station_cache
+from weather_stations.series import StationSeries
+from weather_stations.tests.test_aggregates import synthetic_csv
+from weather_stations.tests.test_batch import station_files
+from weather_stations.views import get_station_series
+
+SMALL_CSV = (
+    "FRK00000001,19991231,TMAX,12,,,E,\n"
+    "FRK00000001,20000101,TMAX,55,,,E,\n"
+    "FRK00000001,20000101,TMIN,-25,T,I,E,\n"
+    "FRK00000001,20000101,PRCP,30,,,E,\n"
+    "FRK00000001,20000231,TMAX,999,,,E,\n"
+    "FRK00000001,20000301,TMIN,3,,Q,E,\n"
+    "FRK00000001,20020101,TMAX,-7,,,E,\n"
+)
+
+
+class SeriesTestCase(unittest.TestCase):
+    """
+    Testfälle für die binären Tageszeitreihen (series.py, get_station_series).
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(GHCN_CACHE_DIR=self.cache_dir)
+        self.settings_override.enable()
+        caches["responses"].clear()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_convert_and_slice(self):
+        station = StationSeries(series.convert(BytesIO(SMALL_CSV.encode("ascii"))))
+        self.assertEqual((station.first_year, station.last_year), (1999, 2002))
+        self.assertEqual(np.datetime_as_string(station.days.astype("M8[D]")).tolist(),
+                         ["1999-12-31", "2000-01-01", "2000-03-01", "2002-01-01"])
+        missing = series.MISSING
+        self.assertEqual(station.values.tolist(), [[12, 55, missing, -7], [missing, -25, 3, missing]])
+        # TMIN am 1.1.2000: Q-FLAG I (Index 3) unten, M-FLAG T (Index 8) oben; unbekanntes Q-FLAG -> 15
+        self.assertEqual(station.flags[1].tolist(), [0, 3 | 8 << 4, series.UNKNOWN_FLAG, 0])
+
+        # Ein Zeitraum ist ein Slice auf den Puffer, ohne Kopie
+        days, values, _ = station.window(2000, 2001)
+        self.assertEqual(len(days), 2)
+        self.assertTrue(np.shares_memory(values, station.values))
+        self.assertEqual(len(station.window(2001, 2001)[0]), 0)
+        self.assertEqual(len(station.window(1990, 2030)[0]), 4)
+        self.assertEqual(len(station.window(2005, 2000)[0]), 0)
+
+        daily = station.daily(2000, 2000)
+        self.assertEqual(daily["dates"], ["2000-01-01", "2000-03-01"])
+        self.assertEqual(daily["TMAX"], [5.5, None])
+        self.assertEqual(daily["TMIN"], [-2.5, 0.3])
+        self.assertEqual(daily["quality_flags"], {"TMAX": {}, "TMIN": {"2000-01-01": "I", "2000-03-01": "?"}})
+
+    def test_monthly_totals_match_aggregates(self):
+        text = synthetic_csv("FRK00000001", 1995, 2004, seed=4).rsplit("FRK00000001,20010231", 1)[0].encode("ascii")
+        station = StationSeries(series.convert(BytesIO(text)))
+        expected = aggregates.aggregate_stream(BytesIO(text))
+        derived = aggregates.StationAggregates.from_series(station)
+        self.assertEqual(derived.first_year, expected.first_year)
+        np.testing.assert_array_equal(derived.sums, expected.sums)
+        np.testing.assert_array_equal(derived.counts, expected.counts)
+        self.assertEqual(derived.fingerprints, expected.fingerprints)
+
+    @patch("weather_stations.upstream.requests.Session.get", side_effect=station_files)
+    def test_series_view(self, mock_get):
+        params = {"station_id": "FRK00000001", "start_year": "2000", "end_year": "2000"}
+        resp = get_station_series(self.factory.get("/api/get_station_series/", params))
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.content)
+        self.assertEqual(data["dates"][0], "2000-01-01")
+        self.assertEqual(len(data["dates"]), len(data["TMAX"]))
+        self.assertTrue(all(date.startswith("2000-") for date in data["dates"]))
+        self.assertEqual(mock_get.call_count, 1)
+
+        # Anderer Zeitraum: aus der gespeicherten Zeitreihe, ohne Download
+        resp = get_station_series(self.factory.get("/api/get_station_series/", dict(params, end_year="2001")))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(mock_get.call_count, 1)
+
+        # Das Monatsaggregat wird aus der Zeitreihe abgeleitet, ohne die CSV-Datei zu parsen
+        cached = station_cache.fetch("FRK00000001")
+        with patch.object(aggregates, "build") as build:
+            derived = aggregates.update("FRK00000001", cached)
+            build.assert_not_called()
+        np.testing.assert_array_equal(derived.sums, aggregates.build(cached.path).sums)
+
+        # Ausgedünnt: je Messgröße höchstens points gemessene Werte als Zahlenlisten
+        full = json.loads(get_station_series(self.factory.get(
+            "/api/get_station_series/", dict(params, end_year="2004"))).content)
+        for method in ("lttb", "minmax"):
+            resp = get_station_series(self.factory.get(
+                "/api/get_station_series/", dict(params, end_year="2004", points="100", method=method)))
+            self.assertEqual(resp.status_code, 200)
+            data = json.loads(resp.content)
+            self.assertEqual((data["method"], data["points"]), (method, 100))
+            for element in series.ELEMENTS:
+                self.assertLessEqual(len(data[element]["days"]), 100)
+                self.assertEqual(len(data[element]["days"]), len(data[element]["values"]))
+                dates = np.datetime_as_string(np.array(data[element]["days"], dtype="M8[D]")).tolist()
+                self.assertTrue(set(dates) <= set(full["dates"]))
+        # minmax erhält die Extreme
+        present = [value for value in full["TMAX"] if value is not None]
+        self.assertEqual(max(data["TMAX"]["values"]), max(present))
+        self.assertEqual(min(data["TMAX"]["values"]), min(present))
+        self.assertEqual(mock_get.call_count, 1)
+
+        for bad in ({"station_id": "../etc"}, {"station_id": "MISSING0001"}, {"start_year": "x"},
+                    {"points": "2"}, {"points": "viele"}, {"points": "100", "method": "mean"}):
+            resp = get_station_series(self.factory.get("/api/get_station_series/", dict(params, **bad)))
+            self.assertEqual(resp.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import django
+from django.conf import settings
+from django.test import override_settings
+import unittest
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import singleflight
+
+
+def run_threads(count, target):
+    results = [None] * count
+
+    def worker(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    """
+    Testfälle für das Zusammenfassen gleichzeitiger Abrufe (singleflight.py).
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(GHCN_CACHE_DIR=self.cache_dir)
+        self.settings_override.enable()
+        singleflight.reset_stats()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_concurrent_calls_share_one_execution(self):
+        calls = []
+
+        def work():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"value": 42}
+
+        results = run_threads(10, lambda: singleflight.run("station-X", work))
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(singleflight.stats(), {"executed": 1, "coalesced": 9})
+        self.assertTrue((Path(self.cache_dir) / "locks" / "station-X.lock").exists())
+
+        # Danach läuft ein neuer Aufruf wieder selbst
+        self.assertEqual(singleflight.run("station-X", lambda: 1), 1)
+
+    def test_errors_reach_all_waiting_callers(self):
+        def work():
+            time.sleep(0.2)
+            raise ConnectionError("Upstream nicht erreichbar")
+
+        results = run_threads(5, lambda: singleflight.run("station-Y", work))
+        self.assertTrue(all(isinstance(result, ConnectionError) for result in results))
+
+    def test_file_lock_excludes_other_holders(self):
+        # flock-Sperren gelten je geöffneter Datei: zwei Öffnungen verhalten sich wie zwei Worker
+        path = Path(self.cache_dir) / "locks" / "catalog.lock"
+        events = []
+
+        def holder():
+            with singleflight.file_lock(path):
+                events.append("A an")
+                time.sleep(0.2)
+                events.append("A aus")
+
+        thread = threading.Thread(target=holder)
+        thread.start()
+        while not events:
+            time.sleep(0.01)
+        with singleflight.file_lock(path):
+            events.append("B an")
+        thread.join()
+        self.assertEqual(events, ["A an", "A aus", "B an"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import django
+from django.conf import settings
+from django.test import override_settings
+import unittest
+import gzip
+import shutil
+import tempfile
+import time
+from io import BytesIO
+from unittest.mock import patch, MagicMock
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import station_cache
+
+
+def fake_response(status_code, content=b"", headers=None):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.raw = BytesIO(content)
+    resp.headers = headers or {}
+    if status_code >= 400:
+        resp.raise_for_status.side_effect = Exception(f"{status_code} Error")
+    return resp
+
+
+class StationCacheTestCase(unittest.TestCase):
+    """
+    Testfälle für den Datei-Cache der Stationsdateien (station_cache.py).
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            GHCN_CACHE_DIR=self.cache_dir, GHCN_STATION_CACHE_TTL=3600, GHCN_STATION_CACHE_MAX_BYTES=10_000,
+        )
+        self.settings_override.enable()
+        station_cache.reset_stats()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_miss_then_hit(self, mock_get):
+        mock_get.return_value = fake_response(200, b"gzdata", {"ETag": '"v1"'})
+        first = station_cache.fetch("FRK00000001")
+        self.assertEqual(first.status, "miss")
+        self.assertEqual(first.path.read_bytes(), b"gzdata")
+
+        second = station_cache.fetch("FRK00000001")
+        self.assertEqual(second.status, "hit")
+        mock_get.assert_called_once()
+        self.assertEqual(station_cache.stats(), {"miss": 1, "hit": 1, "bytes_downloaded": 6})
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_expired_copy_is_revalidated(self, mock_get):
+        mock_get.return_value = fake_response(200, b"gzdata", {"ETag": '"v1"'})
+        station_cache.fetch("FRK00000001")
+
+        mock_get.return_value = fake_response(304)
+        with override_settings(GHCN_STATION_CACHE_TTL=0):
+            result = station_cache.fetch("FRK00000001")
+        self.assertEqual(result.status, "revalidated")
+        self.assertEqual(mock_get.call_args.kwargs["headers"], {"If-None-Match": '"v1"'})
+        self.assertEqual(result.path.read_bytes(), b"gzdata")
+
+        # Nach der Revalidierung gilt die Kopie wieder für die volle TTL
+        self.assertEqual(station_cache.fetch("FRK00000001").status, "hit")
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_stale_copy_on_upstream_error(self, mock_get):
+        mock_get.return_value = fake_response(200, b"gzdata")
+        station_cache.fetch("FRK00000001")
+
+        mock_get.return_value = fake_response(503)
+        with override_settings(GHCN_STATION_CACHE_TTL=0):
+            result = station_cache.fetch("FRK00000001")
+        self.assertEqual(result.status, "stale")
+
+        with self.assertRaises(Exception):
+            station_cache.fetch("FRK00000002")
+        self.assertFalse(station_cache.station_path("FRK00000002").exists())
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    @override_settings(GHCN_STATION_CACHE_MAX_BYTES=13_000)
+    def test_lru_eviction_by_total_bytes(self, mock_get):
+        mock_get.side_effect = lambda *args, **kwargs: fake_response(200, b"x" * 4000)
+        for i, station_id in enumerate(["STA1", "STA2", "STA3"]):
+            station_cache.fetch(station_id)
+            # Deterministische Zugriffszeiten: STA1 am ältesten
+            os.utime(station_cache.station_path(station_id), (time.time() - 100 + i, time.time() - 100 + i))
+        # STA1 erneut benutzen (Treffer) -> STA2 ist jetzt am längsten unbenutzt
+        self.assertEqual(station_cache.fetch("STA1").status, "hit")
+        station_cache.fetch("STA4")
+
+        remaining = sorted(path.name for path in station_cache.cache_directory().glob("*.csv.gz"))
+        self.assertEqual(remaining, ["STA1.csv.gz", "STA3.csv.gz", "STA4.csv.gz"])
+        self.assertFalse((station_cache.cache_directory() / "STA2.json").exists())
+        self.assertEqual(station_cache.stats()["evicted"], 1)
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_consume_while_downloading(self, mock_get):
+        compressed = gzip.compress(b"FRK00000001,20000101,TMAX,10,,,E,\n" * 1000)
+        mock_get.return_value = fake_response(200, compressed, {"ETag": '"v1"'})
+        result = station_cache.fetch("FRK00000001", consume=lambda f: len(f.read(100)))
+        self.assertEqual(result.status, "miss")
+        self.assertEqual(result.result, 100)
+        # Die lokale Kopie ist vollständig, auch wenn consume nicht alles gelesen hat
+        self.assertEqual(result.path.read_bytes(), compressed)
+        self.assertIsNone(station_cache.fetch("FRK00000001", consume=len).result)
+
+        def broken(f):
+            raise ValueError("Parserfehler")
+
+        mock_get.return_value = fake_response(200, compressed)
+        with self.assertRaises(ValueError):
+            station_cache.fetch("FRK00000002", consume=broken)
+        self.assertFalse(station_cache.station_path("FRK00000002").exists())
+
+    def test_invalid_station_id(self):
+        for station_id in ("", "../secret", "a/b", None):
+            with self.assertRaises(station_cache.InvalidStationId):
+                station_cache.fetch(station_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
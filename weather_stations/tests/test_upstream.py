@@ -0,0 +1,153 @@
+import os
+import django
+from django.conf import settings
+from django.test import Client, override_settings
+from django.core.cache import caches
+import unittest
+import shutil
+import tempfile
+import threading
+import requests
+from unittest.mock import Mock, patch
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
+    django.setup()
+
+from weather_stations import upstream
+
+
+class UpstreamTestCase(unittest.TestCase):
+    """
+    Testfälle für den Zugriff auf den GHCN-Bucket (upstream.py).
+    """
+
+    def setUp(self):
+        upstream.reset()
+        upstream.reset_stats()
+
+    def tearDown(self):
+        upstream.reset()
+
+    @override_settings(GHCN_BASE_URL="http://localhost:9000/")
+    def test_ghcn_url(self):
+        self.assertEqual(upstream.ghcn_url("/csv.gz/by_station/X.csv.gz"), "http://localhost:9000/csv.gz/by_station/X.csv.gz")
+
+    @override_settings(GHCN_UPSTREAM_POOL_SIZE=7)
+    def test_session_is_shared_per_process(self):
+        with patch.object(upstream, "_session", None):
+            session = upstream.get_session()
+            self.assertIs(upstream.get_session(), session)
+            self.assertEqual(session.get_adapter("https://example.org")._pool_maxsize, 7)
+            # Nach einem fork() (andere PID) bekommt der Prozess eine eigene Session
+            with patch.object(upstream.os, "getpid", return_value=-1):
+                self.assertIsNot(upstream.get_session(), session)
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_conditional_get_headers(self, mock_get):
+        upstream.conditional_get("http://x/a", etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT", stream=True)
+        mock_get.assert_called_once_with("http://x/a", headers={
+            "If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+        }, stream=True, timeout=(settings.GHCN_UPSTREAM_CONNECT_TIMEOUT, settings.GHCN_UPSTREAM_READ_TIMEOUT))
+
+    @patch("weather_stations.upstream.time.sleep")
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_retry_transient_errors(self, mock_get, mock_sleep):
+        ok = Mock(status_code=200)
+        mock_get.side_effect = [requests.ConnectionError("reset"), Mock(status_code=503), ok]
+        self.assertIs(upstream.conditional_get("http://x/a"), ok)
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(upstream.stats(), {"requests": 3, "retries": 2})
+        # Pausen mit zufälligem Anteil, höchstens RETRY_BACKOFF * 2^Versuch
+        for attempt, call in enumerate(mock_sleep.call_args_list):
+            self.assertLessEqual(call.args[0], settings.GHCN_UPSTREAM_RETRY_BACKOFF * 2 ** attempt)
+
+        # 404 ist kein vorübergehender Fehler, nach dem letzten Versuch gilt die Antwort bzw. der Fehler
+        mock_get.reset_mock()
+        mock_get.side_effect = [Mock(status_code=404)]
+        self.assertEqual(upstream.conditional_get("http://x/a").status_code, 404)
+        mock_get.side_effect = requests.ReadTimeout("zu langsam")
+        with override_settings(GHCN_UPSTREAM_RETRIES=1):
+            with self.assertRaises(requests.Timeout):
+                upstream.conditional_get("http://x/a")
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(upstream.load(), {"active": 0, "waiting": 0})
+
+    def test_admission(self):
+        admission = upstream.Admission(limit=1, queue_depth=1, timeout=5)
+        admission.acquire()
+        acquired = threading.Event()
+
+        def waiter():
+            admission.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        while admission.waiting == 0:
+            pass
+        # Warteschlange voll: sofort abgewiesen
+        with self.assertRaises(upstream.UpstreamBusy) as cm:
+            admission.acquire()
+        self.assertEqual(cm.exception.retry_after, settings.GHCN_UPSTREAM_RETRY_AFTER)
+        admission.release()
+        thread.join()
+        self.assertTrue(acquired.is_set())
+        self.assertEqual((admission.active, admission.waiting), (1, 0))
+
+        # Wartezeit abgelaufen
+        admission.timeout = 0.01
+        with self.assertRaises(upstream.UpstreamBusy):
+            admission.acquire()
+        self.assertEqual(upstream.stats(), {"rejected_queue_full": 1, "rejected_timeout": 1})
+
+    @override_settings(GHCN_UPSTREAM_MAX_CONCURRENT=1, GHCN_UPSTREAM_QUEUE_DEPTH=0)
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_stream_holds_slot_until_closed(self, mock_get):
+        mock_get.side_effect = lambda *args, **kwargs: Mock(status_code=200)
+        response = upstream.conditional_get("http://x/a", stream=True)
+        with self.assertRaises(upstream.UpstreamBusy):
+            upstream.conditional_get("http://x/b")
+        response.close()
+        response.close()
+        self.assertEqual(upstream.load(), {"active": 0, "waiting": 0})
+        upstream.conditional_get("http://x/b")
+        self.assertEqual(upstream.load()["active"], 0)
+
+
+class UpstreamBusyViewTestCase(unittest.TestCase):
+    """
+    Ist kein Platz für einen Abruf frei, antworten die Views mit 503 und Retry-After.
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            GHCN_CACHE_DIR=self.cache_dir, GHCN_UPSTREAM_MAX_CONCURRENT=0, GHCN_UPSTREAM_QUEUE_DEPTH=0)
+        self.settings_override.enable()
+        caches["responses"].clear()
+        upstream.reset()
+        upstream.reset_stats()
+        self.client = Client(SERVER_NAME="localhost")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        upstream.reset()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_station_data_busy(self, mock_get):
+        params = {"station_id": "FRK00000001", "start_year": "2000", "end_year": "2001"}
+        for url in ("/api/get_station_data/", "/api/get_station_series/"):
+            resp = self.client.get(url, params)
+            self.assertEqual(resp.status_code, 503)
+            self.assertEqual(resp["Retry-After"], str(settings.GHCN_UPSTREAM_RETRY_AFTER))
+        mock_get.assert_not_called()
+        # 503 wird nicht gecacht
+        self.assertEqual(self.client.get("/api/get_station_data/", params).status_code, 503)
+        self.assertIn('ghcn_upstream_rejections_total{reason="queue_full"} 3',
+                      self.client.get("/metrics").content.decode("utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
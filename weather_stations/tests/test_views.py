@@ -1,19 +1,27 @@
 import os
 import django
 from django.conf import settings
-from django.test import RequestFactory
+from django.test import RequestFactory, override_settings
+from django.core.cache import caches
 from django.http import HttpResponse, QueryDict
 import unittest
 import gzip
 from io import BytesIO
 from unittest.mock import patch, MagicMock
 import json
+import shutil
+import tempfile
+import time
+import asyncio
 if not settings.configured:
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather_stations.settings")
     django.setup()
     
 # Importiere die Funktionen aus views.py
 from weather_stations.views import index, haversine, search_stations, get_station_data  
+from weather_stations.views import asearch_stations, aget_station_data
+from weather_stations import catalog
+from weather_stations.tests.test_catalog import upstream_files
 
 class ViewsTestCase(unittest.TestCase):
     """
@@ -24,6 +32,17 @@ class ViewsTestCase(unittest.TestCase):
     def setUp(self):
         # RequestFactory für Django-Tests initialisieren
         self.factory = RequestFactory()
+        # Eigenes Cache-Verzeichnis pro Test, damit kein Katalog aus einem anderen Test übrig bleibt
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(GHCN_CACHE_DIR=self.cache_dir)
+        self.settings_override.enable()
+        catalog.reset()
+        caches["responses"].clear()
+
+    def tearDown(self):
+        catalog.reset()
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
 
     def test_haversine_function(self):
         # Teste die Distanzberechnung
@@ -44,7 +63,7 @@ class ViewsTestCase(unittest.TestCase):
             self.assertEqual(resp.content, b"MOCKED FRONTEND")
             fake_render.assert_called_once_with(req, "frontend.html")
 
-    @patch("weather_stations.views.requests.get")
+    @patch("weather_stations.upstream.requests.Session.get")
     def test_search_stations_success(self, mock_get):
         # search_stations-Funktion mit Dummy-Daten für Frankfurt testen.
         # Die Daten kommen aus ghcnd-stations.txt:
@@ -64,13 +83,15 @@ class ViewsTestCase(unittest.TestCase):
         fake_resp1 = MagicMock()
         fake_resp1.status_code = 200
         fake_resp1.text = stat_data
+        fake_resp1.headers = {"ETag": '"stations-v1"'}
 
         fake_resp2 = MagicMock()
         fake_resp2.status_code = 200
         fake_resp2.text = inv_data
+        fake_resp2.headers = {"ETag": '"inventory-v1"'}
 
-        # Reihenfolge: erst Stationen, dann Inventar
-        mock_get.side_effect = [fake_resp1, fake_resp2]
+        # Stationen und Inventar werden parallel abgerufen
+        mock_get.side_effect = upstream_files([fake_resp1], [fake_resp2])
 
         req = self.factory.get("/search_stations/", {
             "latitude": "50.1150",
@@ -88,6 +109,60 @@ class ViewsTestCase(unittest.TestCase):
         # Hier erwarte ich 2 Stationen
         self.assertEqual(len(data["stations"]), 2, "Es sollten 2 Stationen gefunden werden")
 
+        # Zweite Suche kommt aus dem Katalog-Cache, ohne erneuten Download
+        resp = search_stations(req)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.content), data)
+        self.assertEqual(mock_get.call_count, 2)
+
+        # Gleiche Parameter in anderer Schreibweise kommen aus dem Antwort-Cache
+        req = self.factory.get("/search_stations/", {
+            "latitude": "50.115",
+            "longitude": "8.685",
+            "radius": "20.0",
+            "station_count": "2",
+            "start_year": "2005",
+            "end_year": "2010",
+        })
+        resp = search_stations(req)
+        self.assertEqual(resp["X-Cache"], "HIT")
+        self.assertEqual(json.loads(resp.content), data)
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_search_stations_nearest_mode(self, mock_get):
+        # Im Modus "nearest" gilt kein Radius, station_count bestimmt die Anzahl
+        line1 = "{:<11} {:>8} {:>9}           {:<30}".format("FRK00000001", "50.1109", "8.6821", "FRANKFURT MAIN STATION")
+        line2 = "{:<11} {:>8} {:>9}           {:<30}".format("MUN00000001", "48.1351", "11.5820", "MUENCHEN")
+        line3 = "{:<11} {:>8} {:>9}           {:<30}".format("BER00000001", "52.5200", "13.4050", "BERLIN")
+        inv_data = "".join(
+            f"{station_id} 0 0 {element} 1990 2020\n"
+            for station_id in ("FRK00000001", "MUN00000001", "BER00000001")
+            for element in ("TMAX", "TMIN")
+        )
+        fake_resp1 = MagicMock(status_code=200, text="\n".join([line1, line2, line3]), headers={})
+        fake_resp2 = MagicMock(status_code=200, text=inv_data, headers={})
+        mock_get.side_effect = upstream_files([fake_resp1], [fake_resp2])
+
+        params = {
+            "latitude": "50.1150",
+            "longitude": "8.6850",
+            "radius": "1",
+            "station_count": "2",
+            "start_year": "2000",
+            "end_year": "2010",
+        }
+        resp = search_stations(self.factory.get("/search_stations/", params))
+        self.assertEqual([s["id"] for s in json.loads(resp.content)["stations"]], ["FRK00000001"])
+
+        resp = search_stations(self.factory.get("/search_stations/", dict(params, mode="nearest")))
+        self.assertEqual(resp.status_code, 200)
+        stations = json.loads(resp.content)["stations"]
+        self.assertEqual([s["id"] for s in stations], ["FRK00000001", "MUN00000001"])
+        self.assertEqual(stations[1]["distance"], round(haversine(50.1150, 8.6850, 48.1351, 11.5820), 2))
+
+        resp = search_stations(self.factory.get("/search_stations/", dict(params, mode="unbekannt")))
+        self.assertEqual(resp.status_code, 400)
+
     def test_search_stations_missing_params(self):
         # Test, wenn keine Parameter mitgegeben werden -> 400
         req = self.factory.get("/search_stations/")
@@ -95,7 +170,7 @@ class ViewsTestCase(unittest.TestCase):
         self.assertEqual(resp.status_code, 400)
         self.assertIn(b"Ung\xc3\xbcltige Parameter", resp.content)
 
-    @patch("weather_stations.views.requests.get")
+    @patch("weather_stations.upstream.requests.Session.get")
     def test_search_stations_no_station_count(self, mock_get):
         # Test, wenn station_count fehlt -> leere Liste
         fake_resp = MagicMock()
@@ -116,7 +191,7 @@ class ViewsTestCase(unittest.TestCase):
         data = json.loads(resp.content)
         self.assertEqual(len(data["stations"]), 0)
 
-    @patch("weather_stations.views.requests.get")
+    @patch("weather_stations.upstream.requests.Session.get")
     def test_get_station_data_success(self, mock_get):
         # Teste get_station_data mit Dummy CSV.gz-Daten für Frankfurt Main Station.
         # CSV: TMAX=55 (entspricht 5.5°C), TMIN=25 (entspricht 2.5°C)
@@ -130,6 +205,7 @@ class ViewsTestCase(unittest.TestCase):
         fake_resp.status_code = 200
         fake_resp.raise_for_status.return_value = None
         fake_resp.raw = BytesIO(gz_data)
+        fake_resp.headers = {"ETag": '"frk-v1"'}
 
         mock_get.return_value = fake_resp
 
@@ -138,7 +214,10 @@ class ViewsTestCase(unittest.TestCase):
             "start_year": "2000",
             "end_year": "2000",
         })
-        resp = get_station_data(req)
+        # Das Aggregat entsteht schon beim Download; die gespeicherte Datei wird nicht erneut gelesen
+        with patch("weather_stations.aggregates.build") as build:
+            resp = get_station_data(req)
+            build.assert_not_called()
         self.assertEqual(resp.status_code, 200, "get_station_data sollte 200 liefern")
 
         data = json.loads(resp.content)
@@ -147,6 +226,14 @@ class ViewsTestCase(unittest.TestCase):
         # Prüfe, ob TMAX und TMIN richtig umgerechnet wurden (5.5°C und 2.5°C)
         self.assertEqual(data["annual"]["2000"]["TMAX"]["avg"], "5.5")
         self.assertEqual(data["annual"]["2000"]["TMIN"]["avg"], "2.5")
+        self.assertEqual(resp["X-Cache"], "MISS")
+
+        # Der zweite Abruf derselben Station kommt ohne Upstream-Zugriff aus dem Datei-Cache
+        resp = get_station_data(req)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.content), data)
+        self.assertEqual(resp["X-Cache"], "HIT")
+        mock_get.assert_called_once()
 
     def test_get_station_data_missing_station_id(self):
         # Test, wenn station_id fehlt -> 400
@@ -167,7 +254,17 @@ class ViewsTestCase(unittest.TestCase):
         resp = get_station_data(req)
         self.assertEqual(resp.status_code, 400)
 
-    @patch("weather_stations.views.requests.get")
+    def test_get_station_data_invalid_station_id(self):
+        # Station-IDs werden als Dateinamen benutzt und müssen daher geprüft werden -> 400
+        req = self.factory.get("/get_station_data/", {
+            "station_id": "../../etc/passwd",
+            "start_year": "2000",
+            "end_year": "2001",
+        })
+        resp = get_station_data(req)
+        self.assertEqual(resp.status_code, 400)
+
+    @patch("weather_stations.upstream.requests.Session.get")
     def test_get_station_data_fetch_error(self, mock_get):
         # Simuliere einen Fehler beim Abrufen der CSV -> 400
         fake_resp = MagicMock()
@@ -182,5 +279,77 @@ class ViewsTestCase(unittest.TestCase):
         resp = get_station_data(req)
         self.assertEqual(resp.status_code, 400)
 
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_async_search_stations(self, mock_get):
+        line = "{:<11} {:>8} {:>9}           {:<30}".format("FRK00000001", "50.1109", "8.6821", "FRANKFURT MAIN STATION")
+        inv_data = "FRK00000001 50.1109 8.6821 TMAX 2000 2020\nFRK00000001 50.1109 8.6821 TMIN 2000 2020\n"
+        mock_get.side_effect = upstream_files(
+            [MagicMock(status_code=200, text=line, headers={})],
+            [MagicMock(status_code=200, text=inv_data, headers={})],
+        )
+        req = self.factory.get("/search_stations/", {
+            "latitude": "50.1150", "longitude": "8.6850", "radius": "20",
+            "station_count": "5", "start_year": "2005", "end_year": "2010",
+        })
+        resp = asyncio.run(asearch_stations(req))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, search_stations(req).content)
+        self.assertEqual(json.loads(resp.content)["stations"][0]["id"], "FRK00000001")
+
+        req = self.factory.get("/search_stations/", {"latitude": "x"})
+        self.assertEqual(asyncio.run(asearch_stations(req)).status_code, 400)
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_async_station_data_requests_overlap(self, mock_get):
+        # Mehrere gleichzeitige Requests warten parallel auf den (langsamen) Upstream
+        def slow_get(url, **kwargs):
+            time.sleep(0.2)
+            fake_resp = MagicMock(status_code=200, headers={})
+            fake_resp.raw = BytesIO(gzip.compress(b"X,20000101,TMAX,55,,,,\nX,20000102,TMIN,25,,,,\n"))
+            return fake_resp
+
+        mock_get.side_effect = slow_get
+
+        async def fetch_all():
+            requests = [
+                aget_station_data(self.factory.get("/get_station_data/", {
+                    "station_id": f"FRK0000000{i}", "start_year": "2000", "end_year": "2000",
+                }))
+                for i in range(8)
+            ]
+            return await asyncio.gather(*requests)
+
+        start = time.perf_counter()
+        responses = asyncio.run(fetch_all())
+        elapsed = time.perf_counter() - start
+        self.assertEqual([resp.status_code for resp in responses], [200] * 8)
+        self.assertEqual(json.loads(responses[7].content)["annual"]["2000"]["TMAX"]["avg"], "5.5")
+        self.assertLess(elapsed, 8 * 0.2)
+
+        req = self.factory.get("/get_station_data/", {"station_id": "FRK00000001", "start_year": "abc"})
+        self.assertEqual(asyncio.run(aget_station_data(req)).status_code, 400)
+
+    @patch("weather_stations.upstream.requests.Session.get")
+    def test_concurrent_requests_for_one_station_share_one_download(self, mock_get):
+        def slow_get(url, **kwargs):
+            time.sleep(0.2)
+            fake_resp = MagicMock(status_code=200, headers={"ETag": '"v1"'})
+            fake_resp.raw = BytesIO(gzip.compress(b"X,20000101,TMAX,55,,,,\nX,20000102,TMIN,25,,,,\n"))
+            return fake_resp
+
+        mock_get.side_effect = slow_get
+        req = self.factory.get("/get_station_data/", {
+            "station_id": "FRK00000001", "start_year": "2000", "end_year": "2000",
+        })
+
+        async def fetch_all():
+            return await asyncio.gather(*[aget_station_data(req) for _ in range(10)])
+
+        responses = asyncio.run(fetch_all())
+        mock_get.assert_called_once()
+        self.assertEqual({resp.content for resp in responses}, {responses[0].content})
+        self.assertEqual([resp["X-Cache"] for resp in responses], ["MISS"] * 10)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,250 @@
+"""
+Zugriff auf den NOAA-GHCN-Bucket (Upstream).
+
+Alle Downloads der Views laufen über dieses Modul, damit URL-Aufbau und
+bedingte Requests (ETag/Last-Modified) an einer Stelle liegen.
+
+Die Requests teilen sich eine requests.Session je Prozess, deren Verbindungs-Pool
+(Keep-Alive) von allen Threads genutzt wird; so wird nicht für jeden Abruf eine
+neue TLS-Verbindung aufgebaut. Nach einem fork() (z.B. gunicorn mit preload)
+legt jeder Prozess seine eigene Session an.
+
+Damit ein langsamer oder gestörter Upstream nicht alle Worker blockiert, gilt für
+jeden Abruf (siehe conditional_get()):
+  - Timeouts für Verbindungsaufbau und Lesen (GHCN_UPSTREAM_CONNECT_TIMEOUT,
+    GHCN_UPSTREAM_READ_TIMEOUT; beim Lesen je Block, nicht für die ganze Datei)
+  - höchstens GHCN_UPSTREAM_MAX_CONCURRENT gleichzeitige Abrufe je Prozess; weitere
+    warten in einer Warteschlange von höchstens GHCN_UPSTREAM_QUEUE_DEPTH Plätzen bis
+    zu GHCN_UPSTREAM_QUEUE_TIMEOUT Sekunden. Ist sie voll oder die Wartezeit um,
+    schlägt der Abruf sofort mit UpstreamBusy fehl (die Views antworten mit 503 und
+    Retry-After), statt die Wartezeit aller Requests weiter zu verlängern.
+  - vorübergehende Fehler (Verbindungsfehler, Timeouts, 429 und 5xx) werden bis zu
+    GHCN_UPSTREAM_RETRIES-mal wiederholt, jeweils nach einer zufälligen Pause von
+    bis zu GHCN_UPSTREAM_RETRY_BACKOFF * 2^Versuch Sekunden ("full jitter"), damit
+    sich die Wiederholungen vieler Requests nicht gleichzeitig auf den Upstream stürzen.
+"""
+import os
+import random
+import threading
+import time
+import weakref
+from collections import Counter
+
+import requests
+from django.conf import settings
+
+# Statuscodes, bei denen sich ein erneuter Versuch lohnt
+TRANSIENT_STATUS = frozenset((429, 500, 502, 503, 504))
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+_admission = None
+_admission_pid = None
+_admission_lock = threading.Lock()
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+class UpstreamBusy(Exception):
+    """
+    Kein Platz für einen weiteren Abruf (Warteschlange voll oder Wartezeit abgelaufen);
+    retry_after ist die empfohlene Wartezeit in Sekunden bis zum nächsten Versuch.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Admission:
+    """
+    Begrenzt die gleichzeitigen Abrufe auf limit; höchstens queue_depth Threads warten
+    bis zu timeout Sekunden auf einen freien Platz, alle weiteren werden abgewiesen.
+    """
+
+    def __init__(self, limit, queue_depth, timeout):
+        self.limit = limit
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.queue_depth:
+                    _count("rejected_queue_full")
+                    raise UpstreamBusy("Zu viele gleichzeitige Abrufe beim Datendienst.",
+                                       settings.GHCN_UPSTREAM_RETRY_AFTER)
+                self.waiting += 1
+                deadline = time.monotonic() + self.timeout
+                try:
+                    while self.active >= self.limit:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            _count("rejected_timeout")
+                            raise UpstreamBusy("Zeitüberschreitung beim Warten auf den Datendienst.",
+                                               settings.GHCN_UPSTREAM_RETRY_AFTER)
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+
+def _count(event, amount=1):
+    with _stats_lock:
+        _stats[event] += amount
+
+
+def stats():
+    """
+    Zähler in diesem Prozess: requests (Abrufe inkl. Wiederholungen), retries,
+    rejected_queue_full und rejected_timeout (mit UpstreamBusy abgewiesen).
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def get_admission():
+    """
+    Liefert die Zugangskontrolle dieses Prozesses (nach einem fork() eine eigene).
+    """
+    global _admission, _admission_pid
+    if _admission is None or _admission_pid != os.getpid():
+        with _admission_lock:
+            if _admission is None or _admission_pid != os.getpid():
+                _admission = Admission(settings.GHCN_UPSTREAM_MAX_CONCURRENT, settings.GHCN_UPSTREAM_QUEUE_DEPTH,
+                                       settings.GHCN_UPSTREAM_QUEUE_TIMEOUT)
+                _admission_pid = os.getpid()
+    return _admission
+
+
+def load():
+    """
+    Aktuelle Auslastung dieses Prozesses: laufende (active) und wartende (waiting) Abrufe.
+    """
+    admission = get_admission()
+    return {"active": admission.active, "waiting": admission.waiting}
+
+
+def reset():
+    """
+    Verwirft die Zugangskontrolle (z.B. nach geänderten Settings in Tests).
+    """
+    global _admission
+    with _admission_lock:
+        _admission = None
+
+
+def get_session():
+    """
+    Liefert die gemeinsame Session dieses Prozesses (Pool mit GHCN_UPSTREAM_POOL_SIZE Verbindungen).
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=4, pool_maxsize=settings.GHCN_UPSTREAM_POOL_SIZE, pool_block=False)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def ghcn_url(path):
+    """
+    Baut die vollständige URL einer Datei im GHCN-Bucket,
+    z.B. ghcn_url("ghcnd-stations.txt").
+    """
+    return settings.GHCN_BASE_URL.rstrip("/") + "/" + path.lstrip("/")
+
+
+def validators(response):
+    """
+    Liefert die Cache-Validatoren (ETag, Last-Modified) einer Antwort als Dictionary.
+    Fehlende Header werden als None eingetragen.
+    """
+    headers = response.headers or {}
+    return {
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+    }
+
+
+def conditional_get(url, etag=None, last_modified=None, **kwargs):
+    """
+    GET-Request, der bekannte Validatoren als If-None-Match bzw.
+    If-Modified-Since mitschickt. Hat sich die Datei nicht geändert,
+    antwortet der Server mit 304 (ohne Inhalt).
+
+    Der Abruf belegt einen Platz der Zugangskontrolle (siehe oben), bei stream=True bis
+    die Antwort geschlossen wird; Aufrufer müssen sie daher mit response.close()
+    (oder als Kontextmanager) schließen. Wirft UpstreamBusy, wenn kein Platz frei wird.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    kwargs.setdefault("timeout", (settings.GHCN_UPSTREAM_CONNECT_TIMEOUT, settings.GHCN_UPSTREAM_READ_TIMEOUT))
+    admission = get_admission()
+    admission.acquire()
+    try:
+        response = _get_with_retries(url, headers, kwargs)
+    except BaseException:
+        admission.release()
+        raise
+    if kwargs.get("stream"):
+        _release_on_close(response, admission)
+    else:
+        admission.release()
+    return response
+
+
+def _get_with_retries(url, headers, kwargs):
+    session = get_session()
+    attempts = settings.GHCN_UPSTREAM_RETRIES + 1
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        _count("requests")
+        try:
+            response = session.get(url, headers=headers, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if last:
+                raise
+        else:
+            if last or response.status_code not in TRANSIENT_STATUS:
+                return response
+            response.close()
+        _count("retries")
+        time.sleep(random.uniform(0, settings.GHCN_UPSTREAM_RETRY_BACKOFF * 2 ** attempt))
+
+
+def _release_on_close(response, admission):
+    # Gibt den Platz beim (ersten) close() frei, spätestens wenn die Antwort freigegeben wird
+    release = weakref.finalize(response, admission.release)
+    close = response.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            release()
+
+    response.close = close_and_release
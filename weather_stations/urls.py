@@ -1,8 +1,23 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Unter ASGI (GHCN_ASYNC_VIEWS=1) die asynchronen Varianten der API-Views verwenden
+if settings.GHCN_ASYNC_VIEWS:
+    search_stations, get_station_data = views.asearch_stations, views.aget_station_data
+    get_station_data_batch, get_regional_data = views.aget_station_data_batch, views.aget_regional_data
+    get_station_series = views.aget_station_series
+else:
+    search_stations, get_station_data = views.search_stations, views.get_station_data
+    get_station_data_batch, get_regional_data = views.get_station_data_batch, views.get_regional_data
+    get_station_series = views.get_station_series
+
 urlpatterns = [
     path("", views.index, name="index"),
-    path("api/search_stations/", views.search_stations, name="search_stations"),
-    path("api/get_station_data/", views.get_station_data, name="get_station_data"),
+    path("api/search_stations/", search_stations, name="search_stations"),
+    path("api/get_station_data/", get_station_data, name="get_station_data"),
+    path("api/get_station_data_batch/", get_station_data_batch, name="get_station_data_batch"),
+    path("api/get_regional_data/", get_regional_data, name="get_regional_data"),
+    path("api/get_station_series/", get_station_series, name="get_station_series"),
+    path("metrics", views.get_metrics, name="metrics"),
 ]
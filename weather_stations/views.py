@@ -1,49 +1,58 @@
-import math
-import gzip
-import pandas as pd
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import Http404, HttpResponse, JsonResponse, HttpResponseBadRequest
 
+from . import aggregates as station_aggregates, batch, catalog, downsample, metrics, response_cache, singleflight
+from . import station_cache, upstream
+from . import series as station_series
+from .geo import haversine  # bleibt über views importierbar
 
-def index(request):
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
     """
-    Liefert die Startseite (das Frontend) aus templates/frontend.html.
+    Thread-Pool (GHCN_ASYNC_WORKERS Threads), auf den die asynchronen Views blockierende
+    Arbeit (Downloads, pandas/NumPy) auslagern; die Event-Loop bleibt so frei für weitere Requests.
     """
-    return render(request, "frontend.html")
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(settings.GHCN_ASYNC_WORKERS, thread_name_prefix="view-worker")
+    return _executor
 
 
-def haversine(lat1, lon1, lat2, lon2):
+async def run_blocking(func, *args):
     """
-    Berechnet die Distanz (in Kilometern) zwischen zwei Punkten (lat: (Breite), lon: (Länger))
-    mittels der Haversine-Formel.
+    Führt func(*args) im Executor aus und wartet asynchron auf das Ergebnis.
     """
-    R = 6371  # Erdradius in km
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+    return await sync_to_async(func, thread_sensitive=False, executor=get_executor())(*args)
 
 
-def search_stations(request):
+def index(request):
     """
-    API-Endpunkt: Sucht nach Stationen anhand übergebener Parameter.
+    Liefert die Startseite (das Frontend) aus templates/frontend.html.
+    """
+    return render(request, "frontend.html")
 
-    Erwartete GET-Parameter:
-      - latitude (Breite, float)
-      - longitude (Länge, float)
-      - radius (Suchradius in km, Standard: 10 km)
-      - station_count (Anzahl der Wetterstationen)
-      - start_year (nur Stationen anzeigen, die seit diesem Jahr existieren)
-      - end_year (Stationen müssen bis dieses Jahres Daten haben)
+
+def _search_parameters(request):
+    """
+    Liest die GET-Parameter von search_stations; liefert (Parameter, None) oder (None, Fehlerantwort).
     """
     try:
         lat = float(request.GET.get('latitude'))
         lon = float(request.GET.get('longitude'))
         radius = float(request.GET.get('radius', 10))  # Standard: 10 km
+        mode = request.GET.get('mode') or 'radius'
+        if mode not in ('radius', 'nearest'):
+            raise ValueError(mode)
 
         station_count_str = request.GET.get('station_count', '')
         if not station_count_str:
@@ -53,227 +62,491 @@ def search_stations(request):
         start_year = int(request.GET.get('start_year'))
         end_year = int(request.GET.get('end_year'))
     except (TypeError, ValueError):
-        return HttpResponseBadRequest("Ungültige Parameter.")
+        return None, HttpResponseBadRequest("Ungültige Parameter.")
+    return (lat, lon, radius, mode, station_count, start_year, end_year), None
+
+
+def _search(lat, lon, radius, mode, station_count, start_year, end_year):
     # Falls station_count nicht angegeben wurde, eine leere Liste zurückgeben:
     if station_count is None:
         return JsonResponse({"stations": []})
 
-    # Stationendaten abrufen
-    stations_url = "https://noaa-ghcn-pds.s3.amazonaws.com/ghcnd-stations.txt"
+    # Stationskatalog aus dem Cache (lädt nur beim allerersten Aufruf aus dem Netz)
+    try:
+        with metrics.phase("catalog"):
+            station_catalog = catalog.get_catalog()
+    except catalog.CatalogError as e:
+        return HttpResponseBadRequest(str(e))
+    except upstream.UpstreamBusy as e:
+        return _busy_response(e)
+
+    # Station muss laut Inventor daten beide Messgrößen TMAX und TMIN haben und
+    # der verfügbare Zeitraum muss den gesamten Zeitraum von start_year bis end_year abdecken
+    with metrics.phase("filter"):
+        mask = station_catalog.coverage_mask(start_year, end_year)
+
+    # Finde Stationen im Umkreis (bzw. die nächsten Stationen) über den räumlichen Index
+    with metrics.phase("distance"):
+        if mode == 'nearest':
+            indices, distances = station_catalog.index.nearest(lat, lon, station_count, mask)
+        else:
+            indices, distances = station_catalog.index.within(lat, lon, radius, mask)
+
+    with metrics.phase("stations"):
+        filtered_stations = []
+        for i, distance in zip(indices.tolist(), distances.tolist()):
+            station = station_catalog.station(i)
+            station["distance"] = round(distance, 2)
+            filtered_stations.append(station)
+
+        filtered_stations.sort(key=lambda x: x["distance"])
+        filtered_stations = filtered_stations[:station_count]
+    with metrics.phase("serialize"):
+        return JsonResponse({"stations": filtered_stations})
+
+
+def _cached_search(request, params):
+    # Gleiche Suchen (gleiche eingelesene Parameter) kommen aus dem Antwort-Cache
+    return response_cache.cached_response(
+        request, "search_stations", params, settings.GHCN_SEARCH_CACHE_TTL, lambda: _search(*params))
+
+
+def search_stations(request):
+    """
+    API-Endpunkt: Sucht nach Stationen anhand übergebener Parameter.
+
+    Erwartete GET-Parameter:
+      - latitude (Breite, float)
+      - longitude (Länge, float)
+      - radius (Suchradius in km, Standard: 10 km)
+      - station_count (Anzahl der Wetterstationen)
+      - mode ("radius" (Standard): Stationen im Umkreis radius;
+              "nearest": die station_count nächsten Stationen ohne Radiusbegrenzung)
+      - start_year (nur Stationen anzeigen, die seit diesem Jahr existieren)
+      - end_year (Stationen müssen bis dieses Jahres Daten haben)
+
+    Antworten werden für GHCN_SEARCH_CACHE_TTL gecacht (mit ETag, siehe response_cache.py).
+    """
+    params, error = _search_parameters(request)
+    if error is not None:
+        return error
+    return _cached_search(request, params)
+
+
+async def asearch_stations(request):
+    """
+    Asynchrone Variante von search_stations (für ASGI); das Laden des Katalogs und die
+    Suche laufen in einem Thread des gemeinsamen Executors.
+    """
+    params, error = _search_parameters(request)
+    if error is not None:
+        return error
+    return await run_blocking(_cached_search, request, params)
+
+
+def _station_data_parameters(request):
+    """
+    Liest die GET-Parameter von get_station_data; liefert (Parameter, None) oder (None, Fehlerantwort).
+    """
+    station_id = request.GET.get("station_id")
     try:
-        response = requests.get(stations_url)
-        if response.status_code != 200:
-            return HttpResponseBadRequest("Fehler beim Abrufen der Stationendaten.")
-        station_data = response.text.splitlines()
+        start_year = int(request.GET.get("start_year"))
+        end_year = int(request.GET.get("end_year"))
+    except (TypeError, ValueError):
+        return None, JsonResponse({"error": "Ungültige Jahresparameter."}, status=400)
+    if not station_id:
+        return None, JsonResponse({"error": "Station ID wird benötigt."}, status=400)
+    return (station_id, start_year, end_year), None
+
+
+def _busy_response(error):
+    """
+    503 mit Retry-After, wenn der Upstream ausgelastet ist (siehe upstream.Admission).
+    """
+    response = JsonResponse({"error": "Der Datendienst ist ausgelastet, bitte später erneut versuchen."}, status=503)
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+
+class _StationDataError(Exception):
+    """
+    Fehler beim Abrufen oder Lesen einer Stationsdatei (Text der Fehlerantwort).
+    """
+
+
+def _load_station(station_id):
+    """
+    Aktuelle Monatsaggregate der Station und der Cache-Status der Stationsdatei.
+    """
+    # Ein gleichzeitiger Request (auch eines anderen Workers) kann das Aggregat inzwischen erneuert haben
+    aggregates = station_aggregates.load_fresh(station_id)
+    if aggregates is not None:
+        return aggregates, "hit"
+    # Beim Neuladen wird schon während des Downloads aggregiert; unveränderte Jahre
+    # werden dabei aus dem bisherigen Aggregat übernommen
+    previous = station_aggregates.load_stored(station_id)
+    try:
+        with metrics.phase("download"):
+            cached = station_cache.fetch(
+                station_id, consume=lambda f: station_aggregates.aggregate_stream(f, previous=previous))
+    except upstream.UpstreamBusy:
+        raise
     except Exception as e:
-        return HttpResponseBadRequest("Fehler beim Abrufen der Stationendaten: " + str(e))
+        raise _StationDataError(f"Fehler beim Abrufen der Stationsdatei: {e}")
+    try:
+        with metrics.phase("update"):
+            return station_aggregates.update(station_id, cached), cached.status
+    except Exception as e:
+        raise _StationDataError(f"Fehler beim Lesen der Stationsdatei: {e}")
+
 
-    # Inventory Daten laden und filtern
+def _station_data(station_id, start_year, end_year):
+    # Vorberechnete Monatsaggregate der Station; nur wenn keine (geprüften) vorliegen,
+    # wird die Stationsdatei aus dem lokalen Cache bzw. dem S3-Bucket gelesen. Die
+    # Tageszeitreihe (series.py) liest dieser Pfad nicht, sie dient nur beim Neuberechnen
     try:
-        inventory_url = "https://noaa-ghcn-pds.s3.amazonaws.com/ghcnd-inventory.txt"
-        inv_response = requests.get(inventory_url)
-        if inv_response.status_code != 200:
-            return HttpResponseBadRequest("Fehler beim Abrufen der Inventardaten.")
-        inventory_data = inv_response.text.splitlines()
+        with metrics.phase("load"):
+            aggregates = station_aggregates.load_fresh(station_id)
+    except station_cache.InvalidStationId:
+        return JsonResponse({"error": "Ungültige Station ID."}, status=400)
+    cache_status = "hit"
+    if aggregates is None:
+        # Gleichzeitige Requests für dieselbe Station warten auf einen gemeinsamen Abruf
+        try:
+            aggregates, cache_status = singleflight.run(
+                f"aggregate-{station_id}", lambda: _load_station(station_id))
+        except _StationDataError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except upstream.UpstreamBusy as e:
+            return _busy_response(e)
+
+    # Jährliche und saisonale Durchschnittswerte (Winter: Dezember des Vorjahres plus Januar und Februar)
+    with metrics.phase("summarize"):
+        result = aggregates.summarize(start_year, end_year)
+    with metrics.phase("serialize"):
+        response = JsonResponse(result)
+    response["X-Cache"] = cache_status.upper()
+    return response
+
+
+def _cached_station_data(request, params):
+    return response_cache.cached_response(
+        request, "get_station_data", params, settings.GHCN_STATION_DATA_CACHE_TTL, lambda: _station_data(*params))
+
+
+def get_station_data(request):
+    """
+    API-Endpunkt: Ruft für eine ausgewählte Station und einen definierten Zeitraum
+    (Start- und Endjahr) die jährlichen sowie saisonalen Durchschnittswerte (nur TMAX und TMIN).
+    Grundlage sind die Monatsaggregate der Station (siehe aggregates.py), die beim ersten
+    Abruf aus der CSV.gz-Datei (über den lokalen Cache, siehe station_cache.py) berechnet werden.
+    Antworten werden für GHCN_STATION_DATA_CACHE_TTL gecacht (mit ETag, siehe response_cache.py).
+
+    Erwartete GET-Parameter:
+      - station_id
+      - start_year (z.B. 2000)
+      - end_year (z.B. 2010)
+    """
+    params, error = _station_data_parameters(request)
+    if error is not None:
+        return error
+    return _cached_station_data(request, params)
+
+
+async def aget_station_data(request):
+    """
+    Asynchrone Variante von get_station_data (für ASGI); Download und Auswertung laufen
+    in einem Thread des gemeinsamen Executors.
+    """
+    params, error = _station_data_parameters(request)
+    if error is not None:
+        return error
+    return await run_blocking(_cached_station_data, request, params)
+
+
+def _load_series(station_id):
+    """
+    Aktuelle Tageszeitreihe der Station (wird bei Bedarf aus der Stationsdatei erzeugt).
+    """
+    series = station_series.load_fresh(station_id)
+    if series is not None:
+        return series
+    try:
+        cached = station_cache.fetch(station_id)
+    except upstream.UpstreamBusy:
+        raise
     except Exception as e:
-        return HttpResponseBadRequest("Fehler beim Abrufen der Inventardaten: " + str(e))
-
-    # Baue ein Dictionary: station_id -> { "TMAX": (first_year, last_year), "TMIN": (first_year, last_year) }
-    inventory = {}
-    for line in inventory_data:
-        parts = line.split()
-        if len(parts) < 6:
-            continue
-        station_id = parts[0]
-        element = parts[3]
-        # Nur TMAX und TMIN berücksichtigen
-        if element not in ["TMAX", "TMIN"]:
-            continue
+        raise _StationDataError(f"Fehler beim Abrufen der Stationsdatei: {e}")
+    try:
+        return station_series.update(station_id, cached)
+    except Exception as e:
+        raise _StationDataError(f"Fehler beim Lesen der Stationsdatei: {e}")
+
+
+def _series_parameters(request):
+    """
+    Liest die GET-Parameter von get_station_series; liefert (Parameter, None) oder (None, Fehlerantwort).
+    """
+    params, error = _station_data_parameters(request)
+    if error is not None:
+        return None, error
+    points = request.GET.get("points")
+    method = request.GET.get("method", "minmax")
+    if points is not None:
         try:
-            first_year = int(parts[4])  # Erstes Jahr, in dem diese Messgröße vorliegt
-            last_year = int(parts[5])   # Letztes Jahr, in dem diese Messgröße vorliegt
+            points = int(points)
         except ValueError:
-            continue
-        if station_id not in inventory:
-            inventory[station_id] = {}
-        if element in inventory[station_id]:
-            # Falls mehrere Einträge vorhanden sind, nehme den frühesten first_year und den spätesten last_year
-            prev_first, prev_last = inventory[station_id][element]
-            inventory[station_id][element] = (min(prev_first, first_year), max(prev_last, last_year))
-        else:
-            inventory[station_id][element] = (first_year, last_year)
+            return None, JsonResponse({"error": "Ungültige Punktanzahl."}, status=400)
+        if points < 3:
+            return None, JsonResponse({"error": "Ungültige Punktanzahl."}, status=400)
+    if method not in downsample.METHODS:
+        return None, JsonResponse({"error": "Ungültiges Verfahren."}, status=400)
+    return params + (points, method), None
 
 
-    # Finde Stationen im Umkreis
-    matching_stations = []
-    # Fixed-Width-Parsing: ID [0:11], Latitude [12:20], Longitude [21:30], Name [41:71]
-    for line in station_data:
-        if len(line) < 71:
-            continue
-        station_id = line[0:11].strip()
+def _station_series(station_id, start_year, end_year, points, method):
+    try:
+        series = station_series.load_fresh(station_id)
+    except station_cache.InvalidStationId:
+        return JsonResponse({"error": "Ungültige Station ID."}, status=400)
+    if series is None:
         try:
-            station_lat = float(line[12:20].strip())
-            station_lon = float(line[21:30].strip())
-        except ValueError:
-            continue
-        distance = haversine(lat, lon, station_lat, station_lon)
-        if distance <= radius:
-            station_name = line[41:71].strip()
-            matching_stations.append({
-                "id": station_id,
-                "name": station_name,
-                "latitude": station_lat,
-                "longitude": station_lon,
-                "distance": round(distance, 2)
-            })
+            series = singleflight.run(f"series-{station_id}", lambda: _load_series(station_id))
+        except _StationDataError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except upstream.UpstreamBusy as e:
+            return _busy_response(e)
 
-    # Station muss laut Inventor daten beide Messgrößen TMAX und TMIN haben und
-    # der verfügbare Zeitraum muss den gesamten Zeitraum von start_year bis end_year abdecken
-    filtered_stations = []
-    for station in matching_stations:
-        inv_data = inventory.get(station["id"])
-        if inv_data and "TMAX" in inv_data and "TMIN" in inv_data:
-            tmax_first, tmax_last = inv_data["TMAX"]
-            tmin_first, tmin_last = inv_data["TMIN"]
-            effective_start = max(tmax_first, tmin_first)
-            effective_end = min(tmax_last, tmin_last)
-            if effective_start <= start_year and effective_end >= end_year:
-                filtered_stations.append(station)
-
-    filtered_stations.sort(key=lambda x: x["distance"])
-    filtered_stations = filtered_stations[:station_count]
-    return JsonResponse({"stations": filtered_stations})
+    with metrics.phase("select"):
+        if points is None:
+            result = series.daily(start_year, end_year)
+        else:
+            result = series.sampled(start_year, end_year, points, method)
+    with metrics.phase("serialize"):
+        return JsonResponse(result)
 
 
-def get_station_data(request):
+def _cached_station_series(request, params):
+    return response_cache.cached_response(
+        request, "get_station_series", params, settings.GHCN_STATION_DATA_CACHE_TTL,
+        lambda: _station_series(*params))
+
+
+def get_station_series(request):
     """
-    API-Endpunkt: Ruft für eine ausgewählte Station und einen definierten Zeitraum
-    (Start- und Endjahr) die zugehörige CSV.gz-Datei ab, parst diese mit pandas und
-    berechnet die jährlichen sowie saisonalen Durchschnittswerte (nur TMAX und TMIN).
+    API-Endpunkt: Tageswerte von TMAX und TMIN (°C) einer Station für start_year bis end_year.
+    Grundlage ist die binäre Tageszeitreihe der Station (siehe series.py), die beim ersten
+    Abruf aus der Stationsdatei erzeugt wird; der Zeitraum wird daraus ohne Parsen ausgeschnitten.
+    Antworten werden für GHCN_STATION_DATA_CACHE_TTL gecacht (mit ETag, siehe response_cache.py).
 
     Erwartete GET-Parameter:
       - station_id
       - start_year (z.B. 2000)
       - end_year (z.B. 2010)
+      - points (optional, mindestens 3: Werte je Messgröße für Diagramme auf diese Anzahl ausdünnen)
+      - method (mit points: "minmax" (Standard, Minimum und Maximum je Abschnitt, erhält die Extreme)
+                oder "lttb" (Largest-Triangle-Three-Buckets), siehe downsample.py)
+
+    Antwort: {"dates": [...], "TMAX": [...], "TMIN": [...], "quality_flags": {Messgröße: {Datum: Q-FLAG}}};
+    fehlende Werte sind null. Mit points kompakt je Messgröße:
+    {"method": ..., "points": ..., "TMAX": {"days": [Tage seit 1970-01-01], "values": [°C]}, "TMIN": {...}}.
     """
-    station_id = request.GET.get("station_id")
+    params, error = _series_parameters(request)
+    if error is not None:
+        return error
+    return _cached_station_series(request, params)
+
+
+async def aget_station_series(request):
+    """
+    Asynchrone Variante von get_station_series (für ASGI).
+    """
+    params, error = _series_parameters(request)
+    if error is not None:
+        return error
+    return await run_blocking(_cached_station_series, request, params)
+
+
+def _batch_parameters(request):
+    """
+    Liest die GET-Parameter von get_station_data_batch; liefert (Parameter, None) oder (None, Fehlerantwort).
+    """
+    # Reihenfolge beibehalten, doppelte IDs nur einmal auswerten
+    station_ids = list(dict.fromkeys(
+        station_id.strip() for station_id in request.GET.get("station_ids", "").split(",") if station_id.strip()))
     try:
         start_year = int(request.GET.get("start_year"))
         end_year = int(request.GET.get("end_year"))
     except (TypeError, ValueError):
-        return JsonResponse({"error": "Ungültige Jahresparameter."}, status=400)
-    if not station_id:
-        return JsonResponse({"error": "Station ID wird benötigt."}, status=400)
+        return None, JsonResponse({"error": "Ungültige Jahresparameter."}, status=400)
+    if not station_ids:
+        return None, JsonResponse({"error": "Station IDs werden benötigt."}, status=400)
+    if len(station_ids) > settings.GHCN_BATCH_MAX_STATIONS:
+        return None, JsonResponse(
+            {"error": f"Höchstens {settings.GHCN_BATCH_MAX_STATIONS} Stationen je Anfrage."}, status=400)
+    return (station_ids, start_year, end_year), None
 
-    # Verwende die URL aus dem S3-Bucket:
-    station_data_url = f"https://noaa-ghcn-pds.s3.amazonaws.com/csv.gz/by_station/{station_id}.csv.gz"
 
+def _batch_busy_response(loaded):
+    """
+    503 mit Retry-After (längste Wartezeit), wenn Stationen eines batch.load_many() wegen
+    Auslastung des Upstreams nicht abgerufen wurden; sonst None. Das Ergebnis wäre
+    unvollständig, ohne dass die Stationen selbst fehlerhaft sind.
+    """
+    if not loaded.busy:
+        return None
+    return _busy_response(max(loaded.busy.values(), key=lambda error: error.retry_after))
+
+
+def _station_data_batch(station_ids, start_year, end_year):
+    loaded = batch.load_many(station_ids)
+    busy = _batch_busy_response(loaded)
+    if busy is not None:
+        return busy
+    stations = {
+        station_id: loaded.aggregates[station_id].summarize(start_year, end_year)
+        for station_id in station_ids if station_id in loaded.aggregates
+    }
+    errors = {station_id: loaded.errors[station_id] for station_id in station_ids if station_id in loaded.errors}
+    return JsonResponse({"stations": stations, "errors": errors})
+
+
+def get_station_data_batch(request):
+    """
+    API-Endpunkt: Jährliche und saisonale Durchschnittswerte (wie get_station_data) für
+    mehrere Stationen auf einmal, z.B. für alle Stationen eines Suchergebnisses.
+    Downloads laufen parallel, das Auswerten der Dateien in einem Prozess-Pool (siehe batch.py).
+
+    Erwartete GET-Parameter:
+      - station_ids (kommagetrennt, höchstens GHCN_BATCH_MAX_STATIONS)
+      - start_year (z.B. 2000)
+      - end_year (z.B. 2010)
+
+    Antwort: {"stations": {station_id: {"annual": ..., "seasonal": ...}}, "errors": {station_id: Meldung}}.
+    Fehler einzelner Stationen stehen in "errors"; die übrigen Stationen werden trotzdem geliefert.
+    Ist der Upstream ausgelastet, antwortet der Endpunkt mit 503 und Retry-After.
+    """
+    params, error = _batch_parameters(request)
+    if error is not None:
+        return error
+    return _station_data_batch(*params)
+
+
+async def aget_station_data_batch(request):
+    """
+    Asynchrone Variante von get_station_data_batch (für ASGI).
+    """
+    params, error = _batch_parameters(request)
+    if error is not None:
+        return error
+    return await run_blocking(_station_data_batch, *params)
+
+
+def _regional_parameters(request):
+    """
+    Liest die GET-Parameter von get_regional_data; liefert (Parameter, None) oder (None, Fehlerantwort).
+    """
     try:
-        response = requests.get(station_data_url, stream=True)
-        response.raise_for_status()
-    except Exception as e:
-        return JsonResponse({"error": f"Fehler beim Abrufen der Stationsdatei: {e}"}, status=400)
+        lat = float(request.GET.get("latitude"))
+        lon = float(request.GET.get("longitude"))
+        radius = float(request.GET.get("radius", 10))  # Standard: 10 km
+        start_year = int(request.GET.get("start_year"))
+        end_year = int(request.GET.get("end_year"))
+    except (TypeError, ValueError):
+        return None, JsonResponse({"error": "Ungültige Parameter."}, status=400)
+    weighting = request.GET.get("weighting") or "equal"
+    if weighting not in station_aggregates.WEIGHTINGS:
+        return None, JsonResponse({"error": "Ungültige Gewichtung."}, status=400)
+    return (lat, lon, radius, weighting, start_year, end_year), None
+
 
+def _regional_data(lat, lon, radius, weighting, start_year, end_year):
     try:
-        with gzip.GzipFile(fileobj=response.raw) as f:
-            data = pd.read_csv(
-                f,
-                header=None,
-                names=['ID', 'DATE', 'ELEMENT', 'VALUE', 'M-FLAG', 'Q-FLAG', 'S-FLAG', 'OBS-TIME'],
-                dtype={
-                    'ID': str,
-                    'DATE': str,
-                    'ELEMENT': str,
-                    'VALUE': float,
-                    'M-FLAG': str,
-                    'Q-FLAG': str,
-                    'S-FLAG': str,
-                    'OBS-TIME': str,
-                },
-                low_memory=False
-            )
-    except Exception as e:
-        return JsonResponse({"error": f"Fehler beim Lesen der Stationsdatei: {e}"}, status=400)
-
-    # Umwandeln der DATE-Spalte in ein Datetime-Objekt (Format: YYYYMMDD)
-    data['DATE'] = pd.to_datetime(data['DATE'], format="%Y%m%d", errors='coerce')
-    data = data.dropna(subset=['DATE'])
-    data['YEAR'] = data['DATE'].dt.year
-    data['MONTH'] = data['DATE'].dt.month
-
-    # Für den Winter: Wir benötigen auch den Dezember des Vorjahres
-    data = data[(data['YEAR'] >= start_year - 1) & (data['YEAR'] <= end_year)]
-
-    # Nur Temperaturdaten (TMAX und TMIN) verarbeiten
-    data = data[data['ELEMENT'].isin(['TMAX', 'TMIN'])]
-
-    # Skalieren der Temperaturwerte (z.B. 250 -> 25.0 °C)
-    data['VALUE'] = data['VALUE'] / 10.0
-
-    # Ergebnis-Dictionaries initialisieren
-    annual = {}
-    seasonal = {}
-    for year in range(start_year, end_year + 1):
-        annual[year] = {"TMAX": {"avg": None}, "TMIN": {"avg": None}}
-        seasonal[year] = {
-            "spring": {"TMAX": None, "TMIN": None},
-            "summer": {"TMAX": None, "TMIN": None},
-            "autumn": {"TMAX": None, "TMIN": None},
-            "winter": {"TMAX": None, "TMIN": None},
-        }
-
-    # Berechne jährliche Durchschnittswerte
-    for year in range(start_year, end_year + 1):
-        year_data = data[data['YEAR'] == year]
-        if not year_data.empty:
-            tmax_vals = year_data[year_data['ELEMENT'] == 'TMAX']['VALUE']
-            tmin_vals = year_data[year_data['ELEMENT'] == 'TMIN']['VALUE']
-            if not tmax_vals.empty:
-                annual[year]["TMAX"]["avg"] = format(tmax_vals.mean(), '.1f')
-            if not tmin_vals.empty:
-                annual[year]["TMIN"]["avg"] = format(tmin_vals.mean(), '.1f')
-
-    # Berechne saisonale Durchschnittswerte:
-    for year in range(start_year, end_year + 1):
-        # Frühling: März, April, Mai
-        spring = data[(data['YEAR'] == year) & (data['MONTH'].isin([3, 4, 5]))]
-        if not spring.empty:
-            tmax_vals = spring[spring['ELEMENT'] == 'TMAX']['VALUE']
-            tmin_vals = spring[spring['ELEMENT'] == 'TMIN']['VALUE']
-            if not tmax_vals.empty:
-                seasonal[year]["spring"]["TMAX"] = format(tmax_vals.mean(), '.1f')
-            if not tmin_vals.empty:
-                seasonal[year]["spring"]["TMIN"] = format(tmin_vals.mean(), '.1f')
-        # Sommer: Juni, Juli, August
-        summer = data[(data['YEAR'] == year) & (data['MONTH'].isin([6, 7, 8]))]
-        if not summer.empty:
-            tmax_vals = summer[summer['ELEMENT'] == 'TMAX']['VALUE']
-            tmin_vals = summer[summer['ELEMENT'] == 'TMIN']['VALUE']
-            if not tmax_vals.empty:
-                seasonal[year]["summer"]["TMAX"] = format(tmax_vals.mean(), '.1f')
-            if not tmin_vals.empty:
-                seasonal[year]["summer"]["TMIN"] = format(tmin_vals.mean(), '.1f')
-        # Herbst: September, Oktober, November
-        autumn = data[(data['YEAR'] == year) & (data['MONTH'].isin([9, 10, 11]))]
-        if not autumn.empty:
-            tmax_vals = autumn[autumn['ELEMENT'] == 'TMAX']['VALUE']
-            tmin_vals = autumn[autumn['ELEMENT'] == 'TMIN']['VALUE']
-            if not tmax_vals.empty:
-                seasonal[year]["autumn"]["TMAX"] = format(tmax_vals.mean(), '.1f')
-            if not tmin_vals.empty:
-                seasonal[year]["autumn"]["TMIN"] = format(tmin_vals.mean(), '.1f')
-        # Winter: Dezember des Vorjahres plus Januar und Februar des laufenden Jahres
-        winter = pd.concat([
-            data[(data['YEAR'] == year - 1) & (data['MONTH'] == 12)],
-            data[(data['YEAR'] == year) & (data['MONTH'].isin([1, 2]))]
-        ])
-        if not winter.empty:
-            tmax_vals = winter[winter['ELEMENT'] == 'TMAX']['VALUE']
-            tmin_vals = winter[winter['ELEMENT'] == 'TMIN']['VALUE']
-            if not tmax_vals.empty:
-                seasonal[year]["winter"]["TMAX"] = format(tmax_vals.mean(), '.1f')
-            if not tmin_vals.empty:
-                seasonal[year]["winter"]["TMIN"] = format(tmin_vals.mean(), '.1f')
-
-    result = {"annual": annual, "seasonal": seasonal}
+        station_catalog = catalog.get_catalog()
+    except catalog.CatalogError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except upstream.UpstreamBusy as e:
+        return _busy_response(e)
+
+    # Dieselbe Auswahl wie bei search_stations (Modus "radius"), höchstens die
+    # GHCN_BATCH_MAX_STATIONS nächsten Stationen
+    mask = station_catalog.coverage_mask(start_year, end_year)
+    indices, distances = station_catalog.index.within(lat, lon, radius, mask)
+    order = distances.argsort(kind="stable")[:settings.GHCN_BATCH_MAX_STATIONS]
+    candidates = []
+    for i, distance in zip(indices[order].tolist(), distances[order].tolist()):
+        station = station_catalog.station(i)
+        station["distance"] = round(distance, 2)
+        candidates.append(station)
+
+    # Aggregate aller Stationen in einem Durchgang (gespeicherte Aggregate, sonst parallel berechnet)
+    loaded = batch.load_many([station["id"] for station in candidates])
+    busy = _batch_busy_response(loaded)
+    if busy is not None:
+        return busy
+    stations = [station for station in candidates if station["id"] in loaded.aggregates]
+    weights = station_aggregates.region_weights([station["distance"] for station in stations], weighting)
+    result = station_aggregates.summarize_region(
+        [loaded.aggregates[station["id"]] for station in stations], weights, start_year, end_year)
+    total = weights.sum()
+    for station, weight in zip(stations, weights.tolist()):
+        station["weight"] = round(weight / total, 4)
+    result["stations"] = stations
+    result["errors"] = {
+        station["id"]: loaded.errors[station["id"]] for station in candidates if station["id"] in loaded.errors
+    }
     return JsonResponse(result)
+
+
+def _cached_regional_data(request, params):
+    return response_cache.cached_response(
+        request, "get_regional_data", params, settings.GHCN_STATION_DATA_CACHE_TTL, lambda: _regional_data(*params))
+
+
+def get_regional_data(request):
+    """
+    API-Endpunkt: Gebietsmittel der jährlichen und saisonalen Durchschnittswerte (TMAX und TMIN)
+    aller Stationen im Umkreis, die den Zeitraum laut Inventar abdecken (wie search_stations).
+    Die Stationen werden wie bei get_station_data_batch ausgewertet (siehe batch.py).
+    Antworten werden für GHCN_STATION_DATA_CACHE_TTL gecacht (mit ETag, siehe response_cache.py).
+
+    Erwartete GET-Parameter:
+      - latitude (Breite, float)
+      - longitude (Länge, float)
+      - radius (Suchradius in km, Standard: 10 km)
+      - weighting ("equal" (Standard): alle Stationen gleich;
+                   "distance": umgekehrt proportional zur Entfernung vom Mittelpunkt)
+      - start_year (z.B. 2000)
+      - end_year (z.B. 2010)
+
+    Antwort wie get_station_data; bei den Jahreswerten steht zusätzlich unter "stations" die
+    Anzahl der Stationen mit Werten in diesem Jahr. Dazu kommen "stations" (die ausgewerteten
+    Stationen mit Entfernung und normiertem Gewicht) und "errors" (Fehler einzelner Stationen).
+    Ist der Upstream ausgelastet, antwortet der Endpunkt mit 503 und Retry-After, statt ein
+    Mittel ohne die abgewiesenen Stationen zu liefern (und zu cachen).
+    """
+    params, error = _regional_parameters(request)
+    if error is not None:
+        return error
+    return _cached_regional_data(request, params)
+
+
+async def aget_regional_data(request):
+    """
+    Asynchrone Variante von get_regional_data (für ASGI).
+    """
+    params, error = _regional_parameters(request)
+    if error is not None:
+        return error
+    return await run_blocking(_cached_regional_data, request, params)
+
+
+def get_metrics(request):
+    """
+    Kennzahlen dieses Prozesses im Prometheus-Textformat (siehe metrics.py): Dauer der
+    Requests und ihrer Schritte je Endpunkt, Statuscodes, ausgelieferte Bytes sowie die
+    Zähler der Caches. Mit GHCN_METRICS=0 nicht verfügbar (404).
+    """
+    if not settings.GHCN_METRICS:
+        raise Http404()
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")